@@ -7,6 +7,7 @@ For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/wsgi/
 """
 
+import logging
 import os
 
 # Load environment variables from .env file
@@ -19,3 +20,13 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
 
 application = get_wsgi_application()
+
+# Only WSGI servers import this module (in each worker, after fork), so the
+# prompt snapshot is loaded before the first request instead of during it.
+# A failure here is not fatal: the cache loads lazily on first use.
+from prompts.prompt_registry import warm_prompt_cache  # noqa: E402
+
+try:
+    warm_prompt_cache()
+except Exception as exc:
+    logging.getLogger(__name__).warning("Prompt cache warm-up failed error=%s", exc)
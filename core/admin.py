@@ -91,10 +91,14 @@ class MessageAdmin(admin.ModelAdmin):
 
     content_preview.short_description = "Content"
 
+    def get_queryset(self, request):
+        # The legacy inline payload is only read on the change form.
+        return super().get_queryset(request).defer("ollama_prompt")
+
     def ollama_prompt_display(self, obj):
-        """Display ollama_prompt as formatted JSON."""
-        if obj.ollama_prompt:
-            formatted_json = json.dumps(obj.ollama_prompt, indent=2, ensure_ascii=False)
+        """Display the prompt payload as formatted JSON."""
+        if obj.prompt_payload:
+            formatted_json = obj.ollama_prompt_pretty_json
             return format_html(
                 """
                 <pre style="
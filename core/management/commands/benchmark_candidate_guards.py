@@ -0,0 +1,345 @@
+import random
+import re
+import time
+
+from django.core.management.base import BaseCommand
+
+from services.candidate_analysis import (
+    CAUSAL_ASSERTION_PATTERNS,
+    CONCRETE_ACTION_MARKERS,
+    CONDITIONAL_INFERENCE_MARKERS,
+    CONFIRMATION_REQUEST_MARKERS,
+    EMPATHY_MARKERS,
+    NEW_ELEMENT_ACTION_MARKERS,
+    PRACTICAL_ACTION_MARKERS,
+    PRAYER_LANGUAGE_MARKERS,
+    PROGRESS_ACTION_MARKERS,
+    PROGRESS_CONFIRM_MARKERS,
+    PROGRESS_DECISION_MARKERS,
+    STRONG_INFERENCE_MARKERS,
+    SUMMARY_MARKERS,
+    USER_CITATION_MARKERS,
+    analyze_candidate,
+)
+from services.chat_service import (
+    MAX_EMPATHY_SENTENCE_WORDS,
+    MAX_EMPATHY_SENTENCES_PER_RESPONSE,
+    ChatService,
+)
+from services.ngram_index import NGRAM_BAN_SIZE, NgramBanIndex
+
+_FILLER_SENTENCES = [
+    "Eu percebo o quanto essa semana foi pesada para você.",
+    "Quando a gente carrega tudo sozinho, o cansaço aparece no corpo.",
+    "Vale olhar para o que está ao seu alcance hoje.",
+    "Você não precisa resolver tudo de uma vez.",
+    "A conversa com seu irmão ainda pesa bastante.",
+    "Pode ser que isso esteja ligado ao medo de decepcionar alguém.",
+    "Uma coisa pequena já muda o rumo do dia.",
+]
+_CLOSING_SENTENCES = [
+    "Agora, escolha um momento curto para anotar o que sentiu.",
+    "Comece mandando uma mensagem simples para alguém de confiança.",
+    "Qual desses passos parece possível para você hoje?",
+    "O que você consegue fazer nos próximos dez minutos?",
+]
+# Candidates should only collide with these through injected markers.
+_RECENT_ASSISTANT_MESSAGES = [
+    "Obrigado por me contar isso com tanta honestidade. Como foi o seu dia?",
+    "Faz diferença dar nome ao que dói. Respire fundo e me conte mais.",
+]
+_USER_MESSAGES = [
+    "não aguento mais brigar com meu irmão, sempre termina do mesmo jeito",
+    "quero parar de beber mas não sei por onde começo",
+    "me sinto culpado de novo, parece que nada muda",
+]
+
+
+# The per-check guards as they ran before analyze_candidate(), frozen here as
+# the benchmark baseline. Production code only uses CandidateFeatures.
+
+
+def _legacy_split_sentences(text):
+    normalized = re.sub(r"\s+", " ", (text or "").strip())
+    if not normalized:
+        return []
+    return [
+        item.strip() for item in re.split(r"(?<=[.!?])\s+", normalized) if item.strip()
+    ]
+
+
+def _legacy_tokenize(text):
+    return re.findall(r"[a-zà-ÿ0-9]+", (text or "").lower())
+
+
+def _legacy_ngrams(text, n):
+    tokens = _legacy_tokenize(text)
+    if len(tokens) < n:
+        return set()
+    return {
+        " ".join(tokens[index : index + n])  # noqa: E203
+        for index in range(0, len(tokens) - n + 1)
+    }
+
+
+def _legacy_has_any(text, markers):
+    normalized = (text or "").lower()
+    return any(marker in normalized for marker in markers)
+
+
+def _legacy_has_required_new_element(candidate):
+    return (
+        "?" in (candidate or "")
+        or _legacy_has_any(candidate, NEW_ELEMENT_ACTION_MARKERS)
+        or _legacy_has_any(candidate, SUMMARY_MARKERS)
+    )
+
+
+def _legacy_empathy_sentence_stats(candidate):
+    empathy_count = 0
+    max_empathy_words = 0
+    for sentence in _legacy_split_sentences(candidate):
+        if _legacy_has_any(sentence, EMPATHY_MARKERS):
+            empathy_count += 1
+            max_empathy_words = max(max_empathy_words, len(_legacy_tokenize(sentence)))
+    return {"count": empathy_count, "max_words": max_empathy_words}
+
+
+def _legacy_has_strong_inference(candidate):
+    return _legacy_has_any(candidate, STRONG_INFERENCE_MARKERS) or _legacy_has_any(
+        candidate, CAUSAL_ASSERTION_PATTERNS
+    )
+
+
+def _legacy_contains_user_citation(candidate, last_user_message):
+    if _legacy_has_any(candidate, USER_CITATION_MARKERS):
+        return True
+    user_tokens = _legacy_tokenize(last_user_message)
+    if len(user_tokens) < 3:
+        return False
+    user_trigrams = {
+        " ".join(user_tokens[index : index + 3])  # noqa: E203
+        for index in range(0, len(user_tokens) - 3 + 1)
+    }
+    return not user_trigrams.isdisjoint(_legacy_ngrams(candidate, 3))
+
+
+def _legacy_has_conditional_inference_confirmation(candidate):
+    return (
+        _legacy_has_any(candidate, CONDITIONAL_INFERENCE_MARKERS)
+        and "?" in (candidate or "")
+        and _legacy_has_any(candidate, CONFIRMATION_REQUEST_MARKERS)
+    )
+
+
+def _legacy_progress_metric(text):
+    return {
+        "decision_taken": _legacy_has_any(text, PROGRESS_DECISION_MARKERS),
+        "action_defined": _legacy_has_any(text, PROGRESS_ACTION_MARKERS),
+        "next_step_confirmed": _legacy_has_any(text, PROGRESS_CONFIRM_MARKERS),
+    }
+
+
+def _legacy_count_concrete_actions(candidate):
+    return sum(
+        1
+        for sentence in _legacy_split_sentences(candidate)
+        if _legacy_has_any(sentence, CONCRETE_ACTION_MARKERS)
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Micro-benchmark dos guardas de candidatos: compara a análise em uma "
+        "passada (analyze_candidate) com o caminho antigo de checagens "
+        "separadas e confere que as decisões são idênticas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--candidates",
+            type=int,
+            default=2000,
+            help="Quantidade de candidatos sintéticos (padrao: 2000).",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=5,
+            help="Repetições de cada caminho; vale o menor tempo (padrao: 5).",
+        )
+        parser.add_argument("--seed", type=int, default=7)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        service = ChatService()
+        candidates = [
+            self._synthetic_candidate(rng) for _ in range(options["candidates"])
+        ]
+        # The old path banned joined n-gram strings; the new one an index of
+        # rolling hashes.
+        banned_ngrams = set()
+        ngram_index = NgramBanIndex()
+        for message_id, text in enumerate(_RECENT_ASSISTANT_MESSAGES, start=1):
+            banned_ngrams.update(_legacy_ngrams(text, NGRAM_BAN_SIZE))
+            ngram_index.add_message(message_id, text)
+        generation_state = {
+            "prayer_request_detected": False,
+            "prayer_cooldown_remaining": 1,
+        }
+        previous_progress_metric = {
+            "decision_taken": False,
+            "action_defined": False,
+            "next_step_confirmed": False,
+        }
+        cases = [
+            (candidate, rng.choice(_USER_MESSAGES), rng.random() < 0.3)
+            for candidate in candidates
+        ]
+
+        def per_check_path():
+            return [
+                self._per_check_blocked(
+                    service,
+                    candidate,
+                    banned_ngrams=banned_ngrams,
+                    last_user_message=user_message,
+                    generation_state=generation_state,
+                    previous_progress_metric=previous_progress_metric,
+                    force_single_concrete_action=force,
+                )
+                for candidate, user_message, force in cases
+            ]
+
+        def single_pass_path():
+            return [
+                service._candidate_block_reason(
+                    analyze_candidate(candidate),
+                    ngram_index=ngram_index,
+                    last_user_message=user_message,
+                    generation_state=generation_state,
+                    previous_progress_metric=previous_progress_metric,
+                    force_single_concrete_action=force,
+                )
+                is not None
+                for candidate, user_message, force in cases
+            ]
+
+        per_check_seconds, per_check_result = self._best_of(
+            per_check_path, options["repeat"]
+        )
+        single_pass_seconds, single_pass_result = self._best_of(
+            single_pass_path, options["repeat"]
+        )
+        mismatches = sum(
+            1 for old, new in zip(per_check_result, single_pass_result) if old != new
+        )
+        if mismatches:
+            raise RuntimeError(
+                f"{mismatches} candidato(s) com decisão divergente entre os caminhos."
+            )
+
+        count = len(cases)
+        self.stdout.write(
+            f"candidates={count} blocked={sum(single_pass_result)} "
+            f"repeat={options['repeat']}"
+        )
+        self.stdout.write(
+            f"per_check   total={per_check_seconds * 1000:.1f}ms "
+            f"per_candidate={per_check_seconds / count * 1e6:.1f}us"
+        )
+        self.stdout.write(
+            f"single_pass total={single_pass_seconds * 1000:.1f}ms "
+            f"per_candidate={single_pass_seconds / count * 1e6:.1f}us"
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Decisões idênticas. speedup={per_check_seconds / single_pass_seconds:.2f}x"
+            )
+        )
+
+    def _best_of(self, func, repeat):
+        best = None
+        result = None
+        for _ in range(max(repeat, 1)):
+            started_at = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - started_at
+            if best is None or elapsed < best:
+                best = elapsed
+        return best, result
+
+    def _synthetic_candidate(self, rng):
+        """Mostly well-formed replies; some carry markers that trip a guard."""
+        phrases = (
+            EMPATHY_MARKERS
+            + PRAYER_LANGUAGE_MARKERS
+            + STRONG_INFERENCE_MARKERS
+            + CAUSAL_ASSERTION_PATTERNS
+            + USER_CITATION_MARKERS
+            + NEW_ELEMENT_ACTION_MARKERS
+            + SUMMARY_MARKERS
+            + PROGRESS_DECISION_MARKERS
+            + PROGRESS_CONFIRM_MARKERS
+        )
+        sentences = rng.sample(_FILLER_SENTENCES, rng.randint(1, 4))
+        sentences.append(rng.choice(_CLOSING_SENTENCES))
+        for index, sentence in enumerate(sentences):
+            if rng.random() < 0.1:
+                phrase = rng.choice(phrases).capitalize()
+                sentences[index] = f"{phrase} {sentence[0].lower()}{sentence[1:]}"
+        return " ".join(sentences)
+
+    def _per_check_blocked(
+        self,
+        service,
+        candidate,
+        *,
+        banned_ngrams,
+        last_user_message,
+        generation_state,
+        previous_progress_metric,
+        force_single_concrete_action,
+    ):
+        """The guard sequence as it ran before analyze_candidate()."""
+        if not banned_ngrams.isdisjoint(_legacy_ngrams(candidate, NGRAM_BAN_SIZE)):
+            return True
+        if not _legacy_has_required_new_element(candidate):
+            return True
+        has_prayer = _legacy_has_any(candidate, PRAYER_LANGUAGE_MARKERS)
+        has_action = _legacy_has_any(candidate, PRACTICAL_ACTION_MARKERS)
+        if (
+            has_prayer
+            and not generation_state["prayer_request_detected"]
+            and generation_state["prayer_cooldown_remaining"] > 0
+        ):
+            return True
+        if (
+            has_prayer
+            and not generation_state["prayer_request_detected"]
+            and not has_action
+        ):
+            return True
+        empathy_stats = _legacy_empathy_sentence_stats(candidate)
+        if empathy_stats["count"] > MAX_EMPATHY_SENTENCES_PER_RESPONSE:
+            return True
+        if (
+            empathy_stats["count"] == 1
+            and empathy_stats["max_words"] > MAX_EMPATHY_SENTENCE_WORDS
+        ):
+            return True
+        if _legacy_has_strong_inference(candidate):
+            has_citation = _legacy_contains_user_citation(candidate, last_user_message)
+            if not has_citation or not _legacy_has_conditional_inference_confirmation(
+                candidate
+            ):
+                return True
+        progress_metric = _legacy_progress_metric(candidate)
+        if force_single_concrete_action:
+            if _legacy_count_concrete_actions(candidate) != 1:
+                return True
+            if not service._progress_advanced(
+                previous_progress_metric, progress_metric
+            ):
+                return True
+        return False
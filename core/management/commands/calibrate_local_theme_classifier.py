@@ -0,0 +1,95 @@
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+
+from services.local_theme_classifier import (
+    build_local_theme_model,
+    iter_llm_labeled_user_messages,
+    local_theme_threshold,
+)
+from services.theme_catalog import get_theme_catalog
+
+DEFAULT_THRESHOLDS = (0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95)
+
+
+class Command(BaseCommand):
+    help = (
+        "Calibra o classificador local de temas: separa as mensagens de "
+        "usuário mais recentes classificadas pelo LLM, monta o modelo só com "
+        "as anteriores e informa, por limiar, a concordância com o tema do "
+        "LLM e a fração de chamadas ao LLM evitadas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=500,
+            help="Mensagens recentes avaliadas (padrao: 500).",
+        )
+        parser.add_argument(
+            "--examples-per-theme",
+            type=int,
+            default=None,
+            help="Exemplos por tema no modelo (padrao: THEME_LOCAL_EXAMPLES_PER_THEME).",
+        )
+        parser.add_argument(
+            "--thresholds",
+            type=str,
+            default=",".join(str(value) for value in DEFAULT_THRESHOLDS),
+            help="Limiares separados por vírgula.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            thresholds = sorted(
+                float(value) for value in options["thresholds"].split(",") if value
+            )
+        except ValueError as exc:
+            raise CommandError(f"Limiares inválidos: {options['thresholds']}") from exc
+
+        catalog = get_theme_catalog()
+        if not catalog.themes:
+            raise CommandError("Nenhum tema cadastrado.")
+        # Message.theme also holds local predictions and forced themes; only
+        # LLM labels (ThemeClassification) are ground truth.
+        holdout = list(
+            islice(
+                iter_llm_labeled_user_messages(catalog.theme_ids),
+                max(options["limit"], 1),
+            )
+        )
+        if not holdout:
+            raise CommandError("Nenhuma mensagem de usuário classificada pelo LLM.")
+
+        # Held-out messages stay out of the centroids.
+        try:
+            model = build_local_theme_model(
+                catalog,
+                examples_per_theme=options["examples_per_theme"],
+                exclude_ids=[message_id for message_id, _, _ in holdout],
+            )
+            predictions = model.predict_many([content for _, content, _ in holdout])
+        except Exception as exc:
+            raise CommandError(f"Falha ao gerar embeddings: {exc}") from exc
+        scored = [
+            (confidence, predicted == theme_id)
+            for (_, _, theme_id), (predicted, confidence) in zip(holdout, predictions)
+        ]
+        total = len(scored)
+        self.stdout.write(
+            f"Mensagens avaliadas: {total}; exemplos no modelo: {model.example_count}"
+        )
+        self.stdout.write(
+            f"Concordância sem limiar: {sum(hit for _, hit in scored) / total:.1%}"
+        )
+        current = local_theme_threshold()
+        for threshold in thresholds:
+            accepted = [hit for confidence, hit in scored if confidence >= threshold]
+            agreement = sum(accepted) / len(accepted) if accepted else 0.0
+            marker = "  <- atual" if threshold == current else ""
+            self.stdout.write(
+                f"limiar={threshold:.2f} chamadas_evitadas={len(accepted) / total:.1%} "
+                f"concordancia={agreement:.1%} ({len(accepted)}){marker}"
+            )
+        self.stdout.write(self.style.SUCCESS("Calibração concluída."))
@@ -0,0 +1,100 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from core.models import Message, Profile
+from services.social_media_export_service import (
+    MAX_EXPORTS_PER_PROFILE,
+    MIN_ASSISTANT_SCORE,
+)
+from services.turn_context import TURN_CONTEXT_MESSAGES, context_window_queryset
+
+
+class Command(BaseCommand):
+    help = (
+        "Confere (EXPLAIN no PostgreSQL) que as consultas quentes de Message "
+        "usam os índices compostos e parciais esperados."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--profile-id",
+            type=int,
+            default=None,
+            help="Perfil usado nas consultas (padrao: o mais recente).",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Este comando requer PostgreSQL.")
+        profile = (
+            Profile.objects.filter(id=options["profile_id"]).first()
+            if options["profile_id"]
+            else Profile.objects.order_by("-id").first()
+        )
+        if profile is None:
+            raise CommandError("Nenhum perfil encontrado.")
+
+        sample_message = profile.messages.order_by("-created_at").first()
+        created_at = sample_message.created_at if sample_message else None
+        checks = [
+            (
+                "turn context window (TurnContext.load)",
+                context_window_queryset(profile)[:TURN_CONTEXT_MESSAGES],
+                "msg_in_context_idx",
+            ),
+            (
+                "last assistant message (ChatView.get)",
+                Message.objects.filter(profile=profile, role="assistant").order_by(
+                    "-created_at"
+                )[:1],
+                "msg_profile_role_created_idx",
+            ),
+            (
+                "previous user message (social export)",
+                Message.objects.filter(
+                    profile=profile,
+                    role="user",
+                    **({"created_at__lt": created_at} if created_at else {}),
+                ).order_by("-created_at")[:1],
+                "msg_profile_role_created_idx",
+            ),
+            (
+                "export candidates (social export)",
+                Message.objects.filter(
+                    profile=profile, role="assistant", score__gte=MIN_ASSISTANT_SCORE
+                )
+                .filter(social_media_export__isnull=True)
+                .order_by("-score", "-created_at")[:MAX_EXPORTS_PER_PROFILE],
+                "msg_profile_role_score_idx",
+            ),
+        ]
+
+        failures = []
+        for label, queryset, index_name in checks:
+            plan = self._plan(queryset)
+            uses_index = index_name in plan
+            status = "ok" if uses_index else "FALHOU"
+            self.stdout.write(f"[{status}] {label}: esperado {index_name}")
+            if not uses_index:
+                self.stdout.write(plan)
+                failures.append(label)
+
+        if failures:
+            raise CommandError(
+                f"{len(failures)} consulta(s) sem o índice esperado: "
+                + ", ".join(failures)
+            )
+        self.stdout.write(self.style.SUCCESS("Todos os planos usam os índices."))
+
+    def _plan(self, queryset) -> str:
+        """
+        EXPLAIN with sequential scans and sorts disabled, so small development
+        tables (where the planner would rather scan and sort) still show
+        whether an index serves both the filter and the ordering.
+        """
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+                cursor.execute("SET LOCAL enable_sort = off")
+                cursor.execute("SET LOCAL enable_incremental_sort = off")
+            return queryset.explain()
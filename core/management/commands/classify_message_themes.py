@@ -0,0 +1,157 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Message
+from services.batch_theme_classifier import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_CONCURRENCY,
+    DEFAULT_REQUESTS_PER_MINUTE,
+    BatchThemeClassifier,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Classifica o tema de mensagens em lote: várias mensagens por "
+        "requisição com saída JSON estruturada, requisições concorrentes sob "
+        "limite de taxa e gravação com bulk_update. Retoma a partir de um "
+        "cursor (id da última mensagem processada)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--role",
+            type=str,
+            default="user",
+            help="Papel das mensagens classificadas (padrao: user).",
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Reclassifica também mensagens que já têm tema.",
+        )
+        parser.add_argument(
+            "--after-id",
+            type=int,
+            default=None,
+            help="Começa depois deste id de mensagem.",
+        )
+        parser.add_argument(
+            "--cursor-file",
+            type=str,
+            default=None,
+            help="Arquivo com o último id processado; lido no início e "
+            "atualizado a cada página.",
+        )
+        parser.add_argument(
+            "--page-size",
+            type=int,
+            default=200,
+            help="Mensagens lidas e gravadas por página (padrao: 200).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f"Mensagens por requisição (padrao: {DEFAULT_BATCH_SIZE}).",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=DEFAULT_CONCURRENCY,
+            help=f"Requisições simultâneas (padrao: {DEFAULT_CONCURRENCY}).",
+        )
+        parser.add_argument(
+            "--requests-per-minute",
+            type=float,
+            default=DEFAULT_REQUESTS_PER_MINUTE,
+            help=f"Limite de requisições por minuto (padrao: {DEFAULT_REQUESTS_PER_MINUTE}).",
+        )
+        parser.add_argument(
+            "--llm-only",
+            action="store_true",
+            help="Ignora classificações gravadas; toda mensagem vai ao LLM.",
+        )
+        parser.add_argument(
+            "--local-model",
+            action="store_true",
+            help="Aceita o classificador local quando confiante (grava "
+            "previsões locais como tema; desligado por padrão).",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=None,
+            help="Máximo de mensagens a processar (padrao: todas).",
+        )
+
+    def handle(self, *args, **options):
+        cursor_file = Path(options["cursor_file"]) if options["cursor_file"] else None
+        last_id = options["after_id"]
+        if last_id is None and cursor_file is not None and cursor_file.exists():
+            try:
+                last_id = int(cursor_file.read_text().strip() or 0)
+            except ValueError as exc:
+                raise CommandError(f"Cursor inválido em {cursor_file}.") from exc
+        last_id = last_id or 0
+
+        try:
+            classifier = BatchThemeClassifier(
+                batch_size=options["batch_size"],
+                concurrency=options["concurrency"],
+                requests_per_minute=options["requests_per_minute"],
+                use_stored=not options["llm_only"],
+                use_local_model=options["local_model"] and not options["llm_only"],
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc)) from exc
+
+        queryset = Message.objects.filter(role=options["role"]).exclude(content="")
+        if not options["all"]:
+            queryset = queryset.filter(theme__isnull=True)
+        page_size = max(options["page_size"], 1)
+        limit = options["limit"]
+        processed = 0
+        classified = 0
+        without_llm = 0
+        llm_requests = 0
+        unresolved = []
+        while limit is None or processed < limit:
+            size = page_size if limit is None else min(page_size, limit - processed)
+            page = list(
+                queryset.filter(id__gt=last_id)
+                .order_by("id")
+                .only("id", "content", "theme_id")[:size]
+            )
+            if not page:
+                break
+            result = classifier.classify_messages(page)
+            last_id = page[-1].id
+            if cursor_file is not None:
+                cursor_file.write_text(f"{last_id}\n")
+
+            processed += len(page)
+            classified += len(result.theme_ids)
+            without_llm += result.resolved_without_llm
+            llm_requests += result.llm_requests
+            unresolved.extend(result.unresolved)
+            self.stdout.write(
+                f"processed={processed} classified={classified} "
+                f"without_llm={without_llm} llm_requests={llm_requests} "
+                f"unresolved={len(unresolved)} last_message_id={last_id}"
+            )
+
+        if unresolved:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Sem tema ({len(unresolved)}): "
+                    + ", ".join(str(message_id) for message_id in unresolved[:50])
+                )
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Classificação concluída: {classified}/{processed} mensagens, "
+                f"{llm_requests} requisições ao LLM, cursor={last_id}."
+            )
+        )
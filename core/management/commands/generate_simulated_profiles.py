@@ -5,8 +5,10 @@ from django.core.management.base import BaseCommand
 from django.db.models import Q
 from faker import Faker
 
+from core.message_payloads import store_message_payload
 from core.models import Message, Profile, Theme
 from services.chat_service import ChatService
+from services.openai_rate_limiter import PRIORITY_SIMULATION, openai_priority
 from services.simulation_service import (
     PREDEFINED_SCENARIOS,
     SimulatedUserProfile,
@@ -81,6 +83,7 @@ class Command(BaseCommand):
             raise ValueError("--turns inválido. No intervalo A-B, A deve ser <= B.")
         return start, end
 
+    @openai_priority(PRIORITY_SIMULATION)
     def handle(self, *args, **options):
         count = int(options["count"])
         turns_min, turns_max = self._parse_turns_option(options["turns"])
@@ -242,13 +245,13 @@ class Command(BaseCommand):
                 content=user_text,
                 channel="simulation",
                 generated_by_simulator=True,
-                ollama_prompt=user_payload,
                 theme=(
                     initial_simulation_theme if turn == 1 else locked_conversation_theme
                 ),
             )
             user_message.block_root = user_message
             user_message.save(update_fields=["block_root"])
+            store_message_payload(user_message, user_payload)
 
             try:
                 chat_service.generate_response_message(
@@ -0,0 +1,110 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.message_payloads import encode_payload, split_prompt_texts
+from core.models import Message, MessagePayload, PromptText
+
+
+class Command(BaseCommand):
+    help = (
+        "Move os payloads inline (Message.ollama_prompt) para MessagePayload "
+        "comprimido, com textos de prompt deduplicados por hash em PromptText, "
+        "e informa os bytes economizados."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=200,
+            help="Mensagens por transação (padrao: 200).",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=None,
+            help="Máximo de mensagens a migrar (padrao: todas).",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(options["batch_size"], 1)
+        limit = options["limit"]
+        migrated = 0
+        inline_bytes = 0
+        payload_bytes = 0
+        prompt_text_bytes = 0
+        last_id = 0
+        while limit is None or migrated < limit:
+            size = batch_size if limit is None else min(batch_size, limit - migrated)
+            batch = list(
+                Message.objects.filter(
+                    id__gt=last_id,
+                    ollama_prompt__isnull=False,
+                    payload_record__isnull=True,
+                )
+                .order_by("id")
+                .only("id", "ollama_prompt")[:size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            records = []
+            texts = {}
+            for message in batch:
+                inline_bytes += len(
+                    json.dumps(message.ollama_prompt, ensure_ascii=False).encode(
+                        "utf-8"
+                    )
+                )
+                stored_payload, message_texts = split_prompt_texts(
+                    message.ollama_prompt
+                )
+                texts.update(message_texts)
+                raw, data = encode_payload(stored_payload)
+                payload_bytes += len(data)
+                records.append(
+                    MessagePayload(message=message, data=data, raw_size=len(raw))
+                )
+
+            with transaction.atomic():
+                existing = set(
+                    PromptText.objects.filter(content_hash__in=texts).values_list(
+                        "content_hash", flat=True
+                    )
+                )
+                new_texts = {
+                    content_hash: text
+                    for content_hash, text in texts.items()
+                    if content_hash not in existing
+                }
+                PromptText.objects.bulk_create(
+                    [
+                        PromptText(content_hash=content_hash, content=text)
+                        for content_hash, text in new_texts.items()
+                    ],
+                    ignore_conflicts=True,
+                )
+                MessagePayload.objects.bulk_create(records)
+                Message.objects.filter(id__in=[message.id for message in batch]).update(
+                    ollama_prompt=None
+                )
+            prompt_text_bytes += sum(
+                len(text.encode("utf-8")) for text in new_texts.values()
+            )
+            migrated += len(batch)
+            self.stdout.write(f"migrated={migrated} last_message_id={last_id}")
+
+        stored_bytes = payload_bytes + prompt_text_bytes
+        self.stdout.write(
+            f"inline_bytes={inline_bytes} payload_bytes={payload_bytes} "
+            f"prompt_text_bytes={prompt_text_bytes}"
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Migração concluída. messages={migrated} "
+                f"bytes_saved={inline_bytes - stored_bytes}"
+            )
+        )
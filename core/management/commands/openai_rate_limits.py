@@ -0,0 +1,59 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from services.openai_rate_limiter import (
+    BUCKET_CHAT,
+    BUCKET_IMAGES,
+    PRIORITIES,
+    bucket_limits,
+    get_rate_limiter,
+    priority_reserve,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Mostra os limites de taxa da OpenAI (requisições e tokens por minuto), "
+        "o saldo atual de cada balde e o tempo de espera acumulado por classe "
+        "de prioridade."
+    )
+
+    def handle(self, *args, **options):
+        limiter = get_rate_limiter()
+        if limiter is None:
+            raise CommandError("Limitador desativado (OPENAI_RATE_LIMIT_BACKEND=off).")
+
+        reserves = ", ".join(
+            f"{priority}={priority_reserve(priority):.0%}" for priority in PRIORITIES
+        )
+        self.stdout.write(
+            f"Backend: {type(limiter.backend).__name__}; reservas: {reserves}"
+        )
+        snapshot = limiter.backend.snapshot()
+        now = time.time()
+        for name in (BUCKET_CHAT, BUCKET_IMAGES):
+            limits = bucket_limits(name)
+            state = snapshot.get(name)
+            line = (
+                f"[{name}] limite rpm={limits.requests_per_minute:.0f} "
+                f"tpm={limits.tokens_per_minute:.0f}"
+            )
+            if state is not None:
+                line += (
+                    f" saldo requests={state['requests']:.1f} "
+                    f"tokens={state['tokens']:.0f} "
+                    f"(há {now - state['refilled_at']:.0f}s)"
+                )
+            self.stdout.write(line)
+            for priority, entry in sorted((state or {}).get("stats", {}).items()):
+                calls = entry.get("calls", 0)
+                wait_seconds = entry.get("wait_seconds", 0.0)
+                self.stdout.write(
+                    f"  {priority}: chamadas={calls} "
+                    f"com_espera={entry.get('waited_calls', 0)} "
+                    f"espera_total={wait_seconds:.1f}s "
+                    f"espera_media={wait_seconds / calls if calls else 0:.3f}s "
+                    f"espera_max={entry.get('max_wait_seconds', 0.0):.1f}s"
+                )
+        self.stdout.write(self.style.SUCCESS("Limites consultados."))
@@ -0,0 +1,199 @@
+"""Compressed storage of message observability payloads."""
+
+import hashlib
+import json
+import threading
+import zlib
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+from core.models import Message, MessagePayload, PromptText
+
+PAYLOAD_COMPRESSION_LEVEL = 6
+# Prompt texts at least this long are stored in PromptText.
+PROMPT_TEXT_MIN_CHARS = 200
+# Paragraphs of segmented prompts at least this long are stored in PromptText.
+# A reference is 64 hex chars that do not compress, so shorter paragraphs are
+# cheaper inline in the compressed payload.
+PROMPT_SEGMENT_MIN_CHARS = 800
+PROMPT_TEXT_REF_KEY = "prompt_text"
+PROMPT_SEGMENTS_REF_KEY = "prompt_segments"
+PROMPT_SEGMENT_SEPARATOR = "\n\n"
+# Prompts rebuilt from blocks every turn. They are stored paragraph by
+# paragraph, so a block repeated across turns is stored once even when the
+# rest of the prompt changed.
+SEGMENTED_PROMPT_KEYS = frozenset({"runtime_prompt"})
+_PROMPT_TEXT_CACHE_SIZE = 1024
+
+_prompt_text_cache: Dict[str, str] = {}
+_prompt_text_cache_lock = threading.Lock()
+
+
+def prompt_text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _is_prompt_text_ref(value: Any) -> bool:
+    return (
+        isinstance(value, dict)
+        and len(value) == 1
+        and isinstance(value.get(PROMPT_TEXT_REF_KEY), str)
+    )
+
+
+def _is_prompt_segments_ref(value: Any) -> bool:
+    return (
+        isinstance(value, dict)
+        and len(value) == 1
+        and isinstance(value.get(PROMPT_SEGMENTS_REF_KEY), list)
+    )
+
+
+def _text_ref(text: str, texts: Dict[str, str]) -> Dict[str, str]:
+    content_hash = prompt_text_hash(text)
+    texts[content_hash] = text
+    return {PROMPT_TEXT_REF_KEY: content_hash}
+
+
+def split_prompt_texts(payload: Any) -> Tuple[Any, Dict[str, str]]:
+    """
+    Copy of `payload` with long texts under payload["prompts"] replaced by
+    references, and the referenced texts by hash. A text becomes
+    {"prompt_text": <sha256>}; a SEGMENTED_PROMPT_KEYS prompt becomes
+    {"prompt_segments": [...]} whose items are short paragraphs inline or
+    {"prompt_text": <sha256>} references. Component versions stay in
+    payload["prompts"]["versions"].
+    """
+    texts: Dict[str, str] = {}
+    if not isinstance(payload, dict) or not isinstance(payload.get("prompts"), dict):
+        return payload, texts
+    prompts = {}
+    for key, value in payload["prompts"].items():
+        if isinstance(value, str) and len(value) >= PROMPT_TEXT_MIN_CHARS:
+            if key in SEGMENTED_PROMPT_KEYS:
+                value = {
+                    PROMPT_SEGMENTS_REF_KEY: [
+                        (
+                            _text_ref(segment, texts)
+                            if len(segment) >= PROMPT_SEGMENT_MIN_CHARS
+                            else segment
+                        )
+                        for segment in value.split(PROMPT_SEGMENT_SEPARATOR)
+                    ]
+                }
+            else:
+                value = _text_ref(value, texts)
+        prompts[key] = value
+    return {**payload, "prompts": prompts}, texts
+
+
+def save_prompt_texts(texts: Dict[str, str]) -> None:
+    """Insert texts not stored yet; existing hashes are left alone."""
+    if not texts:
+        return
+    PromptText.objects.bulk_create(
+        [
+            PromptText(content_hash=content_hash, content=text)
+            for content_hash, text in texts.items()
+        ],
+        ignore_conflicts=True,
+    )
+    _remember_prompt_texts(texts)
+
+
+def _referenced_hashes(value: Any) -> Iterator[str]:
+    if _is_prompt_text_ref(value):
+        yield value[PROMPT_TEXT_REF_KEY]
+    elif _is_prompt_segments_ref(value):
+        for segment in value[PROMPT_SEGMENTS_REF_KEY]:
+            if _is_prompt_text_ref(segment):
+                yield segment[PROMPT_TEXT_REF_KEY]
+
+
+def _resolve(value: Any, texts: Dict[str, str]) -> Any:
+    if _is_prompt_text_ref(value):
+        content_hash = value[PROMPT_TEXT_REF_KEY]
+        if content_hash not in texts:
+            raise RuntimeError(f"Prompt text '{content_hash}' not found.")
+        return texts[content_hash]
+    if _is_prompt_segments_ref(value):
+        return PROMPT_SEGMENT_SEPARATOR.join(
+            _resolve(segment, texts) for segment in value[PROMPT_SEGMENTS_REF_KEY]
+        )
+    return value
+
+
+def expand_prompt_texts(payload: Any) -> Any:
+    """Inverse of split_prompt_texts(); texts are fetched in one query."""
+    if not isinstance(payload, dict) or not isinstance(payload.get("prompts"), dict):
+        return payload
+    hashes = {
+        content_hash
+        for value in payload["prompts"].values()
+        for content_hash in _referenced_hashes(value)
+    }
+    if not hashes:
+        return payload
+    texts = get_prompt_texts(hashes)
+    prompts = {key: _resolve(value, texts) for key, value in payload["prompts"].items()}
+    return {**payload, "prompts": prompts}
+
+
+def get_prompt_texts(hashes: Iterable[str]) -> Dict[str, str]:
+    """Texts by hash; content-addressed rows never change, so they are cached."""
+    hashes = set(hashes)
+    with _prompt_text_cache_lock:
+        found = {
+            content_hash: _prompt_text_cache[content_hash]
+            for content_hash in hashes
+            if content_hash in _prompt_text_cache
+        }
+    missing = hashes - found.keys()
+    if missing:
+        loaded = dict(
+            PromptText.objects.filter(content_hash__in=missing).values_list(
+                "content_hash", "content"
+            )
+        )
+        _remember_prompt_texts(loaded)
+        found.update(loaded)
+    return found
+
+
+def _remember_prompt_texts(texts: Dict[str, str]) -> None:
+    with _prompt_text_cache_lock:
+        if len(_prompt_text_cache) + len(texts) > _PROMPT_TEXT_CACHE_SIZE:
+            _prompt_text_cache.clear()
+        _prompt_text_cache.update(texts)
+
+
+def encode_payload(payload: Any) -> Tuple[bytes, bytes]:
+    """(raw JSON, zlib-compressed JSON)."""
+    raw = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return raw, zlib.compress(raw, PAYLOAD_COMPRESSION_LEVEL)
+
+
+def decode_payload(data: bytes) -> Any:
+    return json.loads(zlib.decompress(bytes(data)).decode("utf-8"))
+
+
+def store_message_payload(message: Message, payload: Any) -> Optional[MessagePayload]:
+    """Save `payload` for `message` out of line; None payloads are not stored."""
+    if payload is None:
+        return None
+    stored_payload, texts = split_prompt_texts(payload)
+    save_prompt_texts(texts)
+    raw, data = encode_payload(stored_payload)
+    record = MessagePayload.objects.create(
+        message=message, data=data, raw_size=len(raw)
+    )
+    message.__dict__["prompt_payload"] = payload
+    return record
+
+
+def load_message_payload(message: Message) -> Any:
+    """The message's payload from MessagePayload, or its legacy inline value."""
+    try:
+        record = message.payload_record
+    except MessagePayload.DoesNotExist:
+        return message.ollama_prompt
+    return expand_prompt_texts(decode_payload(record.data))
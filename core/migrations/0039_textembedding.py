@@ -0,0 +1,56 @@
+# Generated by Django 4.2.27 on 2026-10-16 20:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0038_remove_rag_and_bibletextflat"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TextEmbedding",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "model",
+                    models.CharField(
+                        help_text="Embedding model that produced the vector",
+                        max_length=120,
+                    ),
+                ),
+                (
+                    "content_hash",
+                    models.CharField(
+                        help_text="SHA-256 hex digest of the embedded text",
+                        max_length=64,
+                    ),
+                ),
+                (
+                    "vector",
+                    models.BinaryField(help_text="Embedding vector packed as float32"),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "db_table": "text_embedding",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="textembedding",
+            constraint=models.UniqueConstraint(
+                fields=("model", "content_hash"),
+                name="uniq_text_embedding_model_hash",
+            ),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 4.2.27 on 2026-10-16 21:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0039_textembedding"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MessageEmbedding",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "model",
+                    models.CharField(
+                        help_text="Embedding model that produced the vector",
+                        max_length=120,
+                    ),
+                ),
+                (
+                    "vector",
+                    models.BinaryField(help_text="Embedding vector packed as float32"),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "message",
+                    models.ForeignKey(
+                        help_text="Message whose content was embedded",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="embeddings",
+                        to="core.message",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "message_embedding",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="messageembedding",
+            constraint=models.UniqueConstraint(
+                fields=("message", "model"),
+                name="uniq_message_embedding_message_model",
+            ),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.27 on 2026-10-16 23:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0040_messageembedding"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="profile",
+            name="ngram_ban_index",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                help_text="Rolling-hash n-grams of the latest assistant messages (anti-repetition)",
+            ),
+        ),
+    ]
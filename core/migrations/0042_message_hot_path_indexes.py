@@ -0,0 +1,39 @@
+# Generated by Django 4.2.27 on 2026-10-16 22:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0041_profile_ngram_ban_index"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(
+                fields=["profile", "role", "created_at"],
+                name="msg_profile_role_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(
+                fields=["profile", "role", "score", "created_at"],
+                name="msg_profile_role_score_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(
+                condition=models.Q(
+                    models.Q(("role", "system"), _negated=True),
+                    models.Q(("role", "analysis"), _negated=True),
+                    ("exclude_from_context", False),
+                ),
+                fields=["profile", "created_at"],
+                name="msg_in_context_idx",
+            ),
+        ),
+    ]
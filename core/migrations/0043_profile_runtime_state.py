@@ -0,0 +1,22 @@
+# Generated by Django 4.2.27 on 2026-10-16 23:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0042_message_hot_path_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="profile",
+            name="runtime_state",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                help_text="Runtime counters carried to the next turn, saved with each assistant reply",
+            ),
+        ),
+    ]
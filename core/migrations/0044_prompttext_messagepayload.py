@@ -0,0 +1,85 @@
+# Generated by Django 4.2.27 on 2026-10-16 23:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0043_profile_runtime_state"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PromptText",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "content_hash",
+                    models.CharField(
+                        help_text="SHA-256 hex digest of the text", max_length=64
+                    ),
+                ),
+                ("content", models.TextField(help_text="Prompt text")),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "db_table": "prompt_text",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="prompttext",
+            constraint=models.UniqueConstraint(
+                fields=("content_hash",),
+                name="uniq_prompt_text_content_hash",
+            ),
+        ),
+        migrations.CreateModel(
+            name="MessagePayload",
+            fields=[
+                (
+                    "message",
+                    models.OneToOneField(
+                        help_text="Message this payload was recorded for",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="payload_record",
+                        serialize=False,
+                        to="core.message",
+                    ),
+                ),
+                (
+                    "data",
+                    models.BinaryField(help_text="zlib-compressed JSON payload"),
+                ),
+                (
+                    "raw_size",
+                    models.PositiveIntegerField(
+                        help_text="Size in bytes of the uncompressed JSON"
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "db_table": "message_payload",
+            },
+        ),
+        migrations.AlterField(
+            model_name="message",
+            name="ollama_prompt",
+            field=models.JSONField(
+                blank=True,
+                help_text="Legacy inline prompt payload; new payloads are stored in MessagePayload",
+                null=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.27 on 2026-10-16 23:55
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0044_prompttext_messagepayload"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="theme",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 4.2.27 on 2026-10-16 23:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0045_theme_updated_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ThemeClassification",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "text_hash",
+                    models.CharField(
+                        help_text="SHA-256 hex digest of the normalized text",
+                        max_length=64,
+                    ),
+                ),
+                (
+                    "catalog_version",
+                    models.CharField(
+                        help_text="ThemeCatalog.version the text was classified against",
+                        max_length=64,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "theme",
+                    models.ForeignKey(
+                        help_text="Theme returned by the classifier",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="core.theme",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "theme_classification",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="themeclassification",
+            constraint=models.UniqueConstraint(
+                fields=("catalog_version", "text_hash"),
+                name="uniq_theme_classification_version_hash",
+            ),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.27 on 2026-10-16 23:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0046_themeclassification"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RateLimitBucket",
+            fields=[
+                (
+                    "name",
+                    models.CharField(max_length=64, primary_key=True, serialize=False),
+                ),
+                (
+                    "requests",
+                    models.FloatField(help_text="Requests left in the bucket"),
+                ),
+                ("tokens", models.FloatField(help_text="Tokens left in the bucket")),
+                (
+                    "refilled_at",
+                    models.FloatField(help_text="Unix time of the last refill"),
+                ),
+                (
+                    "stats",
+                    models.JSONField(
+                        blank=True,
+                        default=dict,
+                        help_text="Acquisitions and waiting time by priority class",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "openai_rate_limit_bucket",
+            },
+        ),
+    ]
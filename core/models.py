@@ -1,4 +1,5 @@
 import json
+from functools import cached_property
 
 from django.db import models
 
@@ -18,6 +19,7 @@ class Theme(models.Model):
     )
     score = models.FloatField(null=True, blank=True)
     improvement = models.TextField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         db_table = "theme"
@@ -155,6 +157,16 @@ class Profile(models.Model):
         null=True,
         help_text="Latest simulated user behavior controls and generation metadata",
     )
+    ngram_ban_index = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text="Rolling-hash n-grams of the latest assistant messages (anti-repetition)",
+    )
+    runtime_state = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text="Runtime counters carried to the next turn, saved with each assistant reply",
+    )
 
     class Meta:
         ordering = ["-created_at"]
@@ -213,7 +225,7 @@ class Message(models.Model):
     ollama_prompt = models.JSONField(
         null=True,
         blank=True,
-        help_text="Full Ollama prompt payload sent to LLM (for observability)",
+        help_text="Legacy inline prompt payload; new payloads are stored in MessagePayload",
     )
     exclude_from_context = models.BooleanField(
         default=False,
@@ -251,24 +263,213 @@ class Message(models.Model):
 
     class Meta:
         ordering = ["created_at"]
+        # Matched to the hot paths; check_message_query_plans verifies them.
+        indexes = [
+            # Last message of a role (chat page, export pairing, turn fallbacks).
+            models.Index(
+                fields=["profile", "role", "created_at"],
+                name="msg_profile_role_created_idx",
+            ),
+            # Social export candidates, ordered by score.
+            models.Index(
+                fields=["profile", "role", "score", "created_at"],
+                name="msg_profile_role_score_idx",
+            ),
+            # MessageManager.for_context(): the turn context window.
+            models.Index(
+                fields=["profile", "created_at"],
+                name="msg_in_context_idx",
+                condition=~models.Q(role="system")
+                & ~models.Q(role="analysis")
+                & models.Q(exclude_from_context=False),
+            ),
+        ]
+
+    @cached_property
+    def prompt_payload(self):
+        """
+        Observability payload sent to the LLM, loaded on first access from
+        MessagePayload, or from the inline `ollama_prompt` for legacy rows.
+        """
+        from core.message_payloads import load_message_payload
+
+        return load_message_payload(self)
 
     @property
     def ollama_prompt_pretty_json(self) -> str:
         """
-        Return ollama_prompt as a human-readable JSON string for UI rendering.
+        Return the prompt payload as a human-readable JSON string for UI rendering.
 
         Keeps backward compatibility if legacy rows still contain plain text.
         """
-        if self.ollama_prompt is None:
+        payload = self.prompt_payload
+        if payload is None:
             return ""
-        if isinstance(self.ollama_prompt, (dict, list)):
-            return json.dumps(self.ollama_prompt, indent=2, ensure_ascii=False)
-        return str(self.ollama_prompt)
+        if isinstance(payload, (dict, list)):
+            return json.dumps(payload, indent=2, ensure_ascii=False)
+        return str(payload)
 
     def __str__(self):
         return f"{self.role}: {self.content[:50]}..."
 
 
+class TextEmbedding(models.Model):
+    """
+    Persistent embedding vector for a piece of text.
+
+    Rows are keyed by embedding model and SHA-256 of the embedded text, so the
+    same text is only sent to the embedding server once per model.
+    """
+
+    model = models.CharField(
+        max_length=120,
+        help_text="Embedding model that produced the vector",
+    )
+    content_hash = models.CharField(
+        max_length=64,
+        help_text="SHA-256 hex digest of the embedded text",
+    )
+    vector = models.BinaryField(help_text="Embedding vector packed as float32")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "text_embedding"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["model", "content_hash"],
+                name="uniq_text_embedding_model_hash",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.model}:{self.content_hash[:12]}"
+
+
+class MessageEmbedding(models.Model):
+    """
+    Embedding of a message's content, computed once after the message is saved.
+
+    Message content never changes after insert, so the runtime similarity
+    checks read these rows instead of re-embedding conversation history.
+    """
+
+    message = models.ForeignKey(
+        Message,
+        on_delete=models.CASCADE,
+        related_name="embeddings",
+        help_text="Message whose content was embedded",
+    )
+    model = models.CharField(
+        max_length=120,
+        help_text="Embedding model that produced the vector",
+    )
+    vector = models.BinaryField(help_text="Embedding vector packed as float32")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "message_embedding"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["message", "model"],
+                name="uniq_message_embedding_message_model",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.model}:message={self.message_id}"
+
+
+class ThemeClassification(models.Model):
+    """
+    Theme the classifier returned for a text, keyed by the hash of the
+    normalized text and the theme catalog version it was classified against.
+    """
+
+    text_hash = models.CharField(
+        max_length=64,
+        help_text="SHA-256 hex digest of the normalized text",
+    )
+    catalog_version = models.CharField(
+        max_length=64,
+        help_text="ThemeCatalog.version the text was classified against",
+    )
+    theme = models.ForeignKey(
+        Theme,
+        on_delete=models.CASCADE,
+        related_name="+",
+        help_text="Theme returned by the classifier",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "theme_classification"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["catalog_version", "text_hash"],
+                name="uniq_theme_classification_version_hash",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.text_hash[:12]}:theme={self.theme_id}"
+
+
+class PromptText(models.Model):
+    """
+    Prompt text referenced by hash from message payloads.
+
+    The same system prompt (and often the same runtime prompt) is sent on many
+    turns; it is stored here once instead of in every payload.
+    """
+
+    content_hash = models.CharField(
+        max_length=64,
+        help_text="SHA-256 hex digest of the text",
+    )
+    content = models.TextField(help_text="Prompt text")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "prompt_text"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["content_hash"],
+                name="uniq_prompt_text_content_hash",
+            ),
+        ]
+
+    def __str__(self):
+        return self.content_hash[:12]
+
+
+class MessagePayload(models.Model):
+    """
+    Observability payload of a message (prompts, evaluation attempts, round
+    metadata), kept out of core_message as zlib-compressed JSON.
+
+    Read through Message.prompt_payload; see core.message_payloads.
+    """
+
+    message = models.OneToOneField(
+        Message,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="payload_record",
+        help_text="Message this payload was recorded for",
+    )
+    data = models.BinaryField(help_text="zlib-compressed JSON payload")
+    raw_size = models.PositiveIntegerField(
+        help_text="Size in bytes of the uncompressed JSON",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "message_payload"
+
+    def __str__(self):
+        return f"payload:message={self.message_id}"
+
+
 class SocialMediaExport(models.Model):
     STATUS_PENDING = "pending"
     STATUS_LIKED = "liked"
@@ -335,3 +536,27 @@ class SocialMediaExport(models.Model):
 
     def __str__(self):
         return f"Export {self.id} | message={self.original_message_id} | {self.status}"
+
+
+class RateLimitBucket(models.Model):
+    """
+    Shared token-bucket state of one OpenAI rate limit (see
+    services.openai_rate_limiter), so every worker process draws from the same
+    per-minute budget.
+    """
+
+    name = models.CharField(max_length=64, primary_key=True)
+    requests = models.FloatField(help_text="Requests left in the bucket")
+    tokens = models.FloatField(help_text="Tokens left in the bucket")
+    refilled_at = models.FloatField(help_text="Unix time of the last refill")
+    stats = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text="Acquisitions and waiting time by priority class",
+    )
+
+    class Meta:
+        db_table = "openai_rate_limit_bucket"
+
+    def __str__(self):
+        return self.name
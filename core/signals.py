@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.models import Theme
+from services.theme_catalog import invalidate_theme_catalog
+
+
+@receiver(post_save, sender=Theme)
+@receiver(post_delete, sender=Theme)
+def invalidate_on_theme_change(sender, instance, **kwargs):
+    invalidate_theme_catalog()
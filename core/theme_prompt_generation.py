@@ -1,9 +1,9 @@
 import json
 import os
 
-from openai import OpenAI
-
 from core.models import Theme
+from services.openai_client import get_openai_client
+from services.openai_rate_limiter import PRIORITY_BATCH, openai_priority
 
 REQUEST_TIMEOUT_SECONDS = 120
 MAX_COMPLETION_TOKENS = 1200
@@ -49,13 +49,14 @@ def _build_theme_prompt_generation_input(theme_name: str) -> str:
     )
 
 
+@openai_priority(PRIORITY_BATCH)
 def evaluate_theme_meta_prompt(meta_prompt: str) -> tuple[float, str]:
     openai_api_key = os.environ.get("OPENAI_API_KEY")
     if not openai_api_key:
         raise RuntimeError("Variável OPENAI_API_KEY é obrigatória.")
 
     model = _get_openai_model()
-    client = OpenAI(api_key=openai_api_key)
+    client = get_openai_client(openai_api_key)
 
     evaluation_prompt = (
         "Avalie o meta_prompt abaixo para uso pastoral em chatbot cristão evangélico.\n"
@@ -139,6 +140,7 @@ def evaluate_theme_meta_prompt(meta_prompt: str) -> tuple[float, str]:
     return score, improvement_raw.strip()
 
 
+@openai_priority(PRIORITY_BATCH)
 def build_theme_prompt_partial(theme: Theme) -> str:
     openai_api_key = os.environ.get("OPENAI_API_KEY")
     if not openai_api_key:
@@ -147,7 +149,7 @@ def build_theme_prompt_partial(theme: Theme) -> str:
 
     prompt = _build_theme_prompt_generation_input(theme_name=theme.name)
 
-    client = OpenAI(api_key=openai_api_key)
+    client = get_openai_client(openai_api_key)
 
     response = client.chat.completions.create(
         model=model,
@@ -251,7 +253,7 @@ def build_theme_prompt_partial(theme: Theme) -> str:
     theme.meta_prompt = meta_prompt
     theme.score = score
     theme.improvement = improvement
-    theme.save(update_fields=["meta_prompt", "score", "improvement"])
+    theme.save(update_fields=["meta_prompt", "score", "improvement", "updated_at"])
     return meta_prompt
 
 
@@ -9,8 +9,10 @@ from django.urls import reverse
 from django.views import View
 from faker import Faker
 
+from core.message_payloads import store_message_payload
 from core.models import Message, Profile, Theme
 from services.chat_service import ChatService
+from services.openai_rate_limiter import PRIORITY_SIMULATION, openai_priority
 from services.simulation_service import SimulatedUserProfile, SimulationUseCase
 
 logger = logging.getLogger(__name__)
@@ -64,7 +66,7 @@ class ChatView(View):
                 # Get messages for this profile
                 messages = (
                     Message.objects.filter(profile=selected_profile)
-                    .select_related("profile", "theme")
+                    .select_related("profile", "theme", "payload_record")
                     .order_by("created_at")
                 )
                 last_assistant_message = (
@@ -81,7 +83,7 @@ class ChatView(View):
             selected_profile = profiles.first()
             messages = (
                 Message.objects.filter(profile=selected_profile)
-                .select_related("profile", "theme")
+                .select_related("profile", "theme", "payload_record")
                 .order_by("created_at")
             )
             last_assistant_message = (
@@ -179,10 +181,10 @@ class ChatView(View):
             role="user",
             content=message_text,
             channel="chat",
-            ollama_prompt=user_prompt_payload,
         )
         user_message.block_root = user_message
         user_message.save(update_fields=["block_root"])
+        store_message_payload(user_message, user_prompt_payload)
 
         chat_service = ChatService()
         try:
@@ -218,6 +220,7 @@ class ChatView(View):
         # Redirect to chat with new profile selected
         return redirect(f"{reverse('chat')}?profile_id={profile.id}")
 
+    @openai_priority(PRIORITY_SIMULATION)
     def _handle_simulate(self, request):
         profile_id = request.POST.get("profile_id")
         emotional_profile = request.POST.get(
@@ -306,6 +309,7 @@ class ChatView(View):
         )
         return redirect(f"{reverse('chat')}?{query}")
 
+    @openai_priority(PRIORITY_SIMULATION)
     def _handle_simulate_conversation(self, request):
         profile_id = request.POST.get("profile_id")
         emotional_profile = request.POST.get(
@@ -418,7 +422,6 @@ class ChatView(View):
                     content=user_text,
                     channel="simulation",
                     generated_by_simulator=True,
-                    ollama_prompt=user_payload,
                     theme=(
                         initial_simulation_theme
                         if turn == 1
@@ -427,6 +430,7 @@ class ChatView(View):
                 )
                 user_message.block_root = user_message
                 user_message.save(update_fields=["block_root"])
+                store_message_payload(user_message, user_payload)
 
                 if turn != 1 and locked_conversation_theme is None:
                     locked_conversation_theme = (
@@ -4,6 +4,8 @@ from django.http import HttpResponseRedirect
 
 from prompts.models import PromptComponent, PromptComponentVersion
 from prompts.prompt_evolution import evaluate_prompt_content, regenerate_prompt_content
+from prompts.prompt_registry import invalidate_prompt_cache
+from prompts.prompt_templates import PromptTemplateError, validate_prompt_template
 
 
 class PromptComponentVersionInline(admin.TabularInline):
@@ -67,7 +69,11 @@ class PromptComponentAdmin(admin.ModelAdmin):
     def regenerate_and_evaluate_prompts(self, request, queryset):
         processed = 0
         for component in queryset:
-            self._regenerate_component(component)
+            try:
+                self._regenerate_component(component)
+            except PromptTemplateError as exc:
+                self.message_user(request, str(exc), level=messages.ERROR)
+                continue
             processed += 1
 
         self.message_user(
@@ -78,7 +84,11 @@ class PromptComponentAdmin(admin.ModelAdmin):
 
     def response_change(self, request, obj):
         if "_regenerate_prompt" in request.POST:
-            regeneration_result = self._regenerate_component(obj)
+            try:
+                regeneration_result = self._regenerate_component(obj)
+            except PromptTemplateError as exc:
+                self.message_user(request, str(exc), level=messages.ERROR)
+                return HttpResponseRedirect(request.path)
             self.message_user(
                 request,
                 (
@@ -93,6 +103,8 @@ class PromptComponentAdmin(admin.ModelAdmin):
 
     def _regenerate_component(self, component):
         description_command, regenerated_prompt = regenerate_prompt_content(component)
+        # Reject a regenerated template that would fail at render time.
+        validate_prompt_template(component.key, regenerated_prompt)
         score, analysis, improvement = evaluate_prompt_content(
             component=component,
             description_command=description_command,
@@ -155,7 +167,11 @@ class PromptComponentVersionAdmin(admin.ModelAdmin):
 
     @admin.action(description="Aprovar versões selecionadas")
     def approve_versions(self, request, queryset):
+        component_ids = list(queryset.values_list("component_id", flat=True))
         updated = queryset.update(status="approved")
+        # queryset.update() sends no signals; an active version may have
+        # just been demoted.
+        invalidate_prompt_cache(component_ids)
         self.message_user(
             request,
             f"{updated} versão(ões) marcada(s) como approved.",
@@ -166,6 +182,15 @@ class PromptComponentVersionAdmin(admin.ModelAdmin):
     def activate_versions(self, request, queryset):
         updated = 0
         for item in queryset.select_related("component"):
+            try:
+                validate_prompt_template(item.component.key, item.content)
+            except PromptTemplateError as exc:
+                self.message_user(
+                    request,
+                    f"{item.component.key} v{item.version} não ativada: {exc}",
+                    level=messages.ERROR,
+                )
+                continue
             PromptComponentVersion.objects.filter(component=item.component).exclude(
                 id=item.id
             ).filter(status="active").update(status="approved")
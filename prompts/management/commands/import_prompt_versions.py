@@ -10,6 +10,7 @@ from prompts.prompt_defaults import (
     DEFAULT_RUNTIME_MODE_PROMPTS,
     DEFAULT_WACHAT_SYSTEM_PROMPT,
 )
+from prompts.prompt_templates import validate_prompt_template
 
 WELCOME_GENERATOR_PROMPT_TEMPLATE = """
 Gere somente uma mensagem inicial de boas-vindas em português brasileiro.
@@ -181,6 +182,7 @@ class Command(BaseCommand):
         content_clean = (content or "").strip()
         if not content_clean:
             raise RuntimeError(f"Prompt vazio para componente '{key}'.")
+        validate_prompt_template(key, content_clean)
 
         component, _ = PromptComponent.objects.get_or_create(
             key=key,
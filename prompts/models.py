@@ -1,7 +1,9 @@
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.db.models import Q
 
 from core.models import Theme
+from prompts.prompt_templates import PromptTemplateError, validate_prompt_template
 
 
 class PromptComponent(models.Model):
@@ -131,3 +133,12 @@ class PromptComponentVersion(models.Model):
 
     def __str__(self):
         return f"{self.component.key}@v{self.version}"
+
+    def clean(self):
+        super().clean()
+        if self.status != "active" or not self.component_id:
+            return
+        try:
+            validate_prompt_template(self.component.key, self.content)
+        except PromptTemplateError as exc:
+            raise ValidationError({"content": str(exc)}) from exc
@@ -4,6 +4,8 @@ import os
 from openai import OpenAI
 
 from prompts.models import PromptComponent, PromptComponentVersion
+from services.openai_client import get_openai_client
+from services.openai_rate_limiter import PRIORITY_BATCH, openai_priority
 
 REQUEST_TIMEOUT_SECONDS = 120
 MAX_COMPLETION_TOKENS = 1200
@@ -20,7 +22,7 @@ def _get_openai_client() -> OpenAI:
     api_key = os.environ.get("OPENAI_API_KEY")
     if not api_key:
         raise RuntimeError("Variável OPENAI_API_KEY é obrigatória.")
-    return OpenAI(api_key=api_key)
+    return get_openai_client(api_key)
 
 
 def _extract_response_text(response, message) -> str:
@@ -106,6 +108,7 @@ def _compose_next_description_command(
     )
 
 
+@openai_priority(PRIORITY_BATCH)
 def regenerate_prompt_content(component: PromptComponent) -> tuple[str, str]:
     model = _get_openai_model()
     client = _get_openai_client()
@@ -201,6 +204,7 @@ def regenerate_prompt_content(component: PromptComponent) -> tuple[str, str]:
     return next_description_command, prompt_clean
 
 
+@openai_priority(PRIORITY_BATCH)
 def evaluate_prompt_content(
     *,
     component: PromptComponent,
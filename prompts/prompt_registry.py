@@ -1,8 +1,16 @@
+import os
+import threading
+import time
 from dataclasses import dataclass
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple
+
+from django.db.models import Count, F, Max
+from django.utils import timezone
 
 from prompts.models import PromptComponent, PromptComponentVersion
 
+DEFAULT_PROMPT_CACHE_CHECK_SECONDS = 5.0
+
 
 @dataclass(frozen=True)
 class PromptSelection:
@@ -13,12 +21,140 @@ class PromptSelection:
     score: Optional[float]
 
 
+@dataclass(frozen=True)
+class PromptSnapshot:
+    """Every active prompt, keyed by component key."""
+
+    selections: Dict[str, PromptSelection]
+    runtime_mode_keys: Dict[str, str]
+
+
+def load_active_prompt_snapshot() -> PromptSnapshot:
+    """Load every active version with its component in one joined query."""
+    versions = (
+        PromptComponentVersion.objects.filter(
+            status="active", component__active_version=F("version")
+        )
+        .select_related("component")
+        .order_by("component__key")
+    )
+    selections: Dict[str, PromptSelection] = {}
+    runtime_mode_keys: Dict[str, str] = {}
+    for version in versions:
+        component = version.component
+        selections[component.key] = PromptSelection(
+            component_key=component.key,
+            version=version.version,
+            content=version.content,
+            description=version.description,
+            score=version.score,
+        )
+        if (
+            component.component_type == "runtime"
+            and component.scope == "mode"
+            and component.mode
+        ):
+            runtime_mode_keys[component.mode] = component.key
+    return PromptSnapshot(selections=selections, runtime_mode_keys=runtime_mode_keys)
+
+
+class PromptCache:
+    """
+    Process-wide snapshot of every active prompt.
+
+    The snapshot is loaded with one query. Saves in this process clear it
+    through prompts.signals. Other processes (admin, management commands,
+    other dynos) are picked up by a version stamp, max(updated_at) and count
+    of prompt_component, checked at most once every
+    PROMPT_CACHE_CHECK_SECONDS. Between checks lookups run no queries.
+    """
+
+    def __init__(self, check_seconds: Optional[float] = None):
+        if check_seconds is None:
+            check_seconds = float(
+                os.environ.get(
+                    "PROMPT_CACHE_CHECK_SECONDS", DEFAULT_PROMPT_CACHE_CHECK_SECONDS
+                )
+            )
+        self._check_seconds = check_seconds
+        self._snapshot: Optional[PromptSnapshot] = None
+        self._stamp: Optional[Tuple] = None
+        self._checked_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def snapshot(self) -> PromptSnapshot:
+        self._ensure_fresh()
+        with self._lock:
+            snapshot = self._snapshot
+        if snapshot is None:
+            snapshot = load_active_prompt_snapshot()
+            with self._lock:
+                self._snapshot = snapshot
+        return snapshot
+
+    def clear(self) -> None:
+        with self._lock:
+            self._snapshot = None
+            self._stamp = None
+            self._checked_at = None
+
+    def _ensure_fresh(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if (
+                self._checked_at is not None
+                and now - self._checked_at < self._check_seconds
+            ):
+                return
+        stamp = _prompt_version_stamp()
+        with self._lock:
+            if stamp != self._stamp:
+                self._snapshot = None
+                self._stamp = stamp
+            self._checked_at = now
+
+
+def _prompt_version_stamp() -> Tuple:
+    aggregate = PromptComponent.objects.aggregate(
+        updated_at=Max("updated_at"), components=Count("id")
+    )
+    return (aggregate["updated_at"], aggregate["components"])
+
+
+_PROMPT_CACHE = PromptCache()
+
+
+def invalidate_prompt_cache(component_ids=None) -> None:
+    """
+    Drop this process's cached prompts. With component_ids, also touch those
+    components so other processes see a new version stamp.
+    """
+    if component_ids:
+        PromptComponent.objects.filter(id__in=component_ids).update(
+            updated_at=timezone.now()
+        )
+    _PROMPT_CACHE.clear()
+
+
+def warm_prompt_cache() -> PromptSnapshot:
+    """Load the active prompt snapshot now, e.g. when a worker boots."""
+    return _PROMPT_CACHE.snapshot()
+
+
 class PromptRegistry:
     SYSTEM_COMPONENT_KEY = "system.main"
     EVALUATION_COMPONENT_KEY = "evaluation.response_quality"
     RUNTIME_MAIN_COMPONENT_KEY = "runtime.main"
 
     def get_active_prompt(self, component_key: str) -> PromptSelection:
+        selection = _PROMPT_CACHE.snapshot().selections.get(component_key)
+        if selection is None:
+            # Not in the snapshot: report why, or pick up a component created
+            # since the snapshot was loaded.
+            selection = self._load_active_prompt(component_key)
+        return selection
+
+    def _load_active_prompt(self, component_key: str) -> PromptSelection:
         component = PromptComponent.objects.filter(key=component_key).first()
         if not component:
             raise RuntimeError(f"Prompt component '{component_key}' not found.")
@@ -61,28 +197,8 @@ class PromptRegistry:
         return self.get_active_prompt(component_key)
 
     def get_runtime_prompts_for_modes(self) -> Dict[str, PromptSelection]:
-        selections: Dict[str, PromptSelection] = {}
-        components = PromptComponent.objects.filter(
-            component_type="runtime",
-            scope="mode",
-            active_version__isnull=False,
-        ).order_by("key")
-        for component in components:
-            mode = component.mode
-            if not mode:
-                continue
-            version = PromptComponentVersion.objects.filter(
-                component=component,
-                version=component.active_version,
-                status="active",
-            ).first()
-            if not version:
-                continue
-            selections[mode] = PromptSelection(
-                component_key=component.key,
-                version=version.version,
-                content=version.content,
-                description=version.description,
-                score=version.score,
-            )
-        return selections
+        snapshot = _PROMPT_CACHE.snapshot()
+        return {
+            mode: snapshot.selections[component_key]
+            for mode, component_key in snapshot.runtime_mode_keys.items()
+        }
@@ -0,0 +1,183 @@
+"""Active prompt versions that are str.format templates, compiled once."""
+
+import threading
+from dataclasses import dataclass
+from string import Formatter
+from typing import Any, Dict, FrozenSet, Optional, Tuple
+
+RUNTIME_MAIN_TEMPLATE_KEY = "runtime.main"
+TOPIC_EXTRACTOR_TEMPLATE_KEY = "topic.extractor.main"
+WELCOME_GENERATOR_TEMPLATE_KEY = "welcome.generator"
+
+# Fields each templated component may use. They must match the context the
+# caller renders with (ChatService._build_dynamic_runtime_prompt,
+# _build_topic_signal_prompt and generate_welcome_message).
+TEMPLATE_FIELDS: Dict[str, FrozenSet[str]] = {
+    RUNTIME_MAIN_TEMPLATE_KEY: frozenset(
+        {
+            "runtime_mode_prompt",
+            "runtime_mode",
+            "derived_mode",
+            "previous_mode",
+            "progress_state",
+            "previous_progress_state",
+            "mode_objective",
+            "spiritual_intensity",
+            "max_sentences",
+            "max_words",
+            "max_questions",
+            "spiritual_policy",
+            "practical_mode_block",
+            "progress_strategy_block",
+            "explicit_request_block",
+            "presencial_limit_block",
+            "artifact_request_block",
+            "antiloop_block",
+            "distress_block",
+            "repetition_block",
+            "assistant_openers_block",
+            "active_topic_block",
+            "top_topics_block",
+            "theme_block",
+            "theme_instruction_block",
+            "mode_actions_block",
+            "last_user_message",
+            "history_block",
+        }
+    ),
+    TOPIC_EXTRACTOR_TEMPLATE_KEY: frozenset(
+        {"current_topic", "last_user_message", "transcript"}
+    ),
+    WELCOME_GENERATOR_TEMPLATE_KEY: frozenset({"name", "gender_context"}),
+}
+
+
+class PromptTemplateError(RuntimeError):
+    pass
+
+
+@dataclass(frozen=True)
+class CompiledPromptTemplate:
+    """
+    A template parsed once into literal/field segments.
+
+    render() produces exactly what str.format(**context) would for plain
+    `{name}`, `{name!r}` and `{name:spec}` fields. Templates that use
+    attribute, index or nested-spec fields keep str.format as the renderer.
+    """
+
+    component_key: str
+    version: Optional[int]
+    source: str
+    fields: Tuple[str, ...]
+    segments: Tuple[Tuple[str, Optional[str], str, Optional[str]], ...]
+    simple: bool
+
+    def render(self, context: Dict[str, Any]) -> str:
+        for field_name in self.fields:
+            if field_name not in context:
+                raise PromptTemplateError(
+                    f"Prompt '{self.component_key}' missing required context "
+                    f"key '{field_name}'."
+                )
+        if not self.simple:
+            return self.source.format(**context)
+        parts = []
+        for literal, field_name, format_spec, conversion in self.segments:
+            parts.append(literal)
+            if field_name is None:
+                continue
+            value = context[field_name]
+            if conversion == "r":
+                value = repr(value)
+            elif conversion == "s":
+                value = str(value)
+            elif conversion == "a":
+                value = ascii(value)
+            parts.append(format(value, format_spec))
+        return "".join(parts)
+
+
+def compile_prompt_template(
+    component_key: str, content: str, version: Optional[int] = None
+) -> CompiledPromptTemplate:
+    """Parse `content` and check its fields; raises PromptTemplateError."""
+    try:
+        parsed = list(Formatter().parse(content))
+    except ValueError as exc:
+        raise PromptTemplateError(
+            f"Prompt '{component_key}' has invalid format syntax: {exc}."
+        ) from exc
+
+    fields = []
+    segments = []
+    simple = True
+    for literal, field_name, format_spec, conversion in parsed:
+        if field_name is None:
+            segments.append((literal, None, "", None))
+            continue
+        if not field_name or not field_name.isidentifier():
+            simple = False
+            root_name = field_name.split(".", 1)[0].split("[", 1)[0]
+            if not root_name or root_name.isdigit():
+                raise PromptTemplateError(
+                    f"Prompt '{component_key}' uses positional field "
+                    f"'{{{field_name}}}'; only named fields are supported."
+                )
+        else:
+            root_name = field_name
+        if format_spec and "{" in format_spec:
+            simple = False
+        if root_name not in fields:
+            fields.append(root_name)
+        segments.append((literal, field_name, format_spec or "", conversion))
+
+    allowed_fields = TEMPLATE_FIELDS.get(component_key)
+    if allowed_fields is not None:
+        unknown = [name for name in fields if name not in allowed_fields]
+        if unknown:
+            raise PromptTemplateError(
+                f"Prompt '{component_key}' uses unknown field(s): "
+                f"{', '.join(sorted(unknown))}."
+            )
+
+    return CompiledPromptTemplate(
+        component_key=component_key,
+        version=version,
+        source=content,
+        fields=tuple(fields),
+        segments=tuple(segments),
+        simple=simple,
+    )
+
+
+def is_templated_component(component_key: str) -> bool:
+    return component_key in TEMPLATE_FIELDS
+
+
+def validate_prompt_template(component_key: str, content: str) -> None:
+    """Raise PromptTemplateError if a templated component's content is invalid."""
+    if is_templated_component(component_key):
+        compile_prompt_template(component_key, content)
+
+
+_compiled_templates: Dict[Tuple[str, Optional[int]], CompiledPromptTemplate] = {}
+_compiled_templates_lock = threading.Lock()
+
+
+def get_compiled_template(selection) -> CompiledPromptTemplate:
+    """
+    Compiled template for a PromptSelection, cached by component key and
+    version. An edited version (same number, new content) is recompiled.
+    """
+    cache_key = (selection.component_key, selection.version)
+    with _compiled_templates_lock:
+        compiled = _compiled_templates.get(cache_key)
+    if compiled is not None and compiled.source == selection.content:
+        return compiled
+    compiled = compile_prompt_template(
+        selection.component_key, selection.content, version=selection.version
+    )
+    with _compiled_templates_lock:
+        _compiled_templates[cache_key] = compiled
+    return compiled
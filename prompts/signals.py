@@ -0,0 +1,19 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from prompts.models import PromptComponent, PromptComponentVersion
+from prompts.prompt_registry import invalidate_prompt_cache
+
+
+@receiver(post_save, sender=PromptComponent)
+@receiver(post_delete, sender=PromptComponent)
+def invalidate_on_component_change(sender, instance, **kwargs):
+    invalidate_prompt_cache()
+
+
+@receiver(post_save, sender=PromptComponentVersion)
+@receiver(post_delete, sender=PromptComponentVersion)
+def invalidate_on_version_change(sender, instance, **kwargs):
+    # Version edits do not touch the component row; bump it so other
+    # processes notice through the version stamp.
+    invalidate_prompt_cache([instance.component_id])
@@ -0,0 +1,316 @@
+"""Theme classification of many texts per request, for backfills."""
+
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from core.models import Message, ThemeClassification
+from services.local_theme_classifier import classify_locally
+from services.openai_client import run_openai_coroutine
+from services.openai_rate_limiter import PRIORITY_BATCH, openai_priority
+from services.openai_service import OpenAIService
+from services.theme_catalog import get_theme_catalog
+from services.theme_classifier import (
+    THEME_CLASSIFIER_MODEL,
+    THEME_CLASSIFIER_TEMPERATURE,
+    THEME_CLASSIFIER_TIMEOUT_SECONDS,
+    ThemeClassifier,
+    classification_text_hash,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 20
+DEFAULT_CONCURRENCY = 4
+DEFAULT_REQUESTS_PER_MINUTE = 120
+# Output budget per packed text ({"index": n, "theme_id": m} plus separators).
+BATCH_COMPLETION_TOKENS_PER_TEXT = 16
+BATCH_COMPLETION_TOKENS_BASE = 32
+# Texts longer than this are cut in the packed request.
+BATCH_TEXT_MAX_CHARS = 2000
+
+
+@dataclass
+class BatchClassificationResult:
+    # Theme ids by caller key.
+    theme_ids: Dict[Any, int] = field(default_factory=dict)
+    # Keys the LLM returned no valid theme for.
+    unresolved: List[Any] = field(default_factory=list)
+    resolved_without_llm: int = 0
+    llm_requests: int = 0
+    failed_requests: int = 0
+
+
+class _RequestSpacer:
+    """Spaces request starts at least 60 / requests_per_minute seconds apart."""
+
+    def __init__(self, requests_per_minute: float):
+        self._interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0
+        self._next_start = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_start - now
+            self._next_start = max(now, self._next_start) + self._interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class BatchThemeClassifier:
+    """
+    Classifies texts several per request.
+
+    Texts with a stored classification never reach the LLM, and neither do
+    texts the local model is confident about when `use_local_model` is set.
+    It is off by default: classify_messages() saves results as Message.theme
+    labels, and a backfill should not make unreviewed local guesses
+    permanent. The rest are
+    packed `batch_size` per chat completion with a strict JSON schema
+    response, and the requests run `concurrency` at a time and at most
+    `requests_per_minute` per minute. Texts missing from a response are
+    retried alone once; LLM results are stored in ThemeClassification.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        requests_per_minute: float = DEFAULT_REQUESTS_PER_MINUTE,
+        use_stored: bool = True,
+        use_local_model: bool = False,
+        theme_classifier: Optional[ThemeClassifier] = None,
+    ):
+        if batch_size < 1 or concurrency < 1:
+            raise ValueError("batch_size and concurrency must be positive.")
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.requests_per_minute = requests_per_minute
+        self.use_stored = use_stored
+        self.use_local_model = use_local_model
+        self._theme_classifier = theme_classifier or ThemeClassifier()
+        self._llm_service = OpenAIService()
+
+    @openai_priority(PRIORITY_BATCH)
+    def classify_texts(self, texts: Dict[Any, str]) -> BatchClassificationResult:
+        """Theme ids for {key: text}; empty texts are reported unresolved."""
+        result = BatchClassificationResult()
+        pending: List[Tuple[Any, str]] = []
+        for key, text in texts.items():
+            if not text or not text.strip():
+                result.unresolved.append(key)
+                continue
+            theme_id = self._resolve_without_llm(text)
+            if theme_id is None:
+                pending.append((key, text))
+            else:
+                result.theme_ids[key] = theme_id
+                result.resolved_without_llm += 1
+        if not pending:
+            return result
+
+        catalog = get_theme_catalog()
+        if not catalog.themes:
+            raise RuntimeError("No themes found in database for classification.")
+        batches = [
+            pending[start : start + self.batch_size]  # noqa: E203
+            for start in range(0, len(pending), self.batch_size)
+        ]
+        found = self._run_batches(batches, result)
+        missing = [(key, text) for key, text in pending if key not in found]
+        if missing:
+            found.update(self._run_batches([[item] for item in missing], result))
+
+        self._remember(
+            catalog.version,
+            [(text, found[key]) for key, text in pending if key in found],
+        )
+        result.theme_ids.update(found)
+        result.unresolved.extend(key for key, _ in pending if key not in found)
+        return result
+
+    def _resolve_without_llm(self, text: str) -> Optional[int]:
+        theme_id = None
+        if self.use_stored:
+            theme_id = self._theme_classifier.cached_theme_id(text)
+        if theme_id is None and self.use_local_model:
+            theme_id = classify_locally(get_theme_catalog(), text)
+        return theme_id
+
+    def classify_messages(
+        self, messages: Sequence[Message]
+    ) -> BatchClassificationResult:
+        """Set Message.theme from classify_texts() and save with bulk_update."""
+        result = self.classify_texts(
+            {message.id: message.content for message in messages}
+        )
+        changed = []
+        for message in messages:
+            theme_id = result.theme_ids.get(message.id)
+            if theme_id is not None and message.theme_id != theme_id:
+                message.theme_id = theme_id
+                changed.append(message)
+        if changed:
+            Message.objects.bulk_update(changed, ["theme"])
+        return result
+
+    def build_batch_request(
+        self, texts: Sequence[str]
+    ) -> Tuple[Dict[str, Any], List[int]]:
+        """Chat completion kwargs classifying `texts` (numbered from 1)."""
+        catalog = get_theme_catalog()
+        allowed_theme_ids = catalog.theme_ids
+        numbered = "\n\n".join(
+            f"[{index}]\n{text[:BATCH_TEXT_MAX_CHARS]}"
+            for index, text in enumerate(texts, start=1)
+        )
+        schema = {
+            "type": "object",
+            "properties": {
+                "results": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "index": {"type": "integer"},
+                            "theme_id": {"type": "integer", "enum": allowed_theme_ids},
+                        },
+                        "required": ["index", "theme_id"],
+                        "additionalProperties": False,
+                    },
+                }
+            },
+            "required": ["results"],
+            "additionalProperties": False,
+        }
+        request_kwargs = dict(
+            model=THEME_CLASSIFIER_MODEL,
+            messages=[
+                {"role": "system", "content": catalog.classifier_system_prompt},
+                {
+                    "role": "user",
+                    "content": (
+                        "Classifique o tema emocional ou de vida predominante de "
+                        "cada mensagem abaixo, de forma independente.\n"
+                        "Foque no que está causando a maior carga emocional agora.\n\n"
+                        f"{numbered}\n\n"
+                        "Retorne um item em results para cada mensagem, com o "
+                        "índice entre colchetes e o id numérico do tema."
+                    ),
+                },
+            ],
+            temperature=THEME_CLASSIFIER_TEMPERATURE,
+            max_completion_tokens=BATCH_COMPLETION_TOKENS_BASE
+            + BATCH_COMPLETION_TOKENS_PER_TEXT * len(texts),
+            timeout=THEME_CLASSIFIER_TIMEOUT_SECONDS,
+            response_format={
+                "type": "json_schema",
+                "json_schema": {
+                    "name": "theme_batch",
+                    "strict": True,
+                    "schema": schema,
+                },
+            },
+        )
+        return request_kwargs, allowed_theme_ids
+
+    def parse_batch_response(
+        self, response: Any, size: int, allowed_theme_ids: List[int]
+    ) -> Dict[int, int]:
+        """Theme ids by 1-based index; invalid or repeated items are dropped."""
+        choices = getattr(response, "choices", None) or []
+        message = getattr(choices[0], "message", None) if choices else None
+        content = getattr(message, "content", None) if message else None
+        if not isinstance(content, str) or not content.strip():
+            raise RuntimeError("Batch theme classifier returned empty content.")
+        try:
+            parsed = json.loads(content)
+        except json.JSONDecodeError as exc:
+            raise RuntimeError("Batch theme classifier JSON parsing failed.") from exc
+        items = parsed.get("results") if isinstance(parsed, dict) else None
+        if not isinstance(items, list):
+            raise RuntimeError("Batch theme classifier payload has no results list.")
+
+        theme_ids: Dict[int, int] = {}
+        repeated = set()
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            index, theme_id = item.get("index"), item.get("theme_id")
+            if (
+                not isinstance(index, int)
+                or not 1 <= index <= size
+                or theme_id not in allowed_theme_ids
+            ):
+                continue
+            if index in theme_ids and theme_ids[index] != theme_id:
+                repeated.add(index)
+            theme_ids[index] = theme_id
+        for index in repeated:
+            del theme_ids[index]
+        return theme_ids
+
+    def _run_batches(
+        self, batches: List[List[Tuple[Any, str]]], result: BatchClassificationResult
+    ) -> Dict[Any, int]:
+        requests = [
+            self.build_batch_request([text for _, text in batch]) for batch in batches
+        ]
+        async_client = self._llm_service.async_client
+        semaphore = asyncio.Semaphore(self.concurrency)
+        spacer = _RequestSpacer(self.requests_per_minute)
+
+        async def _run_one(request_kwargs: Dict[str, Any]) -> Any:
+            async with semaphore:
+                await spacer.wait()
+                return await async_client.chat.completions.create(**request_kwargs)
+
+        async def _run_all() -> list:
+            return await asyncio.gather(
+                *(_run_one(request_kwargs) for request_kwargs, _ in requests),
+                return_exceptions=True,
+            )
+
+        responses = run_openai_coroutine(_run_all())
+        found: Dict[Any, int] = {}
+        for batch, (_, allowed_theme_ids), response in zip(
+            batches, requests, responses
+        ):
+            result.llm_requests += 1
+            try:
+                if isinstance(response, BaseException):
+                    raise response
+                theme_ids = self.parse_batch_response(
+                    response, len(batch), allowed_theme_ids
+                )
+            except Exception as exc:
+                result.failed_requests += 1
+                logger.warning(
+                    "Batch theme classification failed size=%s error=%s",
+                    len(batch),
+                    exc,
+                )
+                continue
+            for index, (key, _) in enumerate(batch, start=1):
+                if index in theme_ids:
+                    found[key] = theme_ids[index]
+        return found
+
+    def _remember(self, catalog_version: str, labels: List[Tuple[str, int]]) -> None:
+        if not labels:
+            return
+        ThemeClassification.objects.bulk_create(
+            [
+                ThemeClassification(
+                    catalog_version=catalog_version,
+                    text_hash=classification_text_hash(text),
+                    theme_id=theme_id,
+                )
+                for text, theme_id in labels
+            ],
+            ignore_conflicts=True,
+        )
@@ -0,0 +1,307 @@
+"""One-pass feature extraction for LLM response candidates."""
+
+import re
+from functools import cached_property
+from typing import Dict, FrozenSet, Set, Tuple
+
+from services.marker_matcher import MarkerAutomaton
+
+EMPATHY_MARKERS = [
+    "sinto muito",
+    "lamento",
+    "imagino como",
+    "faz sentido",
+    "entendo que",
+    "isso dói",
+    "isso doi",
+    "deve estar pesado",
+]
+PRAYER_LANGUAGE_MARKERS = [
+    "deus",
+    "jesus",
+    "oração",
+    "oracao",
+    "orar",
+    "oro por",
+    "senhor,",
+    "amém",
+    "amen",
+]
+STRONG_INFERENCE_MARKERS = [
+    "isso mostra que",
+    "isso prova que",
+    "a causa é",
+    "a causa disso é",
+    "claramente você",
+    "com certeza você",
+    "o problema é que você",
+    "isso aconteceu porque você",
+]
+# Broad causal assertions without hedge.
+CAUSAL_ASSERTION_PATTERNS = [
+    "isso é porque",
+    "isso acontece porque",
+    "você está assim porque",
+    "voce está assim porque",
+    "você está desse jeito porque",
+    "voce está desse jeito porque",
+]
+USER_CITATION_MARKERS = [
+    "você disse",
+    "voce disse",
+    "você falou",
+    "voce falou",
+    "você mencionou",
+    "voce mencionou",
+    "você contou",
+    "voce contou",
+]
+NEW_ELEMENT_ACTION_MARKERS = [
+    "faça",
+    "faca",
+    "vamos",
+    "tente",
+    "comece",
+    "agora",
+    "passo",
+    "escolha",
+    "envie",
+    "respire",
+]
+SUMMARY_MARKERS = [
+    "resumindo",
+    "em resumo",
+    "então",
+    "pelo que você disse",
+    "pelo que voce disse",
+]
+PRACTICAL_ACTION_MARKERS = [
+    "agora",
+    "faça",
+    "faca",
+    "comece",
+    "envie",
+    "respire",
+    "anote",
+    "defina",
+    "escolha",
+    "próximo passo",
+    "proximo passo",
+]
+CONDITIONAL_INFERENCE_MARKERS = ["pode ser que"]
+CONFIRMATION_REQUEST_MARKERS = ["faz sentido", "confere", "é isso", "me confirma"]
+PROGRESS_DECISION_MARKERS = [
+    "vou",
+    "decidi",
+    "escolhi",
+    "combinado",
+    "fechado",
+    "ok",
+]
+PROGRESS_ACTION_MARKERS = [
+    "agora",
+    "faça",
+    "faca",
+    "envie",
+    "respire",
+    "anote",
+    "defina",
+    "passo",
+    "agende",
+]
+PROGRESS_CONFIRM_MARKERS = [
+    "confirmo",
+    "confirmar",
+    "check-in",
+    "retorno",
+    "me avisa",
+    "combinamos",
+]
+CONCRETE_ACTION_MARKERS = [
+    "faça",
+    "faca",
+    "agora",
+    "envie",
+    "respire",
+    "anote",
+    "defina",
+    "agende",
+    "comece",
+    "escolha",
+]
+
+_NEW_ELEMENT_ACTION = "new_element_action"
+_SUMMARY = "summary"
+_PRACTICAL_ACTION = "practical_action"
+_PRAYER_LANGUAGE = "prayer_language"
+_STRONG_INFERENCE = "strong_inference"
+_USER_CITATION = "user_citation"
+_CONDITIONAL_INFERENCE = "conditional_inference"
+_CONFIRMATION_REQUEST = "confirmation_request"
+_PROGRESS_DECISION = "progress_decision"
+_PROGRESS_ACTION = "progress_action"
+_PROGRESS_CONFIRM = "progress_confirm"
+_EMPATHY = "empathy"
+_CONCRETE_ACTION = "concrete_action"
+
+
+# One automaton over every guard marker list; the empathy and concrete-action
+# categories are read from per-sentence sweeps.
+_GUARD_MARKERS = MarkerAutomaton(
+    {
+        _NEW_ELEMENT_ACTION: NEW_ELEMENT_ACTION_MARKERS,
+        _SUMMARY: SUMMARY_MARKERS,
+        _PRACTICAL_ACTION: PRACTICAL_ACTION_MARKERS,
+        _PRAYER_LANGUAGE: PRAYER_LANGUAGE_MARKERS,
+        _STRONG_INFERENCE: STRONG_INFERENCE_MARKERS + CAUSAL_ASSERTION_PATTERNS,
+        _USER_CITATION: USER_CITATION_MARKERS,
+        _CONDITIONAL_INFERENCE: CONDITIONAL_INFERENCE_MARKERS,
+        _CONFIRMATION_REQUEST: CONFIRMATION_REQUEST_MARKERS,
+        _PROGRESS_DECISION: PROGRESS_DECISION_MARKERS,
+        _PROGRESS_ACTION: PROGRESS_ACTION_MARKERS,
+        _PROGRESS_CONFIRM: PROGRESS_CONFIRM_MARKERS,
+        _EMPATHY: EMPATHY_MARKERS,
+        _CONCRETE_ACTION: CONCRETE_ACTION_MARKERS,
+    }
+)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?])\s+")
+_TOKEN_RE = re.compile(r"[a-zà-ÿ0-9]+")
+
+
+def split_sentences(text: str) -> Tuple[str, ...]:
+    normalized = _WHITESPACE_RE.sub(" ", (text or "").strip())
+    if not normalized:
+        return ()
+    return tuple(
+        item.strip() for item in _SENTENCE_SPLIT_RE.split(normalized) if item.strip()
+    )
+
+
+def tokenize(text: str) -> Tuple[str, ...]:
+    return tuple(_TOKEN_RE.findall((text or "").lower()))
+
+
+def ngram_set(tokens: Tuple[str, ...], n: int) -> Set[str]:
+    if len(tokens) < n:
+        return set()
+    return {
+        " ".join(tokens[index : index + n])  # noqa: E203
+        for index in range(0, len(tokens) - n + 1)
+    }
+
+
+class CandidateFeatures:
+    """
+    Everything the post-generation guards read from a candidate.
+
+    The text is lowercased once and every marker list is matched in a single
+    Aho-Corasick sweep. Sentence splits (with one sweep per sentence for the
+    per-sentence counts), tokens and n-grams are computed at most once, on
+    first use, so a candidate rejected by an early (cheap) guard never pays
+    for them.
+    """
+
+    def __init__(self, text: str):
+        self.text = text or ""
+        self.lowered = self.text.lower()
+        self.has_question = "?" in self.lowered
+        self.markers: FrozenSet[str] = _GUARD_MARKERS.categories_in(self.lowered)
+
+    @cached_property
+    def sentences(self) -> Tuple[str, ...]:
+        return split_sentences(self.text)
+
+    @cached_property
+    def lowered_sentences(self) -> Tuple[str, ...]:
+        return tuple(sentence.lower() for sentence in self.sentences)
+
+    @cached_property
+    def sentence_markers(self) -> Tuple[FrozenSet[str], ...]:
+        return tuple(
+            _GUARD_MARKERS.categories_in(sentence)
+            for sentence in self.lowered_sentences
+        )
+
+    @cached_property
+    def tokens(self) -> Tuple[str, ...]:
+        return tuple(_TOKEN_RE.findall(self.lowered))
+
+    @property
+    def opening(self) -> str:
+        return self.sentences[0] if self.sentences else ""
+
+    @property
+    def has_required_new_element(self) -> bool:
+        return (
+            self.has_question
+            or _NEW_ELEMENT_ACTION in self.markers
+            or _SUMMARY in self.markers
+        )
+
+    @property
+    def has_practical_action(self) -> bool:
+        return _PRACTICAL_ACTION in self.markers
+
+    @property
+    def has_prayer_language(self) -> bool:
+        return _PRAYER_LANGUAGE in self.markers
+
+    @property
+    def has_strong_inference(self) -> bool:
+        return _STRONG_INFERENCE in self.markers
+
+    @property
+    def has_conditional_confirmation(self) -> bool:
+        return (
+            _CONDITIONAL_INFERENCE in self.markers
+            and self.has_question
+            and _CONFIRMATION_REQUEST in self.markers
+        )
+
+    @property
+    def progress_metric(self) -> Dict[str, bool]:
+        return {
+            "decision_taken": _PROGRESS_DECISION in self.markers,
+            "action_defined": _PROGRESS_ACTION in self.markers,
+            "next_step_confirmed": _PROGRESS_CONFIRM in self.markers,
+        }
+
+    @cached_property
+    def empathy_sentence_words(self) -> Tuple[int, ...]:
+        return tuple(
+            len(_TOKEN_RE.findall(sentence))
+            for sentence, markers in zip(self.lowered_sentences, self.sentence_markers)
+            if _EMPATHY in markers
+        )
+
+    @property
+    def empathy_count(self) -> int:
+        return len(self.empathy_sentence_words)
+
+    @property
+    def empathy_max_words(self) -> int:
+        return max(self.empathy_sentence_words, default=0)
+
+    @cached_property
+    def concrete_action_sentences(self) -> int:
+        return sum(
+            1 for markers in self.sentence_markers if _CONCRETE_ACTION in markers
+        )
+
+    def ngrams(self, n: int) -> Set[str]:
+        return ngram_set(self.tokens, n)
+
+    def cites(self, user_message: str) -> bool:
+        """A citation marker, or a word trigram shared with the user message."""
+        if _USER_CITATION in self.markers:
+            return True
+        user_tokens = tokenize(user_message)
+        if len(user_tokens) < 3:
+            return False
+        return not ngram_set(user_tokens, 3).isdisjoint(self.ngrams(3))
+
+
+def analyze_candidate(text: str) -> CandidateFeatures:
+    return CandidateFeatures(text)
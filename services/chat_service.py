@@ -1,17 +1,40 @@
+import asyncio
+import contextvars
 import json
 import logging
+import os
 import re
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 from datetime import timedelta
-from string import Formatter
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
+from django.db import transaction
 from django.utils import timezone
 
+from core.message_payloads import store_message_payload
 from core.models import Message, Profile, Theme
 from prompts.prompt_defaults import DEFAULT_WACHAT_SYSTEM_PROMPT
 from prompts.prompt_registry import PromptRegistry
+from prompts.prompt_templates import (
+    TOPIC_EXTRACTOR_TEMPLATE_KEY,
+    WELCOME_GENERATOR_TEMPLATE_KEY,
+    CompiledPromptTemplate,
+    get_compiled_template,
+)
+from services.candidate_analysis import CandidateFeatures, analyze_candidate
 from services.conversation_runtime import (
+    MARKER_CLOSING,
+    MARKER_COMPANIONSHIP_REQUEST,
+    MARKER_CONFIRMATION,
+    MARKER_EXECUTION_DONE,
+    MARKER_HIGH_DISTRESS,
+    MARKER_INSTITUTIONAL_REQUEST,
+    MARKER_LIVE_SUPPORT_REQUEST,
+    MARKER_PRACTICAL_STEP_REQUEST,
+    MARKER_PRAYER_REQUEST,
+    MARKER_PRESENCIAL_REQUEST,
+    MARKER_TEXT_REQUEST,
     MODE_ACOLHIMENTO,
     MODE_AMBIVALENCIA,
     MODE_CULPA,
@@ -25,12 +48,32 @@ from services.conversation_runtime import (
     choose_conversation_mode,
     choose_spiritual_intensity,
     detect_user_signals,
+    embed_texts,
     has_new_information,
     has_repeated_user_pattern,
+    load_message_embeddings,
+    match_user_markers,
     semantic_similarity,
+    semantic_similarity_matrix,
+    store_message_embeddings,
+)
+from services.embedding_cache import (
+    EmbeddingCacheCounter,
+    count_embedding_cache_lookups,
 )
+from services.latency_budget import LatencyBudget
+from services.ngram_index import NGRAM_BAN_WINDOW_MESSAGES, NgramBanIndex
+from services.openai_client import run_openai_coroutine
+from services.openai_rate_limiter import OpenAIRateLimitTimeout
 from services.openai_service import OpenAIService
+from services.theme_catalog import get_theme_catalog
 from services.theme_classifier import ThemeClassifier
+from services.turn_context import (
+    RECENT_CONTEXT_MESSAGES,
+    RECENT_ROLE_MESSAGES,
+    TurnContext,
+    build_runtime_state,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -68,6 +111,7 @@ FIXED_GENDER_INFERENCE_MAX_COMPLETION_TOKENS = 400
 FIXED_THEME_PROMPT_MAX_COMPLETION_TOKENS = 1200
 FIXED_EVALUATION_MAX_COMPLETION_TOKENS = 500
 EVALUATION_EMPTY_RETRY_ATTEMPTS = 2
+EVALUATION_MAX_CONCURRENCY = 4
 FIXED_SIMULATION_ANALYSIS_MAX_COMPLETION_TOKENS = 3200
 EVALUATION_MODEL = "gpt-4o-mini"
 MULTI_MESSAGE_MIN_PARTS = 3
@@ -77,54 +121,12 @@ TARGET_RESPONSE_SCORE = 8.0
 MAX_SCORE_REFINEMENT_ROUNDS = 3
 LOOP_SIMILARITY_THRESHOLD = 0.85
 OPENING_SIMILARITY_BLOCK_THRESHOLD = 0.9
-ASSISTANT_NGRAM_SIZE = 4
 LOOP_PRACTICAL_COOLDOWN_TURNS = 3
 PRAYER_COOLDOWN_TURNS = 2
 MAX_INFERENCE_REGEN_PER_ROUND = 1
 STALL_TURNS_FORCE_ACTION = 2
 MAX_EMPATHY_SENTENCES_PER_RESPONSE = 1
 MAX_EMPATHY_SENTENCE_WORDS = 18
-EMPATHY_MARKERS = [
-    "sinto muito",
-    "lamento",
-    "imagino como",
-    "faz sentido",
-    "entendo que",
-    "isso dói",
-    "isso doi",
-    "deve estar pesado",
-]
-PRAYER_LANGUAGE_MARKERS = [
-    "deus",
-    "jesus",
-    "oração",
-    "oracao",
-    "orar",
-    "oro por",
-    "senhor,",
-    "amém",
-    "amen",
-]
-STRONG_INFERENCE_MARKERS = [
-    "isso mostra que",
-    "isso prova que",
-    "a causa é",
-    "a causa disso é",
-    "claramente você",
-    "com certeza você",
-    "o problema é que você",
-    "isso aconteceu porque você",
-]
-USER_CITATION_MARKERS = [
-    "você disse",
-    "voce disse",
-    "você falou",
-    "voce falou",
-    "você mencionou",
-    "voce mencionou",
-    "você contou",
-    "voce contou",
-]
 PROGRESS_STATE_COLETA = "COLETA"
 PROGRESS_STATE_PROPOSTA = "PROPOSTA"
 PROGRESS_STATE_EXECUCAO = "EXECUCAO"
@@ -137,28 +139,6 @@ VALID_PROGRESS_STATES = {
     PROGRESS_STATE_CONFIRMACAO,
     PROGRESS_STATE_FECHAMENTO,
 }
-PRAYER_REQUEST_MARKERS = (
-    "ore por mim",
-    "ora por mim",
-    "ore comigo",
-    "ora comigo",
-    "reze por mim",
-    "reze comigo",
-    "preciso de oração",
-    "pode orar",
-    "oração por mim",
-)
-LIVE_SUPPORT_REQUEST_MARKERS = (
-    "posso te ligar",
-    "você pode me ligar",
-    "voce pode me ligar",
-    "me liga",
-    "me ligue",
-    "me manda mensagem",
-    "me mande mensagem",
-    "fique comigo",
-    "fica comigo",
-)
 INTENT_DEFAULT = "DEFAULT"
 INTENT_COMPANHIA = "COMPANHIA"
 INTENT_TEXTO = "TEXTO"
@@ -184,10 +164,15 @@ WACHAT_RESPONSE_SYSTEM_PROMPT = DEFAULT_WACHAT_SYSTEM_PROMPT
 class ChatService:
     """Conversation orchestration service using OpenAI GPT-5."""
 
-    def __init__(self):
+    def __init__(self, async_pipeline: Optional[bool] = None):
         self._llm_service = OpenAIService()
         self._theme_classifier = ThemeClassifier()
         self._prompt_registry = PromptRegistry()
+        if async_pipeline is None:
+            async_pipeline = os.environ.get(
+                "CHAT_ASYNC_PIPELINE", "false"
+            ).strip().lower() in {"1", "true", "yes", "on"}
+        self._async_pipeline = async_pipeline
 
     def basic_call(self, *args, **kwargs) -> str:
         return self._llm_service.basic_call(*args, **kwargs)
@@ -244,139 +229,100 @@ class ChatService:
         ]
         return sentences
 
-    def _tokenize_for_ngram(self, text: str) -> List[str]:
-        normalized = (text or "").lower()
-        return re.findall(r"[a-zà-ÿ0-9]+", normalized)
-
-    def _extract_ngrams(self, text: str, n: int) -> set:
-        tokens = self._tokenize_for_ngram(text)
-        if len(tokens) < n:
-            return set()
-        ngrams = set()
-        for index in range(0, len(tokens) - n + 1):
-            ngrams.add(" ".join(tokens[index : index + n]))  # noqa: E203
-        return ngrams
-
-    def _build_recent_assistant_ngram_ban(
-        self, recent_assistant_messages: List[str]
-    ) -> set:
-        banned = set()
-        for text in recent_assistant_messages[-2:]:
-            banned.update(self._extract_ngrams(text, ASSISTANT_NGRAM_SIZE))
-        return banned
-
-    def _candidate_has_banned_ngram(self, candidate: str, banned_ngrams: set) -> bool:
-        if not banned_ngrams:
-            return False
-        candidate_ngrams = self._extract_ngrams(candidate, ASSISTANT_NGRAM_SIZE)
-        if not candidate_ngrams:
-            return False
-        return any(ngram in banned_ngrams for ngram in candidate_ngrams)
-
-    def _candidate_opening_similarity(
-        self, candidate: str, recent_assistant_messages: List[str]
-    ) -> float:
-        candidate_sentences = self._split_sentences(candidate)
-        if not candidate_sentences:
-            return 0.0
-        candidate_opening = candidate_sentences[0]
-        best_similarity = 0.0
-        for text in recent_assistant_messages[-2:]:
-            reference_sentences = self._split_sentences(text)
-            if not reference_sentences:
-                continue
-            similarity = semantic_similarity(candidate_opening, reference_sentences[0])
-            if similarity > best_similarity:
-                best_similarity = similarity
-        return best_similarity
-
-    def _candidate_has_required_new_element(self, candidate: str) -> bool:
-        normalized = (candidate or "").lower()
-        has_question = "?" in normalized
-        action_markers = [
-            "faça",
-            "faca",
-            "vamos",
-            "tente",
-            "comece",
-            "agora",
-            "passo",
-            "escolha",
-            "envie",
-            "respire",
-        ]
-        summary_markers = [
-            "resumindo",
-            "em resumo",
-            "então",
-            "pelo que você disse",
-            "pelo que voce disse",
-        ]
-        has_action = any(marker in normalized for marker in action_markers)
-        has_summary = any(marker in normalized for marker in summary_markers)
-        return has_question or has_action or has_summary
-
-    def _candidate_has_practical_action(self, candidate: str) -> bool:
-        normalized = (candidate or "").lower()
-        practical_markers = [
-            "agora",
-            "faça",
-            "faca",
-            "comece",
-            "envie",
-            "respire",
-            "anote",
-            "defina",
-            "escolha",
-            "próximo passo",
-            "proximo passo",
+    def _opening_sentence(self, text: str) -> str:
+        sentences = self._split_sentences(text)
+        return sentences[0] if sentences else ""
+
+    def _turn_embedding_texts(
+        self, recent_user_messages: List[str], recent_assistant_messages: List[str]
+    ) -> List[str]:
+        """Every text the turn's similarity checks will embed."""
+        texts = list(recent_user_messages[-2:])
+        texts.extend(recent_assistant_messages[-2:])
+        texts.extend(
+            self._opening_sentence(text) for text in recent_assistant_messages[-2:]
+        )
+        return texts
+
+    def _candidate_opening_similarities(
+        self, candidate_openings: List[str], recent_assistant_messages: List[str]
+    ) -> List[float]:
+        """
+        Highest similarity of each candidate opening sentence against the
+        openings of the last two assistant messages, scored in one matrix
+        product.
+        """
+        if not candidate_openings:
+            return []
+        reference_openings = [
+            self._opening_sentence(text) for text in recent_assistant_messages[-2:]
         ]
-        return any(marker in normalized for marker in practical_markers)
+        scores = semantic_similarity_matrix(candidate_openings, reference_openings)
+        if not scores.size:
+            return [0.0 for _ in candidate_openings]
+        return [max(float(value), 0.0) for value in scores.max(axis=1)]
 
-    def _contains_prayer_language(self, text: str) -> bool:
-        normalized = (text or "").lower()
-        return any(marker in normalized for marker in PRAYER_LANGUAGE_MARKERS)
+    def _candidate_block_reason(
+        self,
+        features: CandidateFeatures,
+        *,
+        ngram_index: NgramBanIndex,
+        last_user_message: str,
+        generation_state: Dict[str, Any],
+        previous_progress_metric: Dict[str, bool],
+        force_single_concrete_action: bool,
+    ) -> Optional[str]:
+        """
+        Why a candidate must be discarded, or None to keep it.
+
+        Runs the text guards on precomputed features, cheapest first. The
+        opening-similarity guard needs embeddings and is applied afterwards,
+        to the survivors only.
+        """
+        if not features.has_required_new_element:
+            return "missing required new element"
+        if (
+            features.has_prayer_language
+            and not generation_state["prayer_request_detected"]
+        ):
+            if generation_state["prayer_cooldown_remaining"] > 0:
+                return "prayer cooldown"
+            if not features.has_practical_action:
+                return "prayer without practical action"
+        if features.empathy_count > MAX_EMPATHY_SENTENCES_PER_RESPONSE:
+            return f"excessive empathy sentences count={features.empathy_count}"
+        if (
+            features.empathy_count == 1
+            and features.empathy_max_words > MAX_EMPATHY_SENTENCE_WORDS
+        ):
+            return f"empathy sentence too long words={features.empathy_max_words}"
+        if force_single_concrete_action:
+            if features.concrete_action_sentences != 1:
+                return (
+                    "force single concrete action "
+                    f"actions={features.concrete_action_sentences}"
+                )
+            if not self._progress_advanced(
+                previous_progress_metric, features.progress_metric
+            ):
+                return "no progress advance under force mode"
+        if features.has_strong_inference and not (
+            features.has_conditional_confirmation and features.cites(last_user_message)
+        ):
+            return "strong inference without citation/confirmation"
+        if ngram_index.contains_any(features.tokens):
+            return "ngram ban"
+        return None
 
     def _detect_explicit_user_intent(self, last_user_message: str) -> str:
-        normalized = (last_user_message or "").lower()
-        if any(marker in normalized for marker in PRAYER_REQUEST_MARKERS):
+        markers = match_user_markers(last_user_message)
+        if MARKER_PRAYER_REQUEST in markers:
             return INTENT_ORACAO
-        text_markers = [
-            "escreva para mim",
-            "escrever para mim",
-            "faz uma mensagem",
-            "me dá uma mensagem",
-            "me de uma mensagem",
-            "texto pronto",
-            "pronto para copiar",
-            "modelo de mensagem",
-        ]
-        if any(marker in normalized for marker in text_markers):
+        if MARKER_TEXT_REQUEST in markers:
             return INTENT_TEXTO
-        companionship_markers = [
-            "fica comigo",
-            "fique comigo",
-            "fica aqui",
-            "fique aqui",
-            "fica online",
-            "fique online",
-            "trocando mensagem",
-            "não me deixa sozinho",
-            "nao me deixa sozinho",
-        ]
-        if any(marker in normalized for marker in companionship_markers):
+        if MARKER_COMPANIONSHIP_REQUEST in markers:
             return INTENT_COMPANHIA
-        practical_markers = [
-            "o que faço agora",
-            "o que eu faço agora",
-            "como faço",
-            "como começo",
-            "por onde começo",
-            "próximo passo",
-            "proximo passo",
-            "passo a passo",
-        ]
-        if any(marker in normalized for marker in practical_markers):
+        if MARKER_PRACTICAL_STEP_REQUEST in markers:
             return INTENT_PASSO_PRATICO
         return INTENT_DEFAULT
 
@@ -425,99 +371,6 @@ class ChatService:
             "strategy_alternative_forced": strategy_alternative_forced,
         }
 
-    def _empathy_sentence_stats(self, candidate: str) -> Dict[str, int]:
-        sentences = self._split_sentences(candidate)
-        empathy_count = 0
-        max_empathy_words = 0
-        for sentence in sentences:
-            normalized_sentence = sentence.lower()
-            if any(marker in normalized_sentence for marker in EMPATHY_MARKERS):
-                empathy_count += 1
-                words = len(self._tokenize_for_ngram(sentence))
-                if words > max_empathy_words:
-                    max_empathy_words = words
-        return {
-            "count": empathy_count,
-            "max_words": max_empathy_words,
-        }
-
-    def _has_strong_inference(self, candidate: str) -> bool:
-        normalized = (candidate or "").lower()
-        if any(marker in normalized for marker in STRONG_INFERENCE_MARKERS):
-            return True
-        # Broad causal assertions without hedge.
-        causal_patterns = [
-            "isso é porque",
-            "isso acontece porque",
-            "você está assim porque",
-            "voce está assim porque",
-            "você está desse jeito porque",
-            "voce está desse jeito porque",
-        ]
-        return any(pattern in normalized for pattern in causal_patterns)
-
-    def _contains_user_citation(self, candidate: str, last_user_message: str) -> bool:
-        normalized_candidate = (candidate or "").lower()
-        if any(marker in normalized_candidate for marker in USER_CITATION_MARKERS):
-            return True
-        user_tokens = self._tokenize_for_ngram(last_user_message)
-        if len(user_tokens) < 3:
-            return False
-        user_trigrams = set()
-        for index in range(0, len(user_tokens) - 3 + 1):
-            user_trigrams.add(" ".join(user_tokens[index : index + 3]))  # noqa: E203
-        candidate_trigrams = self._extract_ngrams(candidate, 3)
-        overlap = user_trigrams.intersection(candidate_trigrams)
-        return len(overlap) > 0
-
-    def _has_conditional_inference_confirmation(self, candidate: str) -> bool:
-        normalized = (candidate or "").lower()
-        has_conditional = "pode ser que" in normalized
-        has_confirmation_request = "?" in normalized and (
-            "faz sentido" in normalized
-            or "confere" in normalized
-            or "é isso" in normalized
-            or "me confirma" in normalized
-        )
-        return has_conditional and has_confirmation_request
-
-    def _extract_progress_metric(self, text: str) -> Dict[str, bool]:
-        normalized = (text or "").lower()
-        decision_markers = [
-            "vou",
-            "decidi",
-            "escolhi",
-            "combinado",
-            "fechado",
-            "ok",
-        ]
-        action_markers = [
-            "agora",
-            "faça",
-            "faca",
-            "envie",
-            "respire",
-            "anote",
-            "defina",
-            "passo",
-            "agende",
-        ]
-        confirm_markers = [
-            "confirmo",
-            "confirmar",
-            "check-in",
-            "retorno",
-            "me avisa",
-            "combinamos",
-        ]
-        return {
-            "decision_taken": any(marker in normalized for marker in decision_markers),
-            "action_defined": any(marker in normalized for marker in action_markers),
-            "next_step_confirmed": any(
-                marker in normalized for marker in confirm_markers
-            ),
-        }
-
     def _progress_metric_score(self, metric: Dict[str, bool]) -> int:
         return (
             int(bool(metric.get("decision_taken")))
@@ -537,29 +390,6 @@ class ChatService:
                 return True
         return False
 
-    def _count_concrete_actions(self, candidate: str) -> int:
-        sentences = self._split_sentences(candidate)
-        if not sentences:
-            return 0
-        action_markers = [
-            "faça",
-            "faca",
-            "agora",
-            "envie",
-            "respire",
-            "anote",
-            "defina",
-            "agende",
-            "comece",
-            "escolha",
-        ]
-        count = 0
-        for sentence in sentences:
-            normalized = sentence.lower()
-            if any(marker in normalized for marker in action_markers):
-                count += 1
-        return count
-
     def _build_assistant_message_chunks(
         self, *, text: str, conversation_mode: str
     ) -> List[str]:
@@ -640,23 +470,39 @@ class ChatService:
         recent_messages: list,
         current_topic: Optional[str],
     ) -> Dict[str, Any]:
-        transcript = ""
-        for message in recent_messages[-5:]:
-            transcript += f"{message.role.upper()}: {message.content}\n"
-        topic_prompt_template = self._prompt_registry.get_active_prompt(
-            "topic.extractor.main"
-        ).content
-        prompt = topic_prompt_template.format(
-            current_topic=current_topic or "null",
+        prompt = self._build_topic_signal_prompt(
             last_user_message=last_user_message,
-            transcript=transcript if transcript else "sem histórico",
+            recent_messages=recent_messages,
+            current_topic=current_topic,
         )
         raw = self.basic_call(
             url_type="generate",
             prompt=prompt,
             max_tokens=FIXED_TOPIC_SIGNAL_MAX_COMPLETION_TOKENS,
         )
+        return self._parse_topic_signal(raw)
 
+    def _build_topic_signal_prompt(
+        self,
+        last_user_message: str,
+        recent_messages: list,
+        current_topic: Optional[str],
+    ) -> str:
+        transcript = ""
+        for message in recent_messages[-5:]:
+            transcript += f"{message.role.upper()}: {message.content}\n"
+        topic_prompt_template = get_compiled_template(
+            self._prompt_registry.get_active_prompt(TOPIC_EXTRACTOR_TEMPLATE_KEY)
+        )
+        return topic_prompt_template.render(
+            {
+                "current_topic": current_topic or "null",
+                "last_user_message": last_user_message,
+                "transcript": transcript if transcript else "sem histórico",
+            }
+        )
+
+    def _parse_topic_signal(self, raw: str) -> Dict[str, Any]:
         parsed = self._safe_parse_json(raw)
         topic = parsed.get("topic")
         confidence = parsed.get("confidence", 0)
@@ -686,16 +532,124 @@ class ChatService:
         }
 
     def _evaluate_response(
-        self, *, user_message: str, assistant_response: str
+        self,
+        *,
+        user_message: str,
+        assistant_response: str,
+        evaluation_system_prompt: Optional[str] = None,
+        timeout: float = FIXED_TIMEOUT_SECONDS,
     ) -> Dict[str, Any]:
         client = getattr(self._llm_service, "client", None)
         if client is None:
             raise RuntimeError(
                 "OpenAI client is not available on configured LLM service."
             )
+        request_kwargs = self._build_evaluation_request(
+            user_message=user_message,
+            assistant_response=assistant_response,
+            evaluation_system_prompt=evaluation_system_prompt,
+            timeout=timeout,
+        )
+
+        raw_content = None
+        for attempt in range(1, EVALUATION_EMPTY_RETRY_ATTEMPTS + 1):
+            response = client.chat.completions.create(**request_kwargs)
+            raw_content = self._evaluation_content(response, attempt)
+            if raw_content is not None:
+                break
+        return self._parse_evaluation_content(raw_content)
+
+    async def _aevaluate_response(
+        self,
+        *,
+        user_message: str,
+        assistant_response: str,
+        evaluation_system_prompt: str,
+        timeout: float = FIXED_TIMEOUT_SECONDS,
+    ) -> Dict[str, Any]:
+        request_kwargs = self._build_evaluation_request(
+            user_message=user_message,
+            assistant_response=assistant_response,
+            evaluation_system_prompt=evaluation_system_prompt,
+            timeout=timeout,
+        )
+
+        raw_content = None
+        for attempt in range(1, EVALUATION_EMPTY_RETRY_ATTEMPTS + 1):
+            response = await self._llm_service.async_client.chat.completions.create(
+                **request_kwargs
+            )
+            raw_content = self._evaluation_content(response, attempt)
+            if raw_content is not None:
+                break
+        return self._parse_evaluation_content(raw_content)
+
+    def _evaluate_candidates(
+        self,
+        *,
+        user_message: str,
+        candidates: List[str],
+        timeout: float = FIXED_TIMEOUT_SECONDS,
+    ) -> List[Dict[str, Any]]:
+        """Evaluate candidates and return their evaluations in input order."""
+        if not candidates:
+            return []
+        evaluation_system_prompt = self._prompt_registry.get_evaluation_prompt().content
+        if self._async_pipeline:
+
+            async def _evaluate_all() -> List[Dict[str, Any]]:
+                return await asyncio.gather(
+                    *[
+                        self._aevaluate_response(
+                            user_message=user_message,
+                            assistant_response=candidate,
+                            evaluation_system_prompt=evaluation_system_prompt,
+                            timeout=timeout,
+                        )
+                        for candidate in candidates
+                    ]
+                )
+
+            return list(run_openai_coroutine(_evaluate_all()))
+        if len(candidates) == 1:
+            return [
+                self._evaluate_response(
+                    user_message=user_message,
+                    assistant_response=candidates[0],
+                    evaluation_system_prompt=evaluation_system_prompt,
+                    timeout=timeout,
+                )
+            ]
+        # Workers only call the shared OpenAI client. Pool threads start from
+        # an empty context, so each task runs in a copy of the caller's to
+        # keep its OpenAI priority; futures are read back in input order.
+        workers = min(len(candidates), EVALUATION_MAX_CONCURRENCY)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(
+                    contextvars.copy_context().run,
+                    self._evaluate_response,
+                    user_message=user_message,
+                    assistant_response=candidate,
+                    evaluation_system_prompt=evaluation_system_prompt,
+                    timeout=timeout,
+                )
+                for candidate in candidates
+            ]
+            return [future.result() for future in futures]
 
-        evaluation_prompt_selection = self._prompt_registry.get_evaluation_prompt()
-        evaluation_system_prompt = evaluation_prompt_selection.content
+    def _build_evaluation_request(
+        self,
+        *,
+        user_message: str,
+        assistant_response: str,
+        evaluation_system_prompt: Optional[str] = None,
+        timeout: float = FIXED_TIMEOUT_SECONDS,
+    ) -> Dict[str, Any]:
+        if evaluation_system_prompt is None:
+            evaluation_system_prompt = (
+                self._prompt_registry.get_evaluation_prompt().content
+            )
 
         evaluation_user_prompt = f"""
 Última mensagem do usuário:
@@ -705,33 +659,33 @@ Resposta do assistente para avaliar:
 {assistant_response}
 """.strip()
 
-        raw_content = None
-        for attempt in range(1, EVALUATION_EMPTY_RETRY_ATTEMPTS + 1):
-            response = client.chat.completions.create(
-                model=EVALUATION_MODEL,
-                messages=[
-                    {"role": "system", "content": evaluation_system_prompt},
-                    {"role": "user", "content": evaluation_user_prompt},
-                ],
-                max_completion_tokens=FIXED_EVALUATION_MAX_COMPLETION_TOKENS,
-                reasoning_effort="low",
-                timeout=FIXED_TIMEOUT_SECONDS,
-                response_format={"type": "json_object"},
-            )
-
-            choices = getattr(response, "choices", None) or []
-            message = getattr(choices[0], "message", None) if choices else None
-            candidate_content = getattr(message, "content", None) if message else None
-            if isinstance(candidate_content, str) and candidate_content.strip():
-                raw_content = candidate_content
-                break
+        return {
+            "model": EVALUATION_MODEL,
+            "messages": [
+                {"role": "system", "content": evaluation_system_prompt},
+                {"role": "user", "content": evaluation_user_prompt},
+            ],
+            "max_completion_tokens": FIXED_EVALUATION_MAX_COMPLETION_TOKENS,
+            "reasoning_effort": "low",
+            "timeout": timeout,
+            "response_format": {"type": "json_object"},
+        }
 
-            logger.warning(
-                "Evaluation returned empty content attempt=%s/%s",
-                attempt,
-                EVALUATION_EMPTY_RETRY_ATTEMPTS,
-            )
+    def _evaluation_content(self, response: Any, attempt: int) -> Optional[str]:
+        choices = getattr(response, "choices", None) or []
+        message = getattr(choices[0], "message", None) if choices else None
+        candidate_content = getattr(message, "content", None) if message else None
+        if isinstance(candidate_content, str) and candidate_content.strip():
+            return candidate_content
+
+        logger.warning(
+            "Evaluation returned empty content attempt=%s/%s",
+            attempt,
+            EVALUATION_EMPTY_RETRY_ATTEMPTS,
+        )
+        return None
 
+    def _parse_evaluation_content(self, raw_content: Optional[str]) -> Dict[str, Any]:
         if not isinstance(raw_content, str) or not raw_content.strip():
             raise RuntimeError("Evaluation model returned empty content.")
 
@@ -861,7 +815,7 @@ Resposta do assistente para avaliar:
     def _build_dynamic_runtime_prompt(
         self,
         *,
-        runtime_main_prompt: str,
+        runtime_main_template: CompiledPromptTemplate,
         runtime_mode_prompt: str,
         mode_objective: str,
         conversation_mode: str,
@@ -1082,18 +1036,8 @@ Resposta do assistente para avaliar:
                 "- Ao responder limite de canal, não repita de forma literal a expressão do usuário; use redação mais humana e próxima.\n"
             )
 
-        presencial_request_markers = [
-            "visita",
-            "visitar",
-            "ir comigo",
-            "presencial",
-            "pessoalmente",
-            "na minha casa",
-        ]
-        has_presencial_request = any(
-            marker in (last_user_message or "").lower()
-            for marker in presencial_request_markers
-        )
+        user_markers = match_user_markers(last_user_message)
+        has_presencial_request = MARKER_PRESENCIAL_REQUEST in user_markers
         presencial_limit_block = ""
         if has_presencial_request:
             presencial_limit_block = (
@@ -1103,20 +1047,7 @@ Resposta do assistente para avaliar:
                 "- Ofereça 1 alternativa online concreta e imediata.\n"
             )
 
-        actionable_artifact_markers = [
-            "escreva para mim",
-            "escrever para mim",
-            "faz uma mensagem",
-            "me dá uma mensagem",
-            "me de uma mensagem",
-            "texto pronto",
-            "pronto para copiar",
-            "modelo de mensagem",
-        ]
-        explicit_artifact_request = any(
-            marker in (last_user_message or "").lower()
-            for marker in actionable_artifact_markers
-        )
+        explicit_artifact_request = MARKER_TEXT_REQUEST in user_markers
         artifact_request_block = ""
         if explicit_artifact_request:
             artifact_request_block = (
@@ -1151,18 +1082,7 @@ Resposta do assistente para avaliar:
                 "- Não ofereça múltiplas ações concorrentes.\n"
             )
 
-        distress_markers = [
-            "chor",
-            "desmoron",
-            "arrasad",
-            "não aguento",
-            "nao aguento",
-            "peito apertado",
-            "desespero",
-        ]
-        has_high_distress = any(
-            marker in (last_user_message or "").lower() for marker in distress_markers
-        )
+        has_high_distress = MARKER_HIGH_DISTRESS in user_markers
         distress_block = ""
         if has_high_distress:
             distress_block = (
@@ -1249,63 +1169,67 @@ Resposta do assistente para avaliar:
             "history_block": history_block,
         }
         return self._render_runtime_main_prompt(
-            runtime_main_prompt=runtime_main_prompt, context=runtime_template_context
+            runtime_main_template=runtime_main_template,
+            context=runtime_template_context,
         )
 
     def _render_runtime_main_prompt(
-        self, *, runtime_main_prompt: str, context: Dict[str, Any]
+        self,
+        *,
+        runtime_main_template: CompiledPromptTemplate,
+        context: Dict[str, Any],
     ) -> str:
-        required_fields = []
-        for _, field_name, _, _ in Formatter().parse(runtime_main_prompt):
-            if field_name:
-                required_fields.append(field_name)
-        for field_name in required_fields:
-            if field_name not in context:
-                raise RuntimeError(
-                    f"Runtime main prompt missing required context key '{field_name}'."
-                )
-        try:
-            return runtime_main_prompt.format(**context).strip()
-        except KeyError as exc:
-            raise RuntimeError(
-                f"Runtime main prompt rendering missing key '{exc.args[0]}'."
-            ) from exc
-        except ValueError as exc:
-            raise RuntimeError(
-                f"Runtime main prompt has invalid format syntax: {exc}."
-            ) from exc
-
-    def _collect_recent_context(self, queryset) -> Dict[str, Any]:
-        recent_user_messages = list(
-            queryset.filter(role="user")
-            .order_by("created_at")
-            .values_list("content", flat=True)
-        )[-3:]
-        recent_assistant_messages = list(
-            queryset.filter(role="assistant")
-            .order_by("created_at")
-            .values_list("content", flat=True)
-        )[-3:]
-        recent_context_messages = list(queryset.order_by("-created_at")[:5])
+        return runtime_main_template.render(context).strip()
+
+    def _collect_recent_context(self, turn_context: TurnContext) -> Dict[str, Any]:
+        recent_user_rows = turn_context.latest("user", RECENT_ROLE_MESSAGES)
+        recent_assistant_rows = turn_context.latest(
+            "assistant", max(RECENT_ROLE_MESSAGES, NGRAM_BAN_WINDOW_MESSAGES)
+        )
+        recent_context_messages = turn_context.latest(limit=RECENT_CONTEXT_MESSAGES)[
+            ::-1
+        ]
         return {
-            "recent_user_messages": recent_user_messages,
-            "recent_assistant_messages": recent_assistant_messages,
+            "recent_user_messages": [row.content for row in recent_user_rows],
+            "recent_assistant_messages": [row.content for row in recent_assistant_rows],
             "recent_context_messages": recent_context_messages,
+            "recent_assistant_rows": recent_assistant_rows,
+            "recent_embedding_messages": recent_user_rows + recent_assistant_rows,
         }
 
-    def _last_assistant_runtime_metadata(self, queryset) -> Dict[str, Any]:
-        last_assistant = (
-            queryset.filter(role="assistant").order_by("-created_at").first()
-        )
-        if not last_assistant:
-            return {}
-        payload = getattr(last_assistant, "ollama_prompt", None)
-        if not isinstance(payload, dict):
-            return {}
-        metadata = payload.get("metadata")
-        if not isinstance(metadata, dict):
-            return {}
-        return metadata
+    def _load_ngram_ban_index(
+        self, profile: Profile, recent_assistant_rows: List[Message]
+    ) -> NgramBanIndex:
+        """
+        The profile's stored n-gram ban index, rebuilt from the loaded rows
+        when it does not cover exactly the latest assistant messages.
+        """
+        index = NgramBanIndex.from_state(profile.ngram_ban_index)
+        if index is None or not index.covers([row.id for row in recent_assistant_rows]):
+            index = NgramBanIndex.build(
+                recent_assistant_rows[-NGRAM_BAN_WINDOW_MESSAGES:]
+            )
+        return index
+
+    def _record_assistant_reply_state(
+        self,
+        profile: Profile,
+        messages: List[Message],
+        runtime_metadata: Any,
+        index: Optional[NgramBanIndex] = None,
+    ) -> None:
+        """
+        Save the profile state the next turn reads from a reply: its n-grams
+        in the ban index and its runtime counters (Profile.runtime_state).
+        Call inside the transaction that creates `messages`.
+        """
+        if index is None:
+            index = NgramBanIndex.from_state(profile.ngram_ban_index) or NgramBanIndex()
+        for message in messages:
+            index.add_message(message.id, message.content)
+        profile.ngram_ban_index = index.as_state()
+        profile.runtime_state = build_runtime_state(messages[0].id, runtime_metadata)
+        profile.save(update_fields=["ngram_ban_index", "runtime_state"])
 
     def _detect_progress_state(
         self,
@@ -1315,46 +1239,12 @@ Resposta do assistente para avaliar:
         direct_guidance_request: bool,
         explicit_user_intent: str,
     ) -> str:
-        normalized = (last_user_message or "").lower()
-
-        closing_markers = [
-            "obrigado",
-            "obrigada",
-            "já ajudou",
-            "ja ajudou",
-            "era isso",
-            "vamos encerrar",
-            "pode encerrar",
-            "tá bom por hoje",
-            "ta bom por hoje",
-        ]
-        if any(marker in normalized for marker in closing_markers):
+        markers = match_user_markers(last_user_message)
+        if MARKER_CLOSING in markers:
             return PROGRESS_STATE_FECHAMENTO
-
-        execution_done_markers = [
-            "fiz",
-            "feito",
-            "enviei",
-            "mande",
-            "agendei",
-            "combinei",
-            "coloquei em prática",
-            "coloquei em pratica",
-        ]
-        if any(marker in normalized for marker in execution_done_markers):
+        if MARKER_EXECUTION_DONE in markers:
             return PROGRESS_STATE_CONFIRMACAO
-
-        confirmation_markers = [
-            "sim",
-            "aceito",
-            "topo",
-            "vou fazer",
-            "vou tentar",
-            "combinado",
-            "fechado",
-            "pode ser",
-        ]
-        if any(marker in normalized for marker in confirmation_markers):
+        if MARKER_CONFIRMATION in markers:
             if previous_progress_state in {
                 PROGRESS_STATE_EXECUCAO,
                 PROGRESS_STATE_CONFIRMACAO,
@@ -1389,7 +1279,7 @@ Resposta do assistente para avaliar:
         self,
         *,
         profile: Profile,
-        queryset,
+        turn_context: TurnContext,
         last_user_message: str,
         recent_user_messages: list,
         recent_assistant_messages: list,
@@ -1400,7 +1290,7 @@ Resposta do assistente para avaliar:
         if previous_mode not in VALID_CONVERSATION_MODES:
             previous_mode = MODE_WELCOME
 
-        last_runtime_metadata = self._last_assistant_runtime_metadata(queryset)
+        last_runtime_metadata = turn_context.runtime_state()
         previous_progress_state = str(
             last_runtime_metadata.get("progress_state", PROGRESS_STATE_COLETA)
         )
@@ -1441,20 +1331,16 @@ Resposta do assistente para avaliar:
         except (TypeError, ValueError):
             previous_strategy_repetition_count = 0
 
-        is_first_message = queryset.filter(role="assistant").count() == 0
+        is_first_message = not turn_context.has_assistant_messages
         signals = detect_user_signals(last_user_message)
         direct_guidance_request = bool(signals.get("guidance_request"))
         repetition_complaint = bool(signals.get("repetition_complaint"))
         if repetition_complaint:
             direct_guidance_request = True
         # 🔥 OVERRIDE: pedido explícito de oração tem prioridade máxima
-        prayer_request_detected = any(
-            phrase in last_user_message.lower() for phrase in PRAYER_REQUEST_MARKERS
-        )
-        live_support_request_detected = any(
-            phrase in last_user_message.lower()
-            for phrase in LIVE_SUPPORT_REQUEST_MARKERS
-        )
+        user_markers = match_user_markers(last_user_message)
+        prayer_request_detected = MARKER_PRAYER_REQUEST in user_markers
+        live_support_request_detected = MARKER_LIVE_SUPPORT_REQUEST in user_markers
 
         if prayer_request_detected or live_support_request_detected:
             direct_guidance_request = True
@@ -1470,6 +1356,9 @@ Resposta do assistente para avaliar:
         force_deep_presence = bool(
             signals.get("repetitive_guilt") or signals.get("explicit_despair")
         )
+        embed_texts(
+            self._turn_embedding_texts(recent_user_messages, recent_assistant_messages)
+        )
         repeated_user_pattern = has_repeated_user_pattern(recent_user_messages)
         ambivalence_or_repeated = (
             bool(signals.get("ambivalence")) or repeated_user_pattern
@@ -1510,18 +1399,7 @@ Resposta do assistente para avaliar:
             repeated_user_pattern=repeated_user_pattern,
             signals=signals,
         )
-        institutional_request = any(
-            phrase in last_user_message.lower()
-            for phrase in [
-                "como fazer",
-                "como realizar",
-                "me instrua",
-                "qual o processo",
-                "como funciona",
-                "preciso saber como",
-                "me explique o processo",
-            ]
-        )
+        institutional_request = MARKER_INSTITUTIONAL_REQUEST in user_markers
         if institutional_request:
             conversation_mode = MODE_PASTOR_INSTITUCIONAL
         elif prayer_request_detected or live_support_request_detected:
@@ -1590,16 +1468,13 @@ Resposta do assistente para avaliar:
         self,
         *,
         profile: Profile,
-        queryset,
+        turn_context: TurnContext,
         last_person_message: Message,
         generation_state: Dict[str, Any],
         active_topic: Optional[str],
         selected_theme: Theme,
     ) -> str:
-        context_messages = queryset.exclude(id=last_person_message.id).order_by(
-            "-created_at"
-        )[:6]
-        context_messages = list(reversed(list(context_messages)))
+        context_messages = turn_context.history_before(last_person_message)
 
         top_topics = ""
         if isinstance(profile.primary_topics, list) and profile.primary_topics:
@@ -1627,7 +1502,7 @@ Resposta do assistente para avaliar:
             )
 
         return self._build_dynamic_runtime_prompt(
-            runtime_main_prompt=runtime_main_selection.content,
+            runtime_main_template=get_compiled_template(runtime_main_selection),
             runtime_mode_prompt=runtime_selection.content,
             mode_objective=mode_objective,
             conversation_mode=generation_state["conversation_mode"],
@@ -1664,6 +1539,56 @@ Resposta do assistente para avaliar:
             context_messages=context_messages,
         )
 
+    def _run_turn_preparation_calls(
+        self, *, topic_prompt: str, theme_text: Optional[str]
+    ) -> Tuple[str, Optional[int]]:
+        """
+        Topic extraction and theme classification LLM calls for a turn.
+
+        Neither depends on the other, so the async pipeline sends them
+        together. Returns the raw topic response and the classified theme id
+        (None when theme_text is None).
+        """
+        if not self._async_pipeline:
+            raw_topic_signal = self.basic_call(
+                url_type="generate",
+                prompt=topic_prompt,
+                max_tokens=FIXED_TOPIC_SIGNAL_MAX_COMPLETION_TOKENS,
+            )
+            theme_id = None
+            if theme_text is not None:
+                theme_id = self._theme_classifier.classify(theme_text)
+            return raw_topic_signal, theme_id
+
+        topic_request = self._llm_service.build_basic_request(
+            prompt=topic_prompt, max_tokens=FIXED_TOPIC_SIGNAL_MAX_COMPLETION_TOKENS
+        )
+        theme_request, allowed_theme_ids = None, []
+        resolved_theme_id = None
+        if theme_text is not None:
+            resolved_theme_id = self._theme_classifier.resolve_without_llm(theme_text)
+        if theme_text is not None and resolved_theme_id is None:
+            theme_request, allowed_theme_ids = self._theme_classifier.build_request(
+                theme_text
+            )
+        async_client = self._llm_service.async_client
+
+        async def _run_calls() -> list:
+            calls = [async_client.chat.completions.create(**topic_request)]
+            if theme_request is not None:
+                calls.append(async_client.chat.completions.create(**theme_request))
+            return await asyncio.gather(*calls)
+
+        responses = run_openai_coroutine(_run_calls())
+        raw_topic_signal = self._llm_service.basic_response_text(responses[0])
+        theme_id = resolved_theme_id
+        if theme_request is not None:
+            theme_id = self._theme_classifier.parse_response(
+                responses[1], allowed_theme_ids
+            )
+            self._theme_classifier.remember(theme_text, theme_id)
+        return raw_topic_signal, theme_id
+
     def _save_runtime_counters(
         self,
         *,
@@ -1694,7 +1619,34 @@ Resposta do assistente para avaliar:
         profile: Profile,
         channel: str,
         forced_theme: Optional[Theme] = None,
+        latency_budget_seconds: Optional[float] = None,
     ) -> str:
+        """
+        Generate, evaluate and persist the assistant reply for the last user
+        message. `latency_budget_seconds` (default CHAT_LATENCY_BUDGET_SECONDS)
+        caps the turn: refinement rounds and guard regenerations that cannot
+        finish in time are skipped and the best evaluated attempt is returned.
+        """
+        # Counted per turn: concurrent turns share the process-wide counters.
+        with count_embedding_cache_lookups() as embedding_counter:
+            return self._generate_response_message(
+                profile,
+                channel,
+                forced_theme=forced_theme,
+                latency_budget_seconds=latency_budget_seconds,
+                embedding_counter=embedding_counter,
+            )
+
+    def _generate_response_message(
+        self,
+        profile: Profile,
+        channel: str,
+        *,
+        forced_theme: Optional[Theme],
+        latency_budget_seconds: Optional[float],
+        embedding_counter: EmbeddingCacheCounter,
+    ) -> str:
+        latency_budget = LatencyBudget(latency_budget_seconds)
         if not profile.welcome_message_sent:
             welcome_message = self.generate_welcome_message(
                 profile=profile, channel=channel
@@ -1704,8 +1656,8 @@ Resposta do assistente para avaliar:
                 raise RuntimeError("Welcome message generation returned empty content.")
             return welcome_text
 
-        queryset = profile.messages.for_context()
-        last_person_message = queryset.filter(role="user").last()
+        turn_context = TurnContext.load(profile)
+        last_person_message = turn_context.last_user_message
         if not last_person_message:
             welcome_message = self.generate_welcome_message(
                 profile=profile, channel=channel
@@ -1715,22 +1667,35 @@ Resposta do assistente para avaliar:
                 raise RuntimeError("Welcome message generation returned empty content.")
             return welcome_text
 
-        recent_context = self._collect_recent_context(queryset)
+        recent_context = self._collect_recent_context(turn_context)
         recent_user_messages = recent_context["recent_user_messages"]
         recent_assistant_messages = recent_context["recent_assistant_messages"]
         recent_context_messages = recent_context["recent_context_messages"]
+        load_message_embeddings(recent_context["recent_embedding_messages"])
 
-        topic_signal = self._extract_topic_signal(
+        topic_prompt = self._build_topic_signal_prompt(
             last_user_message=last_person_message.content,
             recent_messages=list(reversed(recent_context_messages)),
             current_topic=profile.current_topic,
         )
+        # A theme already set on the message (classified when it was saved)
+        # is kept; the turn only classifies messages without one.
+        message_theme = get_theme_catalog().get(last_person_message.theme_id)
+        raw_topic_signal, classified_theme_id = self._run_turn_preparation_calls(
+            topic_prompt=topic_prompt,
+            theme_text=(
+                last_person_message.content
+                if forced_theme is None and message_theme is None
+                else None
+            ),
+        )
+        topic_signal = self._parse_topic_signal(raw_topic_signal)
         active_topic = self._merge_topic_memory(
             profile=profile, topic_signal=topic_signal
         )
         generation_state = self._determine_generation_state(
             profile=profile,
-            queryset=queryset,
+            turn_context=turn_context,
             last_user_message=last_person_message.content,
             recent_user_messages=recent_user_messages,
             recent_assistant_messages=recent_assistant_messages,
@@ -1740,13 +1705,15 @@ Resposta do assistente para avaliar:
             if last_person_message.theme_id != forced_theme.id:
                 last_person_message.theme = forced_theme
                 last_person_message.save(update_fields=["theme"])
+        elif message_theme is not None:
+            selected_theme = message_theme
         else:
-            selected_theme = self._classify_and_persist_message_theme(
-                last_person_message
+            selected_theme = self._persist_message_theme(
+                last_person_message, classified_theme_id
             )
         prompt_aux = self._build_response_prompt(
             profile=profile,
-            queryset=queryset,
+            turn_context=turn_context,
             last_person_message=last_person_message,
             generation_state=generation_state,
             active_topic=active_topic,
@@ -1817,6 +1784,9 @@ Resposta do assistente para avaliar:
             "temperature": selected_temperature,
             "n": 2,
         }
+        round_started_at = latency_budget.elapsed()
+        slowest_round_seconds = 0.0
+        request_kwargs["timeout"] = latency_budget.call_timeout(FIXED_TIMEOUT_SECONDS)
         response = client.chat.completions.create(**request_kwargs)
         response_metadata = _usage_metadata(response)
         response_metadata["round"] = 1
@@ -1847,8 +1817,8 @@ Resposta do assistente para avaliar:
         best_attempt: Optional[Dict[str, Any]] = None
         selected_runtime_prompt = prompt_aux
         selected_response_metadata = response_metadata
-        banned_ngrams = self._build_recent_assistant_ngram_ban(
-            recent_assistant_messages
+        ngram_index = self._load_ngram_ban_index(
+            profile, recent_context["recent_assistant_rows"]
         )
         previous_progress_metric = generation_state["previous_progress_metric"]
         force_single_concrete_action = generation_state["force_single_concrete_action"]
@@ -1863,6 +1833,16 @@ Resposta do assistente para avaliar:
                     raise RuntimeError(
                         "Cannot refine response without evaluated attempts."
                     )
+                if not latency_budget.can_afford(slowest_round_seconds):
+                    latency_budget.skip(MAX_SCORE_REFINEMENT_ROUNDS + 2 - round_number)
+                    logger.warning(
+                        "Latency budget stopped refinement profile_id=%s round=%s remaining=%.1fs",
+                        profile.id,
+                        round_number,
+                        latency_budget.remaining(),
+                    )
+                    break
+                round_started_at = latency_budget.elapsed()
                 current_runtime_prompt = self._build_refinement_runtime_prompt(
                     base_runtime_prompt=prompt_aux,
                     round_number=round_number,
@@ -1886,11 +1866,21 @@ Resposta do assistente para avaliar:
                     "messages": refined_messages,
                     "max_completion_tokens": selected_max_completion_tokens,
                     "reasoning_effort": "low",
-                    "timeout": FIXED_TIMEOUT_SECONDS,
+                    "timeout": latency_budget.call_timeout(FIXED_TIMEOUT_SECONDS),
                     "temperature": selected_temperature,
                     "n": 2,
                 }
-                current_response = client.chat.completions.create(**refined_kwargs)
+                try:
+                    current_response = client.chat.completions.create(**refined_kwargs)
+                except OpenAIRateLimitTimeout:
+                    latency_budget.skip(MAX_SCORE_REFINEMENT_ROUNDS + 2 - round_number)
+                    logger.warning(
+                        "Rate limit wait stopped refinement profile_id=%s round=%s remaining=%.1fs",
+                        profile.id,
+                        round_number,
+                        latency_budget.remaining(),
+                    )
+                    break
                 current_metadata = _usage_metadata(current_response)
                 current_metadata["round"] = round_number
                 response_rounds_metadata.append(current_metadata)
@@ -1902,6 +1892,7 @@ Resposta do assistente para avaliar:
             non_empty_candidates_in_round = 0
             evaluated_candidates_in_round = 0
             for regen_attempt in range(0, MAX_INFERENCE_REGEN_PER_ROUND + 1):
+                analyzed_candidates: List[Tuple[int, CandidateFeatures]] = []
                 for attempt_number, choice in enumerate(choices[:2], start=1):
                     assistant_text_candidate = _extract_text_from_choice(choice)
                     logger.info(
@@ -1921,20 +1912,35 @@ Resposta do assistente para avaliar:
                         )
                         continue
                     non_empty_candidates_in_round += 1
-                    if self._candidate_has_banned_ngram(
-                        assistant_text_candidate, banned_ngrams
-                    ):
+                    features = analyze_candidate(assistant_text_candidate)
+                    block_reason = self._candidate_block_reason(
+                        features,
+                        ngram_index=ngram_index,
+                        last_user_message=last_person_message.content,
+                        generation_state=generation_state,
+                        previous_progress_metric=previous_progress_metric,
+                        force_single_concrete_action=force_single_concrete_action,
+                    )
+                    if block_reason:
                         logger.warning(
-                            "Candidate blocked by ngram ban profile_id=%s channel=%s round=%s attempt=%s",
+                            "Candidate blocked: %s profile_id=%s channel=%s round=%s attempt=%s",
+                            block_reason,
                             profile.id,
                             channel,
                             round_number,
                             attempt_number,
                         )
                         continue
-                    opening_similarity = self._candidate_opening_similarity(
-                        assistant_text_candidate, recent_assistant_messages
-                    )
+                    analyzed_candidates.append((attempt_number, features))
+
+                opening_similarities = self._candidate_opening_similarities(
+                    [features.opening for _, features in analyzed_candidates],
+                    recent_assistant_messages,
+                )
+                guarded_candidates: List[Dict[str, Any]] = []
+                for (attempt_number, features), opening_similarity in zip(
+                    analyzed_candidates, opening_similarities
+                ):
                     if opening_similarity >= OPENING_SIMILARITY_BLOCK_THRESHOLD:
                         logger.warning(
                             "Candidate blocked by opening similarity profile_id=%s channel=%s round=%s attempt=%s similarity=%.3f",
@@ -1945,145 +1951,39 @@ Resposta do assistente para avaliar:
                             opening_similarity,
                         )
                         continue
-                    if not self._candidate_has_required_new_element(
-                        assistant_text_candidate
-                    ):
-                        logger.warning(
-                            "Candidate blocked: missing required new element profile_id=%s channel=%s round=%s attempt=%s",
-                            profile.id,
-                            channel,
-                            round_number,
-                            attempt_number,
-                        )
-                        continue
-                    candidate_has_prayer = self._contains_prayer_language(
-                        assistant_text_candidate
-                    )
-                    candidate_has_action = self._candidate_has_practical_action(
-                        assistant_text_candidate
-                    )
-                    if (
-                        candidate_has_prayer
-                        and not generation_state["prayer_request_detected"]
-                        and generation_state["prayer_cooldown_remaining"] > 0
-                    ):
-                        logger.warning(
-                            "Candidate blocked by prayer cooldown profile_id=%s channel=%s round=%s attempt=%s",
-                            profile.id,
-                            channel,
-                            round_number,
-                            attempt_number,
-                        )
-                        continue
-                    if (
-                        candidate_has_prayer
-                        and not generation_state["prayer_request_detected"]
-                        and not candidate_has_action
-                    ):
-                        logger.warning(
-                            "Candidate blocked: prayer without practical action profile_id=%s channel=%s round=%s attempt=%s",
-                            profile.id,
-                            channel,
-                            round_number,
-                            attempt_number,
-                        )
-                        continue
-                    empathy_stats = self._empathy_sentence_stats(
-                        assistant_text_candidate
-                    )
-                    if empathy_stats["count"] > MAX_EMPATHY_SENTENCES_PER_RESPONSE:
-                        logger.warning(
-                            "Candidate blocked: excessive empathy sentences profile_id=%s channel=%s round=%s attempt=%s count=%s",
-                            profile.id,
-                            channel,
-                            round_number,
-                            attempt_number,
-                            empathy_stats["count"],
-                        )
-                        continue
-                    if (
-                        empathy_stats["count"] == 1
-                        and empathy_stats["max_words"] > MAX_EMPATHY_SENTENCE_WORDS
-                    ):
-                        logger.warning(
-                            "Candidate blocked: empathy sentence too long profile_id=%s channel=%s round=%s attempt=%s words=%s",
-                            profile.id,
-                            channel,
-                            round_number,
-                            attempt_number,
-                            empathy_stats["max_words"],
-                        )
-                        continue
-                    if self._has_strong_inference(assistant_text_candidate):
-                        has_citation = self._contains_user_citation(
-                            assistant_text_candidate, last_person_message.content
-                        )
-                        has_conditional_confirmation = (
-                            self._has_conditional_inference_confirmation(
-                                assistant_text_candidate
-                            )
-                        )
-                        if not has_citation or not has_conditional_confirmation:
-                            logger.warning(
-                                "Candidate blocked: strong inference without citation/confirmation profile_id=%s channel=%s round=%s attempt=%s",
-                                profile.id,
-                                channel,
-                                round_number,
-                                attempt_number,
-                            )
-                            continue
-                    candidate_progress_metric = self._extract_progress_metric(
-                        assistant_text_candidate
-                    )
-                    if force_single_concrete_action:
-                        concrete_actions = self._count_concrete_actions(
-                            assistant_text_candidate
-                        )
-                        if concrete_actions != 1:
-                            logger.warning(
-                                "Candidate blocked: force single concrete action profile_id=%s channel=%s round=%s attempt=%s actions=%s",
-                                profile.id,
-                                channel,
-                                round_number,
-                                attempt_number,
-                                concrete_actions,
-                            )
-                            continue
-                        if not self._progress_advanced(
-                            previous_progress_metric, candidate_progress_metric
-                        ):
-                            logger.warning(
-                                "Candidate blocked: no progress advance under force mode profile_id=%s channel=%s round=%s attempt=%s",
-                                profile.id,
-                                channel,
-                                round_number,
-                                attempt_number,
-                            )
-                            continue
-
-                    evaluation = self._evaluate_response(
-                        user_message=last_person_message.content,
-                        assistant_response=assistant_text_candidate,
+                    guarded_candidates.append(
+                        {
+                            "attempt": attempt_number,
+                            "response": features.text,
+                            "progress_metric": features.progress_metric,
+                        }
                     )
+
+                evaluations = self._evaluate_candidates(
+                    user_message=last_person_message.content,
+                    candidates=[item["response"] for item in guarded_candidates],
+                    timeout=latency_budget.call_timeout(FIXED_TIMEOUT_SECONDS),
+                )
+                for candidate, evaluation in zip(guarded_candidates, evaluations):
                     score = evaluation["score"]
                     analysis = evaluation["analysis"]
                     improvement_prompt = evaluation["improvement_prompt"]
                     logger.info(
                         "Evaluation round %s attempt %s | score=%s",
                         round_number,
-                        attempt_number,
+                        candidate["attempt"],
                         score,
                     )
                     logger.info("Improvement prompt: %s", improvement_prompt)
 
                     attempt = {
                         "round": round_number,
-                        "attempt": attempt_number,
-                        "response": assistant_text_candidate,
+                        "attempt": candidate["attempt"],
+                        "response": candidate["response"],
                         "score": score,
                         "analysis": analysis,
                         "improvement_prompt": improvement_prompt,
-                        "progress_metric": candidate_progress_metric,
+                        "progress_metric": candidate["progress_metric"],
                     }
                     attempts.append(attempt)
                     evaluated_candidates_in_round += 1
@@ -2095,10 +1995,37 @@ Resposta do assistente para avaliar:
                     break
                 if regen_attempt >= MAX_INFERENCE_REGEN_PER_ROUND:
                     break
-                if round_number == 1:
-                    current_response = client.chat.completions.create(**request_kwargs)
-                else:
-                    current_response = client.chat.completions.create(**refined_kwargs)
+                if best_attempt and not latency_budget.can_afford(
+                    max(
+                        slowest_round_seconds,
+                        latency_budget.elapsed() - round_started_at,
+                    )
+                ):
+                    latency_budget.skip()
+                    logger.warning(
+                        "Latency budget stopped guard regeneration profile_id=%s round=%s remaining=%.1fs",
+                        profile.id,
+                        round_number,
+                        latency_budget.remaining(),
+                    )
+                    break
+                regen_kwargs = request_kwargs if round_number == 1 else refined_kwargs
+                regen_kwargs["timeout"] = latency_budget.call_timeout(
+                    FIXED_TIMEOUT_SECONDS
+                )
+                try:
+                    current_response = client.chat.completions.create(**regen_kwargs)
+                except OpenAIRateLimitTimeout:
+                    if not best_attempt:
+                        raise
+                    latency_budget.skip()
+                    logger.warning(
+                        "Rate limit wait stopped guard regeneration profile_id=%s round=%s remaining=%.1fs",
+                        profile.id,
+                        round_number,
+                        latency_budget.remaining(),
+                    )
+                    break
                 current_metadata = _usage_metadata(current_response)
                 current_metadata["round"] = round_number
                 current_metadata["regenerated_after_guard"] = True
@@ -2110,6 +2037,15 @@ Resposta do assistente para avaliar:
                         "OpenAI did not return the expected 2 candidates."
                     )
 
+            slowest_round_seconds = max(
+                slowest_round_seconds, latency_budget.elapsed() - round_started_at
+            )
+            if (
+                latency_budget.exhausted
+                and best_attempt
+                and evaluated_candidates_in_round == 0
+            ):
+                break
             if non_empty_candidates_in_round == 0:
                 raise RuntimeError("OpenAI returned empty assistant content.")
             if evaluated_candidates_in_round == 0:
@@ -2131,13 +2067,14 @@ Resposta do assistente para avaliar:
         assistant_text = best_attempt["response"]
         best_score = best_attempt["score"]
         logger.info("Selected best score=%s", best_score)
-        selected_has_prayer = self._contains_prayer_language(assistant_text)
+        selected_features = analyze_candidate(assistant_text)
+        selected_has_prayer = selected_features.has_prayer_language
         next_prayer_cooldown_remaining = generation_state["prayer_cooldown_remaining"]
         if selected_has_prayer:
             next_prayer_cooldown_remaining = PRAYER_COOLDOWN_TURNS
         selected_progress_metric = best_attempt.get("progress_metric")
         if not isinstance(selected_progress_metric, dict):
-            selected_progress_metric = self._extract_progress_metric(assistant_text)
+            selected_progress_metric = selected_features.progress_metric
         progress_advanced = self._progress_advanced(
             generation_state["previous_progress_metric"], selected_progress_metric
         )
@@ -2217,6 +2154,8 @@ Resposta do assistente para avaliar:
                 "progress_metric": selected_progress_metric,
                 "progress_advanced": progress_advanced,
                 "progress_stalled_turns": next_progress_stalled_turns,
+                "embedding_cache": embedding_counter.as_metadata(),
+                "latency_budget": latency_budget.as_metadata(),
             },
             "evaluation": {
                 "attempts": attempts,
@@ -2228,28 +2167,48 @@ Resposta do assistente para avaliar:
             },
         }
         first_message = None
-        for index, chunk in enumerate(chunks):
-            payload = response_payload if index == 0 else None
-            message = Message.objects.create(
-                profile=profile,
-                role="assistant",
-                content=chunk,
-                channel=channel,
-                ollama_prompt=payload,
-                score=float(best_score),
-                bot_mode=generation_state["derived_mode"],
-                theme=selected_theme,
-                block_root=first_message,
+        created_messages = []
+        with transaction.atomic():
+            for chunk in chunks:
+                message = Message.objects.create(
+                    profile=profile,
+                    role="assistant",
+                    content=chunk,
+                    channel=channel,
+                    score=float(best_score),
+                    bot_mode=generation_state["derived_mode"],
+                    theme=selected_theme,
+                    block_root=first_message,
+                )
+                created_messages.append(message)
+                if first_message is None:
+                    first_message = message
+                    message.block_root = message
+                    message.save(update_fields=["block_root"])
+                    store_message_payload(message, response_payload)
+            self._record_assistant_reply_state(
+                profile,
+                created_messages,
+                response_payload["metadata"],
+                index=ngram_index,
+            )
+        try:
+            store_message_embeddings(created_messages)
+        except Exception as exc:
+            # The reply is already saved; the next turn embeds what is missing.
+            logger.warning(
+                "Failed to store assistant message embeddings profile_id=%s error=%s",
+                profile.id,
+                exc,
             )
-            if first_message is None:
-                first_message = message
-                message.block_root = message
-                message.save(update_fields=["block_root"])
         return assistant_text
 
     def _classify_and_persist_message_theme(self, message: Message) -> Theme:
         theme_id = self._theme_classifier.classify(message.content)
-        theme = Theme.objects.filter(id=theme_id).first()
+        return self._persist_message_theme(message, theme_id)
+
+    def _persist_message_theme(self, message: Message, theme_id: int) -> Theme:
+        theme = get_theme_catalog().get(theme_id)
         if not theme:
             raise RuntimeError(f"Theme '{theme_id}' not found in database.")
         if message.theme_id != theme.id:
@@ -2307,12 +2266,11 @@ Resposta do assistente para avaliar:
                 f"NUNCA mencione explicitamente): {profile.inferred_gender}"
             )
 
-        welcome_template = self._prompt_registry.get_active_prompt(
-            "welcome.generator"
-        ).content
-        system_prompt = welcome_template.format(
-            name=profile.name,
-            gender_context=gender_context,
+        welcome_template = get_compiled_template(
+            self._prompt_registry.get_active_prompt(WELCOME_GENERATOR_TEMPLATE_KEY)
+        )
+        system_prompt = welcome_template.render(
+            {"name": profile.name, "gender_context": gender_context}
         )
 
         last_user_message = profile.messages.filter(role="user").last()
@@ -2336,16 +2294,26 @@ Resposta do assistente para avaliar:
         profile.conversation_mode = MODE_WELCOME
         profile.save(update_fields=["welcome_message_sent", "conversation_mode"])
 
-        message = Message.objects.create(
-            profile=profile,
-            role="assistant",
-            content=response,
-            channel=channel,
-            ollama_prompt=welcome_payload,
-            bot_mode=MODE_WELCOME,
-        )
-        message.block_root = message
-        message.save(update_fields=["block_root"])
+        with transaction.atomic():
+            message = Message.objects.create(
+                profile=profile,
+                role="assistant",
+                content=response,
+                channel=channel,
+                bot_mode=MODE_WELCOME,
+            )
+            message.block_root = message
+            message.save(update_fields=["block_root"])
+            store_message_payload(message, welcome_payload)
+            self._record_assistant_reply_state(
+                profile,
+                [message],
+                (
+                    welcome_payload.get("metadata")
+                    if isinstance(welcome_payload, dict)
+                    else None
+                ),
+            )
         return message
 
     def build_theme_prompt(self, theme_name: str) -> str:
@@ -1,9 +1,21 @@
-import math
 import os
 import re
-from typing import Iterable, List
-
-import requests
+import threading
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List
+
+import numpy as np
+
+from core.models import MessageEmbedding
+from services.embedding_backends import EmbeddingBackend, build_embedding_backend
+from services.embedding_cache import (
+    DEFAULT_MEMORY_CAPACITY,
+    EmbeddingCache,
+    pack_vector,
+    unpack_vector,
+)
+from services.marker_matcher import MarkerAutomaton
+from services.similarity import cosine_matrix, normalized_rows
 
 BLOCKED_PATTERNS = [
     "isso pode ser muito difícil",
@@ -34,6 +46,10 @@ MAX_WORDS = 180
 MAX_QUESTIONS = 1
 SEMANTIC_LOOP_THRESHOLD = 0.85
 
+_EMBEDDING_CACHE = EmbeddingCache(
+    capacity=int(os.environ.get("EMBEDDING_CACHE_SIZE", DEFAULT_MEMORY_CAPACITY))
+)
+
 _GREETING_PREFIXES = (
     "oi",
     "olá",
@@ -288,6 +304,189 @@ _PRACTICAL_ACTION_MARKERS = [
     "pare",
 ]
 
+_EXPLICIT_DESPAIR_MARKERS = [
+    "desespero",
+    "desesperado",
+    "desesperada",
+    "não aguento mais",
+    "nao aguento mais",
+    "acabou pra mim",
+]
+
+PRAYER_REQUEST_MARKERS = (
+    "ore por mim",
+    "ora por mim",
+    "ore comigo",
+    "ora comigo",
+    "reze por mim",
+    "reze comigo",
+    "preciso de oração",
+    "pode orar",
+    "oração por mim",
+)
+
+LIVE_SUPPORT_REQUEST_MARKERS = (
+    "posso te ligar",
+    "você pode me ligar",
+    "voce pode me ligar",
+    "me liga",
+    "me ligue",
+    "me manda mensagem",
+    "me mande mensagem",
+    "fique comigo",
+    "fica comigo",
+)
+
+_INSTITUTIONAL_REQUEST_MARKERS = [
+    "como fazer",
+    "como realizar",
+    "me instrua",
+    "qual o processo",
+    "como funciona",
+    "preciso saber como",
+    "me explique o processo",
+]
+
+_TEXT_REQUEST_MARKERS = [
+    "escreva para mim",
+    "escrever para mim",
+    "faz uma mensagem",
+    "me dá uma mensagem",
+    "me de uma mensagem",
+    "texto pronto",
+    "pronto para copiar",
+    "modelo de mensagem",
+]
+
+_COMPANIONSHIP_REQUEST_MARKERS = [
+    "fica comigo",
+    "fique comigo",
+    "fica aqui",
+    "fique aqui",
+    "fica online",
+    "fique online",
+    "trocando mensagem",
+    "não me deixa sozinho",
+    "nao me deixa sozinho",
+]
+
+_PRACTICAL_STEP_REQUEST_MARKERS = [
+    "o que faço agora",
+    "o que eu faço agora",
+    "como faço",
+    "como começo",
+    "por onde começo",
+    "próximo passo",
+    "proximo passo",
+    "passo a passo",
+]
+
+_PRESENCIAL_REQUEST_MARKERS = [
+    "visita",
+    "visitar",
+    "ir comigo",
+    "presencial",
+    "pessoalmente",
+    "na minha casa",
+]
+
+_HIGH_DISTRESS_MARKERS = [
+    "chor",
+    "desmoron",
+    "arrasad",
+    "não aguento",
+    "nao aguento",
+    "peito apertado",
+    "desespero",
+]
+
+_CLOSING_MARKERS = [
+    "obrigado",
+    "obrigada",
+    "já ajudou",
+    "ja ajudou",
+    "era isso",
+    "vamos encerrar",
+    "pode encerrar",
+    "tá bom por hoje",
+    "ta bom por hoje",
+]
+
+_EXECUTION_DONE_MARKERS = [
+    "fiz",
+    "feito",
+    "enviei",
+    "mande",
+    "agendei",
+    "combinei",
+    "coloquei em prática",
+    "coloquei em pratica",
+]
+
+_CONFIRMATION_MARKERS = [
+    "sim",
+    "aceito",
+    "topo",
+    "vou fazer",
+    "vou tentar",
+    "combinado",
+    "fechado",
+    "pode ser",
+]
+
+# Categories reported by match_user_markers().
+MARKER_GUIDANCE_REQUEST = "guidance_request"
+MARKER_REPETITION_COMPLAINT = "repetition_complaint"
+MARKER_AMBIVALENCE = "ambivalence"
+MARKER_DEFENSIVE = "defensive"
+MARKER_GUILT = "guilt"
+MARKER_DEEP_SUFFERING = "deep_suffering"
+MARKER_REPETITIVE = "repetitive"
+MARKER_FAMILY_CONFLICT = "family_conflict"
+MARKER_IMPOTENCE = "impotence"
+MARKER_EXPLICIT_DESPAIR = "explicit_despair"
+MARKER_SPIRITUAL_CONTEXT = "spiritual_context"
+MARKER_HIGH_SPIRITUAL_NEED = "high_spiritual_need"
+MARKER_PRAYER_REQUEST = "prayer_request"
+MARKER_LIVE_SUPPORT_REQUEST = "live_support_request"
+MARKER_INSTITUTIONAL_REQUEST = "institutional_request"
+MARKER_TEXT_REQUEST = "text_request"
+MARKER_COMPANIONSHIP_REQUEST = "companionship_request"
+MARKER_PRACTICAL_STEP_REQUEST = "practical_step_request"
+MARKER_PRESENCIAL_REQUEST = "presencial_request"
+MARKER_HIGH_DISTRESS = "high_distress"
+MARKER_CLOSING = "closing"
+MARKER_EXECUTION_DONE = "execution_done"
+MARKER_CONFIRMATION = "confirmation"
+
+_USER_MARKER_AUTOMATON = MarkerAutomaton(
+    {
+        MARKER_GUIDANCE_REQUEST: _DIRECT_GUIDANCE_MARKERS,
+        MARKER_REPETITION_COMPLAINT: _REPETITION_COMPLAINT_MARKERS,
+        MARKER_AMBIVALENCE: _AMBIVALENCE_MARKERS,
+        MARKER_DEFENSIVE: _DEFENSIVE_MARKERS,
+        MARKER_GUILT: _GUILT_MARKERS,
+        MARKER_DEEP_SUFFERING: _DEEP_SUFFERING_MARKERS,
+        MARKER_REPETITIVE: _REPETITIVE_GUILT_MARKERS,
+        MARKER_FAMILY_CONFLICT: _FAMILY_CONFLICT_MARKERS,
+        MARKER_IMPOTENCE: _IMPOTENCE_MARKERS,
+        MARKER_EXPLICIT_DESPAIR: _EXPLICIT_DESPAIR_MARKERS,
+        MARKER_SPIRITUAL_CONTEXT: _EXPLICIT_SPIRITUAL_TERMS + ["fé"],
+        MARKER_HIGH_SPIRITUAL_NEED: _HIGH_SPIRITUAL_NEED_MARKERS,
+        MARKER_PRAYER_REQUEST: PRAYER_REQUEST_MARKERS,
+        MARKER_LIVE_SUPPORT_REQUEST: LIVE_SUPPORT_REQUEST_MARKERS,
+        MARKER_INSTITUTIONAL_REQUEST: _INSTITUTIONAL_REQUEST_MARKERS,
+        MARKER_TEXT_REQUEST: _TEXT_REQUEST_MARKERS,
+        MARKER_COMPANIONSHIP_REQUEST: _COMPANIONSHIP_REQUEST_MARKERS,
+        MARKER_PRACTICAL_STEP_REQUEST: _PRACTICAL_STEP_REQUEST_MARKERS,
+        MARKER_PRESENCIAL_REQUEST: _PRESENCIAL_REQUEST_MARKERS,
+        MARKER_HIGH_DISTRESS: _HIGH_DISTRESS_MARKERS,
+        MARKER_CLOSING: _CLOSING_MARKERS,
+        MARKER_EXECUTION_DONE: _EXECUTION_DONE_MARKERS,
+        MARKER_CONFIRMATION: _CONFIRMATION_MARKERS,
+    }
+)
+
 
 def _normalize(text: str) -> str:
     return re.sub(r"\s+", " ", (text or "").strip().lower())
@@ -309,25 +508,149 @@ def _extract_greeting(text: str) -> str:
     return ""
 
 
-def _embedding_base_url() -> str:
-    return os.environ.get("OLLAMA_BASE_URL", "http://localhost:11434").rstrip("/")
+_embedding_backends: Dict[tuple, EmbeddingBackend] = {}
+_embedding_backends_lock = threading.Lock()
+
 
+def get_embedding_backend() -> EmbeddingBackend:
+    """
+    Backend selected by EMBEDDING_BACKEND ("ollama" by default, or "local").
 
-def _embedding_model() -> str:
-    return os.environ.get("OLLAMA_EMBED_MODEL", "nomic-embed-text")
+    Instances are reused per process while the backend settings stay the same.
+    """
+    settings_key = tuple(
+        os.environ.get(name, "")
+        for name in (
+            "EMBEDDING_BACKEND",
+            "OLLAMA_BASE_URL",
+            "OLLAMA_EMBED_MODEL",
+            "EMBEDDING_HASH_DIMENSIONS",
+        )
+    )
+    with _embedding_backends_lock:
+        backend = _embedding_backends.get(settings_key)
+        if backend is None:
+            backend = build_embedding_backend(settings_key[0])
+            _embedding_backends[settings_key] = backend
+        return backend
+
+
+def embed_texts(texts: Iterable[str]) -> Dict[str, np.ndarray]:
+    """
+    Embed every distinct non-empty text with at most one server round-trip.
+
+    Cached vectors are served first; the remaining texts go to the configured
+    backend in one embed() call (a single /api/embed request for Ollama).
+    Results are float32 arrays keyed by text and are written back to the
+    cache, so later similarity checks on the same texts do not hit the
+    server. Backends that do not persist vectors bypass the cache.
+    """
+    unique_texts = list(dict.fromkeys(text for text in texts if text))
+    if not unique_texts:
+        return {}
+    backend = get_embedding_backend()
+    if not backend.persist_vectors:
+        return dict(zip(unique_texts, backend.embed(unique_texts)))
+    vectors = _EMBEDDING_CACHE.get_many(backend.name, unique_texts)
+    missing = [text for text in unique_texts if text not in vectors]
+    if missing:
+        fresh = dict(zip(missing, backend.embed(missing)))
+        _EMBEDDING_CACHE.set_many(backend.name, fresh)
+        vectors.update(fresh)
+    return vectors
+
+
+def store_message_embeddings(messages: Iterable) -> int:
+    """
+    Embed and persist the content of freshly saved messages.
+
+    All texts go out in a single embed_texts() batch. Returns the number of
+    message_embedding rows written.
+    """
+    messages = [message for message in messages if message.content]
+    backend = get_embedding_backend()
+    if not messages or not backend.persist_vectors:
+        return 0
+    model = backend.name
+    vectors = embed_texts(message.content for message in messages)
+    MessageEmbedding.objects.bulk_create(
+        [
+            MessageEmbedding(
+                message_id=message.id,
+                model=model,
+                vector=pack_vector(vectors[message.content]),
+            )
+            for message in messages
+        ],
+        ignore_conflicts=True,
+    )
+    return len(messages)
+
+
+def load_message_embeddings(messages: Iterable) -> int:
+    """
+    Prime the embedding cache with the stored vectors of these messages.
+
+    Stored vectors are read in one query. Messages without a stored vector
+    (history saved before embeddings existed, or saved outside the chat
+    runtime) are embedded in one batch and stored now, so later turns only
+    read them. Returns the number of vectors served from storage.
+    """
+    messages = [message for message in messages if message.content]
+    backend = get_embedding_backend()
+    if not messages or not backend.persist_vectors:
+        return 0
+    model = backend.name
+    stored = dict(
+        MessageEmbedding.objects.filter(
+            model=model, message_id__in=[message.id for message in messages]
+        ).values_list("message_id", "vector")
+    )
+    _EMBEDDING_CACHE.prime(
+        model,
+        {
+            message.content: unpack_vector(stored[message.id])
+            for message in messages
+            if message.id in stored
+        },
+    )
+    store_message_embeddings(
+        message for message in messages if message.id not in stored
+    )
+    return len(stored)
+
+
+def embedding_cache_stats() -> Dict[str, int]:
+    """Cumulative embedding cache counters for this process."""
+    return _EMBEDDING_CACHE.stats()
 
 
-def _embedding_for_text(text: str) -> List[float]:
-    response = requests.post(
-        f"{_embedding_base_url()}/api/embeddings",
-        json={"model": _embedding_model(), "prompt": text},
-        timeout=12,
+def semantic_similarity_matrix(texts_a: List[str], texts_b: List[str]) -> np.ndarray:
+    """
+    Cosine similarity of every text in texts_a against every text in texts_b.
+
+    All texts are embedded in one embed_texts() call and scored with a single
+    float32 matrix product. Empty texts score 0.0 and texts that are equal
+    after normalization score exactly 1.0, matching semantic_similarity().
+    """
+    scores = np.zeros((len(texts_a), len(texts_b)), dtype=np.float32)
+    rows = [index for index, text in enumerate(texts_a) if text]
+    columns = [index for index, text in enumerate(texts_b) if text]
+    if not rows or not columns:
+        return scores
+    vectors = embed_texts(
+        [texts_a[index] for index in rows] + [texts_b[index] for index in columns]
     )
-    response.raise_for_status()
-    embedding = response.json().get("embedding")
-    if not isinstance(embedding, list):
-        raise RuntimeError("Invalid embedding response")
-    return embedding
+    left = normalized_rows([vectors[texts_a[index]] for index in rows])
+    right = normalized_rows([vectors[texts_b[index]] for index in columns])
+    scores[np.ix_(rows, columns)] = cosine_matrix(left, right)
+    normalized_b = {index: _normalize(texts_b[index]) for index in columns}
+    for row in rows:
+        normalized_a = _normalize(texts_a[row])
+        for column in columns:
+            if normalized_a == normalized_b[column]:
+                scores[row, column] = 1.0
+    return scores
 
 
 def semantic_similarity(text_a: str, text_b: str) -> float:
@@ -335,99 +658,82 @@ def semantic_similarity(text_a: str, text_b: str) -> float:
         return 0.0
     if _normalize(text_a) == _normalize(text_b):
         return 1.0
-    vec_a = _embedding_for_text(text_a)
-    vec_b = _embedding_for_text(text_b)
-    dot = sum(a * b for a, b in zip(vec_a, vec_b))
-    norm_a = math.sqrt(sum(a * a for a in vec_a))
-    norm_b = math.sqrt(sum(b * b for b in vec_b))
-    if not norm_a or not norm_b:
-        return 0.0
-    return dot / (norm_a * norm_b)
+    return float(semantic_similarity_matrix([text_a], [text_b])[0, 0])
+
+
+@lru_cache(maxsize=256)
+def match_user_markers(user_message: str) -> FrozenSet[str]:
+    """
+    Every marker category (MARKER_*) present in a user message.
+
+    One automaton pass over the normalized text; the result is cached so the
+    detectors below and ChatService share the scan of the same message.
+    """
+    return _USER_MARKER_AUTOMATON.categories_in(_normalize(user_message))
 
 
 def detect_direct_guidance_request(user_message: str) -> bool:
-    msg = _normalize(user_message)
-    return any(marker in msg for marker in _DIRECT_GUIDANCE_MARKERS)
+    return MARKER_GUIDANCE_REQUEST in match_user_markers(user_message)
 
 
 def detect_repetition_complaint(user_message: str) -> bool:
-    msg = _normalize(user_message)
-    return any(marker in msg for marker in _REPETITION_COMPLAINT_MARKERS)
+    return MARKER_REPETITION_COMPLAINT in match_user_markers(user_message)
 
 
 def has_spiritual_context(user_message: str) -> bool:
-    msg = _normalize(user_message)
-    return any(term in msg for term in _EXPLICIT_SPIRITUAL_TERMS) or "fé" in msg
+    return MARKER_SPIRITUAL_CONTEXT in match_user_markers(user_message)
 
 
 def has_high_spiritual_need(user_message: str) -> bool:
-    msg = _normalize(user_message)
-    return any(marker in msg for marker in _HIGH_SPIRITUAL_NEED_MARKERS)
+    return MARKER_HIGH_SPIRITUAL_NEED in match_user_markers(user_message)
 
 
 def detect_ambivalence(user_message: str) -> bool:
-    msg = _normalize(user_message)
-    return any(marker in msg for marker in _AMBIVALENCE_MARKERS)
+    return MARKER_AMBIVALENCE in match_user_markers(user_message)
 
 
 def detect_defensiveness(user_message: str) -> bool:
-    msg = _normalize(user_message)
-    return any(marker in msg for marker in _DEFENSIVE_MARKERS)
+    return MARKER_DEFENSIVE in match_user_markers(user_message)
 
 
 def detect_guilt(user_message: str) -> bool:
-    msg = _normalize(user_message)
-    return any(marker in msg for marker in _GUILT_MARKERS)
+    return MARKER_GUILT in match_user_markers(user_message)
 
 
 def detect_deep_suffering(user_message: str) -> bool:
-    msg = _normalize(user_message)
-    return any(marker in msg for marker in _DEEP_SUFFERING_MARKERS)
+    return MARKER_DEEP_SUFFERING in match_user_markers(user_message)
 
 
 def detect_repetitive_guilt(user_message: str) -> bool:
-    msg = _normalize(user_message)
-    has_guilt = any(marker in msg for marker in _GUILT_MARKERS)
-    if not has_guilt:
-        return False
-    return any(marker in msg for marker in _REPETITIVE_GUILT_MARKERS)
+    markers = match_user_markers(user_message)
+    return MARKER_GUILT in markers and MARKER_REPETITIVE in markers
 
 
 def detect_family_conflict_impotence(user_message: str) -> bool:
-    msg = _normalize(user_message)
-    has_family_conflict = any(marker in msg for marker in _FAMILY_CONFLICT_MARKERS)
-    has_impotence = any(marker in msg for marker in _IMPOTENCE_MARKERS)
-    return has_family_conflict and has_impotence
+    markers = match_user_markers(user_message)
+    return MARKER_FAMILY_CONFLICT in markers and MARKER_IMPOTENCE in markers
 
 
 def detect_explicit_despair(user_message: str) -> bool:
-    msg = _normalize(user_message)
-    return any(
-        marker in msg
-        for marker in [
-            "desespero",
-            "desesperado",
-            "desesperada",
-            "não aguento mais",
-            "nao aguento mais",
-            "acabou pra mim",
-        ]
-    )
+    return MARKER_EXPLICIT_DESPAIR in match_user_markers(user_message)
 
 
 def detect_user_signals(user_message: str) -> dict:
+    markers = match_user_markers(user_message)
     return {
-        "guidance_request": detect_direct_guidance_request(user_message),
-        "repetition_complaint": detect_repetition_complaint(user_message),
-        "ambivalence": detect_ambivalence(user_message),
-        "defensive": detect_defensiveness(user_message),
-        "guilt": detect_guilt(user_message),
-        "deep_suffering": detect_deep_suffering(user_message),
-        "repetitive_guilt": detect_repetitive_guilt(user_message),
-        "family_conflict_impotence": detect_family_conflict_impotence(user_message),
-        "explicit_despair": detect_explicit_despair(user_message),
-        "spiritual_context": has_spiritual_context(user_message),
-        "high_spiritual_need": has_high_spiritual_need(user_message),
+        "guidance_request": MARKER_GUIDANCE_REQUEST in markers,
+        "repetition_complaint": MARKER_REPETITION_COMPLAINT in markers,
+        "ambivalence": MARKER_AMBIVALENCE in markers,
+        "defensive": MARKER_DEFENSIVE in markers,
+        "guilt": MARKER_GUILT in markers,
+        "deep_suffering": MARKER_DEEP_SUFFERING in markers,
+        "repetitive_guilt": MARKER_GUILT in markers and MARKER_REPETITIVE in markers,
+        "family_conflict_impotence": (
+            MARKER_FAMILY_CONFLICT in markers and MARKER_IMPOTENCE in markers
+        ),
+        "explicit_despair": MARKER_EXPLICIT_DESPAIR in markers,
+        "spiritual_context": MARKER_SPIRITUAL_CONTEXT in markers,
+        "high_spiritual_need": MARKER_HIGH_SPIRITUAL_NEED in markers,
     }
 
 
@@ -0,0 +1,171 @@
+"""Embedding backends used by the conversation runtime similarity checks."""
+
+import math
+import os
+import re
+import unicodedata
+import zlib
+from abc import ABC, abstractmethod
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import numpy as np
+import requests
+
+EMBEDDING_REQUEST_TIMEOUT_SECONDS = 12
+EMBEDDING_FANOUT_MAX_WORKERS = 4
+# Status codes meaning the server has no /api/embed batch endpoint.
+EMBEDDING_BATCH_UNSUPPORTED_STATUS = (404, 405, 501)
+
+DEFAULT_HASHING_DIMENSIONS = 2048
+HASHING_NGRAM_SIZES = (3, 4, 5)
+
+
+class EmbeddingBackend(ABC):
+    """
+    Turns texts into fixed-size vectors.
+
+    `name` identifies the vector space: it is the cache and storage key, so
+    two backends must never share a name. Backends whose vectors are cheaper
+    to recompute than to read back set `persist_vectors` to False.
+    """
+
+    name = ""
+    persist_vectors = True
+
+    @abstractmethod
+    def embed(self, texts: List[str]) -> List[np.ndarray]:
+        """One vector per text, in order."""
+
+
+class OllamaEmbeddingBackend(EmbeddingBackend):
+    """
+    Embeddings from an Ollama server.
+
+    Several texts go out as one /api/embed request; servers without that
+    endpoint are remembered and served with a bounded concurrent fan-out over
+    /api/embeddings.
+    """
+
+    def __init__(self, base_url: str, model: str):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.name = model
+        self._batch_endpoint_supported = True
+
+    def embed(self, texts: List[str]) -> List[np.ndarray]:
+        if len(texts) == 1:
+            embeddings = [self._request_embedding(texts[0])]
+        elif self._batch_endpoint_supported:
+            embeddings = self._request_embeddings_batch(texts)
+            if embeddings is None:
+                self._batch_endpoint_supported = False
+                embeddings = self._request_embeddings_fanout(texts)
+        else:
+            embeddings = self._request_embeddings_fanout(texts)
+        return [np.asarray(vector, dtype=np.float32) for vector in embeddings]
+
+    def _request_embedding(self, text: str) -> List[float]:
+        response = requests.post(
+            f"{self.base_url}/api/embeddings",
+            json={"model": self.model, "prompt": text},
+            timeout=EMBEDDING_REQUEST_TIMEOUT_SECONDS,
+        )
+        response.raise_for_status()
+        embedding = response.json().get("embedding")
+        if not isinstance(embedding, list):
+            raise RuntimeError("Invalid embedding response")
+        return embedding
+
+    def _request_embeddings_batch(
+        self, texts: List[str]
+    ) -> Optional[List[List[float]]]:
+        """Returns None when the server does not expose the batch endpoint."""
+        response = requests.post(
+            f"{self.base_url}/api/embed",
+            json={"model": self.model, "input": texts},
+            timeout=EMBEDDING_REQUEST_TIMEOUT_SECONDS,
+        )
+        if response.status_code in EMBEDDING_BATCH_UNSUPPORTED_STATUS:
+            return None
+        response.raise_for_status()
+        embeddings = response.json().get("embeddings")
+        if (
+            not isinstance(embeddings, list)
+            or len(embeddings) != len(texts)
+            or not all(isinstance(item, list) for item in embeddings)
+        ):
+            raise RuntimeError("Invalid batch embedding response")
+        return embeddings
+
+    def _request_embeddings_fanout(self, texts: List[str]) -> List[List[float]]:
+        workers = max(1, min(EMBEDDING_FANOUT_MAX_WORKERS, len(texts)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(self._request_embedding, texts))
+
+
+class HashingEmbeddingBackend(EmbeddingBackend):
+    """
+    In-process character n-gram vectors; no network, no model files.
+
+    Accent-folded, lowercased text is split into 3-5 character n-grams per
+    word (with boundary markers), hashed into `dimensions` buckets with a
+    signed CRC32 hash, weighted by sublinear term frequency and L2
+    normalized. There is no IDF term: a corpus-dependent weight would change
+    vectors as the corpus grows, and the checks only compare short texts
+    from the same conversation.
+    """
+
+    persist_vectors = False
+
+    def __init__(self, dimensions: int = DEFAULT_HASHING_DIMENSIONS):
+        self.dimensions = max(int(dimensions), 1)
+        self.name = f"local-hashing-ngram-{self.dimensions}"
+
+    def embed(self, texts: List[str]) -> List[np.ndarray]:
+        return [self._vector(text) for text in texts]
+
+    def _ngrams(self, text: str) -> List[str]:
+        folded = unicodedata.normalize("NFKD", (text or "").lower())
+        folded = "".join(char for char in folded if not unicodedata.combining(char))
+        grams = []
+        for word in re.findall(r"\w+", folded):
+            padded = f" {word} "
+            for size in HASHING_NGRAM_SIZES:
+                grams.extend(
+                    padded[index : index + size]  # noqa: E203
+                    for index in range(0, len(padded) - size + 1)
+                )
+        return grams
+
+    def _vector(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for gram, count in Counter(self._ngrams(text)).items():
+            digest = zlib.crc32(gram.encode("utf-8"))
+            sign = 1.0 if digest & 0x80000000 else -1.0
+            vector[digest % self.dimensions] += sign * (1.0 + math.log(count))
+        norm = float(np.linalg.norm(vector))
+        if norm:
+            vector /= norm
+        return vector
+
+
+EMBEDDING_BACKEND_OLLAMA = "ollama"
+EMBEDDING_BACKEND_LOCAL = "local"
+
+
+def build_embedding_backend(kind: str) -> EmbeddingBackend:
+    kind = (kind or EMBEDDING_BACKEND_OLLAMA).strip().lower()
+    if kind == EMBEDDING_BACKEND_OLLAMA:
+        return OllamaEmbeddingBackend(
+            base_url=os.environ.get("OLLAMA_BASE_URL", "http://localhost:11434"),
+            model=os.environ.get("OLLAMA_EMBED_MODEL", "nomic-embed-text"),
+        )
+    if kind == EMBEDDING_BACKEND_LOCAL:
+        return HashingEmbeddingBackend(
+            dimensions=int(
+                os.environ.get("EMBEDDING_HASH_DIMENSIONS", DEFAULT_HASHING_DIMENSIONS)
+            )
+        )
+    raise ValueError(f"Unknown EMBEDDING_BACKEND '{kind}'")
@@ -0,0 +1,165 @@
+"""Content-hash keyed embedding cache used by the conversation runtime."""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+import numpy as np
+
+from core.models import TextEmbedding
+
+DEFAULT_MEMORY_CAPACITY = 2048
+
+
+class EmbeddingCacheCounter:
+    """Cache lookups made by one unit of work, e.g. a chat turn."""
+
+    def __init__(self):
+        self.memory_hits = 0
+        self.store_hits = 0
+        self.misses = 0
+
+    def as_metadata(self) -> Dict[str, Any]:
+        return {
+            "memory_hits": self.memory_hits,
+            "store_hits": self.store_hits,
+            "misses": self.misses,
+            "round_trips_saved": self.memory_hits + self.store_hits,
+        }
+
+
+_counter: ContextVar[Optional[EmbeddingCacheCounter]] = ContextVar(
+    "embedding_cache_counter", default=None
+)
+
+
+@contextmanager
+def count_embedding_cache_lookups() -> Iterator[EmbeddingCacheCounter]:
+    """
+    Count the cache lookups made in the enclosed block by this thread or task
+    only; the process-wide stats() keep counting everything.
+    """
+    counter = EmbeddingCacheCounter()
+    token = _counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _counter.reset(token)
+
+
+def embedding_content_hash(text: str) -> str:
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+def pack_vector(vector: Iterable[float]) -> bytes:
+    return np.asarray(vector, dtype=np.float32).tobytes()
+
+
+def unpack_vector(raw: bytes) -> np.ndarray:
+    return np.frombuffer(bytes(raw), dtype=np.float32)
+
+
+class EmbeddingCache:
+    """
+    In-process LRU in front of the persistent text_embedding table.
+
+    Vectors are keyed by (model, sha256(text)). Every lookup is counted as a
+    memory hit, a store hit or a miss; a miss is a text the caller still has
+    to send to the embedding server. Counts go to the process totals and to
+    the caller's count_embedding_cache_lookups() counter, if any.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_MEMORY_CAPACITY):
+        self._capacity = max(int(capacity), 0)
+        self._entries: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._memory_hits = 0
+        self._store_hits = 0
+        self._misses = 0
+
+    def get_many(self, model: str, texts: Iterable[str]) -> Dict[str, np.ndarray]:
+        """Return cached vectors keyed by text. Uncached texts are left out."""
+        counter = _counter.get()
+        found: Dict[str, np.ndarray] = {}
+        pending: Dict[str, str] = {}
+        seen = set()
+        with self._lock:
+            for text in texts:
+                if text in seen:
+                    continue
+                seen.add(text)
+                content_hash = embedding_content_hash(text)
+                key = (model, content_hash)
+                vector = self._entries.get(key)
+                if vector is None:
+                    pending[content_hash] = text
+                    continue
+                self._entries.move_to_end(key)
+                self._memory_hits += 1
+                if counter is not None:
+                    counter.memory_hits += 1
+                found[text] = vector
+
+        if not pending:
+            return found
+
+        stored = TextEmbedding.objects.filter(
+            model=model, content_hash__in=list(pending.keys())
+        ).values_list("content_hash", "vector")
+        with self._lock:
+            for content_hash, raw_vector in stored:
+                vector = unpack_vector(raw_vector)
+                self._remember((model, content_hash), vector)
+                found[pending.pop(content_hash)] = vector
+                self._store_hits += 1
+                if counter is not None:
+                    counter.store_hits += 1
+            self._misses += len(pending)
+            if counter is not None:
+                counter.misses += len(pending)
+        return found
+
+    def set_many(self, model: str, vectors: Dict[str, np.ndarray]) -> None:
+        """Remember freshly computed vectors in memory and in the table."""
+        if not vectors:
+            return
+        rows = []
+        with self._lock:
+            for text, vector in vectors.items():
+                content_hash = embedding_content_hash(text)
+                packed = pack_vector(vector)
+                self._remember((model, content_hash), unpack_vector(packed))
+                rows.append(
+                    TextEmbedding(model=model, content_hash=content_hash, vector=packed)
+                )
+        TextEmbedding.objects.bulk_create(rows, ignore_conflicts=True)
+
+    def prime(self, model: str, vectors: Dict[str, np.ndarray]) -> None:
+        """Load vectors that are already persisted elsewhere into memory only."""
+        with self._lock:
+            for text, vector in vectors.items():
+                self._remember((model, embedding_content_hash(text)), vector)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "memory_hits": self._memory_hits,
+                "store_hits": self._store_hits,
+                "misses": self._misses,
+                "memory_entries": len(self._entries),
+            }
+
+    def clear_memory(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _remember(self, key: tuple, vector: np.ndarray) -> None:
+        if not self._capacity:
+            return
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._capacity:
+            self._entries.popitem(last=False)
@@ -0,0 +1,58 @@
+"""Wall-clock budget for a single chat turn."""
+
+import os
+import time
+from typing import Any, Dict, Optional
+
+# Gunicorn kills a worker after 60 seconds (Procfile); leave room to persist.
+DEFAULT_LATENCY_BUDGET_SECONDS = 50.0
+MIN_CALL_TIMEOUT_SECONDS = 5.0
+
+
+def default_latency_budget_seconds() -> float:
+    return float(
+        os.environ.get("CHAT_LATENCY_BUDGET_SECONDS", DEFAULT_LATENCY_BUDGET_SECONDS)
+    )
+
+
+class LatencyBudget:
+    """
+    Tracks how much of a turn's time allowance is left.
+
+    Callers ask `can_afford()` before optional work (refinement rounds, guard
+    regenerations), record what they gave up with `skip()`, and clamp
+    per-call timeouts with `call_timeout()` so one slow request cannot
+    outlive the turn.
+    """
+
+    def __init__(self, seconds: Optional[float] = None):
+        if seconds is None:
+            seconds = default_latency_budget_seconds()
+        self.seconds = max(float(seconds), 0.0)
+        self._started_at = time.monotonic()
+        self.exhausted = False
+        self.skipped_rounds = 0
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self._started_at
+
+    def remaining(self) -> float:
+        return max(self.seconds - self.elapsed(), 0.0)
+
+    def can_afford(self, estimated_seconds: float) -> bool:
+        return self.remaining() >= estimated_seconds
+
+    def call_timeout(self, ceiling: float) -> float:
+        return max(min(float(ceiling), self.remaining()), MIN_CALL_TIMEOUT_SECONDS)
+
+    def skip(self, rounds: int = 1) -> None:
+        self.exhausted = True
+        self.skipped_rounds += rounds
+
+    def as_metadata(self) -> Dict[str, Any]:
+        return {
+            "budget_seconds": self.seconds,
+            "elapsed_seconds": round(self.elapsed(), 3),
+            "exhausted": self.exhausted,
+            "skipped_rounds": self.skipped_rounds,
+        }
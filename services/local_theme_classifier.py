@@ -0,0 +1,375 @@
+"""Local first-pass theme classifier: keywords plus embedding centroids."""
+
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from django.db import connection
+
+from core.models import Message, ThemeClassification
+from services.conversation_runtime import embed_texts
+from services.marker_matcher import MarkerAutomaton
+from services.similarity import cosine_one_to_many, normalized_rows
+from services.theme_catalog import ThemeCatalog
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOCAL_THEME_THRESHOLD = 0.85
+DEFAULT_LOCAL_THEME_EXAMPLES = 50
+DEFAULT_LOCAL_THEME_REFRESH_SECONDS = 3600.0
+DEFAULT_LOCAL_THEME_SCAN_MESSAGES = 5000
+MODEL_BUILD_RETRY_SECONDS = 60.0
+LABEL_SCAN_CHUNK = 500
+# Added to a theme's cosine score when one of its keywords occurs.
+KEYWORD_WEIGHT = 0.15
+# Sharpness of the softmax that turns scores into a confidence.
+SOFTMAX_SCALE = 25.0
+
+# Keywords by theme slug, matched at word starts on accent-free lowercase
+# text (" gast" matches "gastei" but not "desgaste"). They mirror the
+# tie-break rules of the LLM classifier prompt.
+THEME_KEYWORDS: Dict[str, List[str]] = {
+    "ansiedade": [" ansios", " ansiedade", " panico", " crise de ansiedade"],
+    "dinheiro_e_dividas": [
+        " divida",
+        " endivid",
+        " boleto",
+        " cartao de credito",
+        " emprestimo",
+        " gastei",
+        " gastos",
+        " dinheiro",
+        " fatura",
+        " nome sujo",
+    ],
+    "luto_e_perda": [
+        " luto",
+        " faleceu",
+        " falecimento",
+        " morreu",
+        " morte d",
+        " perdi meu",
+        " perdi minha",
+        " velorio",
+        " enterro",
+    ],
+    "vicios_e_recaidas": [
+        " vicio",
+        " viciad",
+        " recaida",
+        " recai",
+        " bebida",
+        " beber",
+        " alcool",
+        " droga",
+        " aposta",
+    ],
+    "trabalho_e_pressao": [" trabalho", " chefe", " emprego", " demitid", " prazo"],
+    "solidao": [" sozinh", " solidao", " solitari", " ninguem liga"],
+    "espiritualidade": [" deus", " fe ", " igreja", " orar", " oracao", " pecado"],
+    "saude_e_cansaco": [
+        " cansad",
+        " cansaco",
+        " exaust",
+        " doenca",
+        " doente",
+        " insonia",
+        " diagnostico",
+    ],
+    "relacionamento": [
+        " marido",
+        " esposa",
+        " namorad",
+        " casamento",
+        " divorcio",
+        " meu pai",
+        " minha mae",
+        " meu filho",
+        " minha filha",
+        " familia",
+    ],
+}
+
+_NON_WORD_RE = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_for_keywords(text: str) -> str:
+    """Accent-free lowercase words, space padded for word-start matching."""
+    decomposed = unicodedata.normalize("NFKD", (text or "").lower())
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return f" {_NON_WORD_RE.sub(' ', stripped).strip()} "
+
+
+class LocalThemeModel:
+    """
+    Nearest-centroid theme model over the current ThemeCatalog.
+
+    Each theme's centroid is the mean normalized embedding of its name, its
+    keywords and up to `examples_per_theme` user messages the LLM labeled
+    with it. predict() adds KEYWORD_WEIGHT for keyword hits and returns the
+    best theme with a softmax confidence.
+    """
+
+    def __init__(self, catalog: ThemeCatalog, examples: Dict[int, List[str]]):
+        self.catalog_version = catalog.version
+        self._keywords = MarkerAutomaton(
+            {
+                theme.id: THEME_KEYWORDS.get(theme.slug or "", [])
+                for theme in catalog.themes
+            }
+        )
+        theme_texts: Dict[int, List[str]] = {}
+        for theme in catalog.themes:
+            seeds = [theme.name or ""]
+            seeds.append(
+                " ".join(
+                    keyword.strip()
+                    for keyword in THEME_KEYWORDS.get(theme.slug or "", [])
+                )
+            )
+            seeds.extend(examples.get(theme.id, []))
+            theme_texts[theme.id] = [text for text in seeds if text and text.strip()]
+        vectors = embed_texts(text for texts in theme_texts.values() for text in texts)
+        self.theme_ids: List[int] = []
+        centroids = []
+        for theme_id, texts in theme_texts.items():
+            if not texts:
+                continue
+            rows = normalized_rows([vectors[text] for text in texts])
+            self.theme_ids.append(theme_id)
+            centroids.append(rows.mean(axis=0))
+        self._centroids = normalized_rows(centroids)
+        self.example_count = sum(len(texts) for texts in examples.values())
+
+    def keyword_themes(self, text: str) -> frozenset:
+        return self._keywords.categories_in(normalize_for_keywords(text))
+
+    def predict(self, text: str) -> Tuple[Optional[int], float]:
+        return self.predict_many([text])[0]
+
+    def predict_many(self, texts: List[str]) -> List[Tuple[Optional[int], float]]:
+        """(theme id, confidence) per text; all texts are embedded in one batch."""
+        vectors = embed_texts(texts) if self.theme_ids else {}
+        return [self._predict_vector(text, vectors.get(text)) for text in texts]
+
+    def _predict_vector(self, text: str, vector) -> Tuple[Optional[int], float]:
+        if vector is None or not text.strip():
+            return None, 0.0
+        vector = normalized_rows([vector])[0]
+        scores = cosine_one_to_many(vector, self._centroids).astype(np.float64)
+        keyword_themes = self.keyword_themes(text)
+        for index, theme_id in enumerate(self.theme_ids):
+            if theme_id in keyword_themes:
+                scores[index] += KEYWORD_WEIGHT
+        weights = np.exp((scores - scores.max()) * SOFTMAX_SCALE)
+        probabilities = weights / weights.sum()
+        best = int(np.argmax(probabilities))
+        return self.theme_ids[best], float(probabilities[best])
+
+
+def iter_llm_labeled_user_messages(
+    theme_ids: Iterable[int], exclude_ids=(), scan_limit: Optional[int] = None
+) -> Iterator[Tuple[int, str, int]]:
+    """
+    (message id, content, theme id) for user messages, newest first, labeled
+    with the theme the LLM returned for their text.
+
+    Message.theme also holds local predictions and forced or simulated
+    themes, so the label comes from ThemeClassification (LLM results only),
+    matched by text hash. Texts seen before are skipped; at most
+    `scan_limit` messages are read (THEME_LOCAL_SCAN_MESSAGES by default).
+    """
+    # Imported here: theme_classifier imports this module.
+    from services.theme_classifier import classification_text_hash
+
+    if scan_limit is None:
+        scan_limit = int(
+            os.environ.get(
+                "THEME_LOCAL_SCAN_MESSAGES", DEFAULT_LOCAL_THEME_SCAN_MESSAGES
+            )
+        )
+    allowed = set(theme_ids)
+    seen = set()
+    rows = (
+        Message.objects.filter(role="user")
+        .exclude(content="")
+        .exclude(id__in=exclude_ids)
+        .order_by("-created_at")
+        .values_list("id", "content")
+    )
+    for start in range(0, max(scan_limit, 0), LABEL_SCAN_CHUNK):
+        chunk = [
+            (message_id, content, classification_text_hash(content))
+            for message_id, content in rows[
+                start : min(start + LABEL_SCAN_CHUNK, scan_limit)  # noqa: E203
+            ]
+        ]
+        if not chunk:
+            return
+        labels: Dict[str, int] = {}
+        for text_hash, theme_id in (
+            ThemeClassification.objects.filter(
+                text_hash__in={text_hash for _, _, text_hash in chunk},
+                theme_id__in=allowed,
+            )
+            .order_by("created_at")
+            .values_list("text_hash", "theme_id")
+        ):
+            labels[text_hash] = theme_id
+        for message_id, content, text_hash in chunk:
+            if text_hash in labels and text_hash not in seen:
+                seen.add(text_hash)
+                yield message_id, content, labels[text_hash]
+
+
+def labeled_user_messages(
+    examples_per_theme: int, theme_ids: Iterable[int], exclude_ids=()
+) -> Dict[int, List[str]]:
+    """Latest LLM-labeled user messages per theme, content only."""
+    examples: Dict[int, List[str]] = {theme_id: [] for theme_id in theme_ids}
+    if examples_per_theme <= 0 or not examples:
+        return examples
+    missing = len(examples)
+    for _, content, theme_id in iter_llm_labeled_user_messages(
+        examples, exclude_ids=exclude_ids
+    ):
+        texts = examples[theme_id]
+        if len(texts) >= examples_per_theme:
+            continue
+        texts.append(content)
+        if len(texts) == examples_per_theme:
+            missing -= 1
+            if not missing:
+                break
+    return examples
+
+
+def build_local_theme_model(
+    catalog: ThemeCatalog,
+    examples_per_theme: Optional[int] = None,
+    exclude_ids=(),
+) -> LocalThemeModel:
+    if examples_per_theme is None:
+        examples_per_theme = int(
+            os.environ.get(
+                "THEME_LOCAL_EXAMPLES_PER_THEME", DEFAULT_LOCAL_THEME_EXAMPLES
+            )
+        )
+    examples = labeled_user_messages(
+        examples_per_theme, catalog.theme_ids, exclude_ids=exclude_ids
+    )
+    return LocalThemeModel(catalog, examples)
+
+
+def local_theme_threshold() -> float:
+    return float(
+        os.environ.get(
+            "THEME_LOCAL_CLASSIFIER_THRESHOLD", DEFAULT_LOCAL_THEME_THRESHOLD
+        )
+    )
+
+
+def local_theme_classifier_enabled() -> bool:
+    return os.environ.get("THEME_LOCAL_CLASSIFIER", "true").lower() == "true"
+
+
+class LocalThemeModelCache:
+    """
+    Process-wide LocalThemeModel, rebuilt when the catalog version changes or
+    after THEME_LOCAL_MODEL_REFRESH_SECONDS (to pick up newly labeled
+    messages).
+
+    Builds run on one background thread at a time, never inside a chat
+    turn: while a refresh runs the previous model keeps serving, and while
+    no model for the current catalog exists model() returns None (the
+    caller asks the LLM). A failed build is retried after
+    MODEL_BUILD_RETRY_SECONDS.
+    """
+
+    def __init__(self):
+        self._model: Optional[LocalThemeModel] = None
+        self._built_at: Optional[float] = None
+        self._building = False
+        self._failed_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def model(self, catalog: ThemeCatalog) -> Optional[LocalThemeModel]:
+        refresh_seconds = float(
+            os.environ.get(
+                "THEME_LOCAL_MODEL_REFRESH_SECONDS", DEFAULT_LOCAL_THEME_REFRESH_SECONDS
+            )
+        )
+        now = time.monotonic()
+        with self._lock:
+            model = self._model
+            if model is not None and model.catalog_version != catalog.version:
+                model = None
+            if model is not None and now - self._built_at < refresh_seconds:
+                return model
+            if self._building or (
+                self._failed_at is not None
+                and now - self._failed_at < MODEL_BUILD_RETRY_SECONDS
+            ):
+                return model
+            self._building = True
+        threading.Thread(
+            target=self._build, args=(catalog,), name="local-theme-model", daemon=True
+        ).start()
+        return model
+
+    def _build(self, catalog: ThemeCatalog) -> None:
+        try:
+            model = build_local_theme_model(catalog)
+        except Exception as exc:
+            logger.warning("Local theme model build failed error=%s", exc)
+            with self._lock:
+                self._building = False
+                self._failed_at = time.monotonic()
+            return
+        finally:
+            connection.close()
+        with self._lock:
+            self._model = model
+            self._built_at = time.monotonic()
+            self._building = False
+            self._failed_at = None
+        logger.info(
+            "Local theme model built catalog_version=%s examples=%s",
+            model.catalog_version,
+            model.example_count,
+        )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._model = None
+            self._built_at = None
+            self._failed_at = None
+
+
+_LOCAL_THEME_MODEL_CACHE = LocalThemeModelCache()
+
+
+def classify_locally(catalog: ThemeCatalog, text: str) -> Optional[int]:
+    """
+    Theme id when the local model is at least THEME_LOCAL_CLASSIFIER_THRESHOLD
+    confident, else None (the caller asks the LLM). Embedding failures and
+    a model still being built also return None.
+    """
+    if not local_theme_classifier_enabled() or not catalog.themes:
+        return None
+    model = _LOCAL_THEME_MODEL_CACHE.model(catalog)
+    if model is None:
+        return None
+    try:
+        theme_id, confidence = model.predict(text)
+    except Exception as exc:
+        logger.warning("Local theme classifier unavailable error=%s", exc)
+        return None
+    if theme_id is None or confidence < local_theme_threshold():
+        return None
+    return theme_id
@@ -0,0 +1,71 @@
+"""Aho-Corasick matcher over categorized marker lists."""
+
+from collections import deque
+from typing import Dict, FrozenSet, Iterable, List, Mapping
+
+
+class MarkerAutomaton:
+    """
+    Finds which marker categories occur in a text in a single pass.
+
+    Matching is plain substring matching, the same as
+    `any(marker in text for marker in markers)` for every category, so a
+    marker may start or end in the middle of a word. Build it once (at import)
+    and share it: the automaton is read-only after construction.
+    """
+
+    def __init__(self, categories: Mapping[str, Iterable[str]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        outputs: List[set] = [set()]
+        for category, markers in categories.items():
+            for marker in markers:
+                if not marker:
+                    continue
+                state = 0
+                for char in marker:
+                    next_state = self._goto[state].get(char)
+                    if next_state is None:
+                        next_state = len(self._goto)
+                        self._goto[state][char] = next_state
+                        self._goto.append({})
+                        outputs.append(set())
+                    state = next_state
+                outputs[state].add(category)
+
+        self._fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                outputs[next_state] |= outputs[self._fail[next_state]]
+        self._outputs: List[FrozenSet[str]] = [frozenset(item) for item in outputs]
+
+        # Fold the failure links into full transition tables, in breadth-first
+        # order so a state's fail target is done first: matching then costs
+        # one dict lookup per character.
+        self._delta: List[Dict[str, int]] = [dict(self._goto[0])] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            queue.extend(self._goto[state].values())
+            self._delta[state] = {
+                **self._delta[self._fail[state]],
+                **self._goto[state],
+            }
+
+    def categories_in(self, text: str) -> FrozenSet[str]:
+        delta = self._delta
+        outputs = self._outputs
+        found = set()
+        state = 0
+        for char in text or "":
+            state = delta[state].get(char, 0)
+            if outputs[state]:
+                found |= outputs[state]
+        return frozenset(found)
@@ -0,0 +1,140 @@
+"""Per-profile index of word n-grams the assistant used recently."""
+
+import hashlib
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Set
+
+from services.candidate_analysis import tokenize
+
+# Assistant messages whose n-grams are banned from the next reply.
+NGRAM_BAN_WINDOW_MESSAGES = 2
+NGRAM_BAN_SIZE = 4
+# Bump when the token-id or rolling-hash scheme changes; stored indexes with
+# another version are rebuilt.
+NGRAM_INDEX_VERSION = 1
+
+_HASH_BASE = 1_000_003
+_HASH_MASK = (1 << 64) - 1
+
+
+@lru_cache(maxsize=65536)
+def token_id(token: str) -> int:
+    """Stable 64-bit id; Python's hash() is salted per process."""
+    return int.from_bytes(
+        hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "big"
+    )
+
+
+def rolling_ngram_hashes(tokens: Sequence[str], n: int) -> Iterator[int]:
+    """
+    Polynomial rolling hash (mod 2**64) of every run of `n` consecutive
+    token ids, yielded lazily so a caller can stop at the first hit.
+    """
+    if len(tokens) < n:
+        return
+    ids = [token_id(token) for token in tokens]
+    top_power = pow(_HASH_BASE, n - 1, _HASH_MASK + 1)
+    value = 0
+    for index, current in enumerate(ids):
+        if index >= n:
+            value -= ids[index - n] * top_power
+        value = (value * _HASH_BASE + current) & _HASH_MASK
+        if index >= n - 1:
+            yield value
+
+
+class NgramBanIndex:
+    """
+    Rolling-hash n-grams of the last `window` assistant messages.
+
+    The index is stored on the profile (Profile.ngram_ban_index) and extended
+    with add_message() whenever an assistant message is saved, so a turn
+    never re-tokenizes the history. Callers check `covers()` against the
+    message ids they loaded and rebuild on mismatch (messages written
+    elsewhere, a changed window or hash version).
+    """
+
+    def __init__(
+        self,
+        window: int = NGRAM_BAN_WINDOW_MESSAGES,
+        size: int = NGRAM_BAN_SIZE,
+    ):
+        self.window = window
+        self.size = size
+        self._messages: List[Dict[str, Any]] = []
+        self._banned: Set[int] = set()
+
+    @classmethod
+    def from_state(cls, state: Any) -> Optional["NgramBanIndex"]:
+        """None when `state` is missing or was built with other parameters."""
+        if not isinstance(state, dict):
+            return None
+        index = cls()
+        if (
+            state.get("version") != NGRAM_INDEX_VERSION
+            or state.get("window") != index.window
+            or state.get("size") != index.size
+        ):
+            return None
+        messages = state.get("messages")
+        if not isinstance(messages, list):
+            return None
+        for item in messages:
+            if not isinstance(item, dict) or not isinstance(item.get("hashes"), list):
+                return None
+            index._messages.append(
+                {
+                    "id": item.get("id"),
+                    "hashes": [int(value) for value in item["hashes"]],
+                }
+            )
+        index._rebuild_banned()
+        return index
+
+    @classmethod
+    def build(cls, messages: Iterable) -> "NgramBanIndex":
+        """Index from Message-like objects (id, content), oldest first."""
+        index = cls()
+        for message in messages:
+            index.add_message(message.id, message.content)
+        return index
+
+    def as_state(self) -> Dict[str, Any]:
+        return {
+            "version": NGRAM_INDEX_VERSION,
+            "window": self.window,
+            "size": self.size,
+            "messages": self._messages,
+        }
+
+    @property
+    def message_ids(self) -> List[Any]:
+        return [item["id"] for item in self._messages]
+
+    def covers(self, message_ids: Sequence[Any]) -> bool:
+        return self.message_ids == list(message_ids)[-self.window :]  # noqa: E203
+
+    def add_message(self, message_id: Any, text: str) -> None:
+        hashes = sorted(set(rolling_ngram_hashes(tokenize(text), self.size)))
+        self._messages.append({"id": message_id, "hashes": hashes})
+        if len(self._messages) > self.window:
+            del self._messages[: len(self._messages) - self.window]
+            self._rebuild_banned()
+        else:
+            self._banned.update(hashes)
+
+    def contains_any(self, tokens: Sequence[str]) -> bool:
+        """True at the first n-gram of `tokens` that is banned."""
+        if not self._banned:
+            return False
+        banned = self._banned
+        for value in rolling_ngram_hashes(tokens, self.size):
+            if value in banned:
+                return True
+        return False
+
+    def __bool__(self) -> bool:
+        return bool(self._banned)
+
+    def _rebuild_banned(self) -> None:
+        self._banned = {value for item in self._messages for value in item["hashes"]}
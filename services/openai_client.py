@@ -0,0 +1,139 @@
+"""Process-wide OpenAI client registry sharing one tuned connection pool."""
+
+import asyncio
+import os
+import threading
+from typing import Any, Awaitable, Dict, Optional
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+from services.openai_rate_limiter import (
+    current_openai_priority,
+    install_async_rate_limits,
+    install_rate_limits,
+    openai_priority,
+)
+
+DEFAULT_MAX_CONNECTIONS = 20
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 10
+DEFAULT_KEEPALIVE_EXPIRY_SECONDS = 90.0
+DEFAULT_CONNECT_TIMEOUT_SECONDS = 5.0
+DEFAULT_REQUEST_TIMEOUT_SECONDS = 60.0
+
+_clients: Dict[str, OpenAI] = {}
+_async_clients: Dict[str, AsyncOpenAI] = {}
+_clients_lock = threading.Lock()
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_pid: Optional[int] = None
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.environ.get(name, default))
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.environ.get(name, default))
+
+
+def openai_pool_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=_env_int("OPENAI_MAX_CONNECTIONS", DEFAULT_MAX_CONNECTIONS),
+        max_keepalive_connections=_env_int(
+            "OPENAI_MAX_KEEPALIVE_CONNECTIONS", DEFAULT_MAX_KEEPALIVE_CONNECTIONS
+        ),
+        keepalive_expiry=_env_float(
+            "OPENAI_KEEPALIVE_EXPIRY_SECONDS", DEFAULT_KEEPALIVE_EXPIRY_SECONDS
+        ),
+    )
+
+
+def openai_default_timeout() -> httpx.Timeout:
+    """Client-wide timeout; calls that pass `timeout=` still override it."""
+    return httpx.Timeout(
+        _env_float("OPENAI_REQUEST_TIMEOUT_SECONDS", DEFAULT_REQUEST_TIMEOUT_SECONDS),
+        connect=_env_float(
+            "OPENAI_CONNECT_TIMEOUT_SECONDS", DEFAULT_CONNECT_TIMEOUT_SECONDS
+        ),
+    )
+
+
+def get_openai_client(api_key: str) -> OpenAI:
+    """
+    Return the shared OpenAI client for this API key.
+
+    The client and its HTTP connection pool live for the whole process, so
+    TLS sessions and keep-alive connections are reused across requests and
+    across services. The client is thread-safe. Its chat completion and
+    image calls go through the shared rate limiter (services.openai_rate_limiter).
+    """
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            timeout = openai_default_timeout()
+            client = OpenAI(
+                api_key=api_key,
+                timeout=timeout,
+                http_client=httpx.Client(limits=openai_pool_limits(), timeout=timeout),
+            )
+            install_rate_limits(client)
+            _clients[api_key] = client
+        return client
+
+
+def _openai_event_loop() -> asyncio.AbstractEventLoop:
+    global _loop, _loop_pid
+    with _clients_lock:
+        if _loop is None or _loop_pid != os.getpid():
+            # A loop inherited through fork has no running thread behind it.
+            _async_clients.clear()
+            _loop = asyncio.new_event_loop()
+            _loop_pid = os.getpid()
+            threading.Thread(
+                target=_loop.run_forever, name="openai-async-loop", daemon=True
+            ).start()
+        return _loop
+
+
+def run_openai_coroutine(coroutine: Awaitable[Any]) -> Any:
+    """
+    Run a coroutine on the process-wide OpenAI event loop and wait for it.
+
+    The loop lives in a daemon thread, so async clients and their connection
+    pools survive between calls. Safe to call from any worker thread; the
+    coroutine must not touch the ORM. The caller's OpenAI priority carries
+    over to the coroutine.
+    """
+    future = asyncio.run_coroutine_threadsafe(
+        _with_priority(coroutine, current_openai_priority()), _openai_event_loop()
+    )
+    return future.result()
+
+
+async def _with_priority(coroutine: Awaitable[Any], priority: str) -> Any:
+    with openai_priority(priority):
+        return await coroutine
+
+
+def get_async_openai_client(api_key: str) -> AsyncOpenAI:
+    """
+    Return the shared AsyncOpenAI client for this API key.
+
+    Only use it inside coroutines passed to run_openai_coroutine(): its pool
+    is bound to that event loop.
+    """
+    _openai_event_loop()
+    with _clients_lock:
+        client = _async_clients.get(api_key)
+        if client is None:
+            timeout = openai_default_timeout()
+            client = AsyncOpenAI(
+                api_key=api_key,
+                timeout=timeout,
+                http_client=httpx.AsyncClient(
+                    limits=openai_pool_limits(), timeout=timeout
+                ),
+            )
+            install_async_rate_limits(client)
+            _async_clients[api_key] = client
+        return client
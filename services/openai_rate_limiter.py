@@ -0,0 +1,527 @@
+"""Token-bucket limits on OpenAI requests and tokens per minute."""
+
+import asyncio
+import functools
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from django.db import close_old_connections, transaction
+
+from core.models import RateLimitBucket
+from services.latency_budget import MIN_CALL_TIMEOUT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_LIVE = "live"
+PRIORITY_SIMULATION = "simulation"
+PRIORITY_BATCH = "batch"
+PRIORITIES = (PRIORITY_LIVE, PRIORITY_SIMULATION, PRIORITY_BATCH)
+# Share of each bucket a priority class must leave untouched, so simulations
+# and batch jobs cannot drain the budget live chat turns need.
+DEFAULT_PRIORITY_RESERVES = {
+    PRIORITY_LIVE: 0.0,
+    PRIORITY_SIMULATION: 0.2,
+    PRIORITY_BATCH: 0.4,
+}
+
+BUCKET_CHAT = "chat"
+BUCKET_IMAGES = "images"
+# (requests per minute, tokens per minute); 0 disables that limit.
+DEFAULT_BUCKET_LIMITS = {
+    BUCKET_CHAT: (500.0, 200_000.0),
+    BUCKET_IMAGES: (5.0, 0.0),
+}
+
+BACKEND_DATABASE = "database"
+BACKEND_LOCAL = "local"
+BACKEND_OFF = "off"
+DEFAULT_MAX_WAIT_SECONDS = 120.0
+MAX_POLL_SECONDS = 1.0
+
+# OpenAI counts a request against TPM as its prompt plus the completion it
+# may return (max tokens times n), so the estimate does the same.
+CHARS_PER_TOKEN = 4
+DEFAULT_COMPLETION_TOKENS_ESTIMATE = 1000
+
+
+class OpenAIRateLimitTimeout(RuntimeError):
+    """A call could not get through its bucket within its allowed wait."""
+
+
+_priority: ContextVar[str] = ContextVar("openai_priority", default=PRIORITY_LIVE)
+
+
+@contextmanager
+def openai_priority(priority: str) -> Iterator[None]:
+    """Run the enclosed OpenAI calls in `priority` (also works as a decorator)."""
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown OpenAI priority '{priority}'.")
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_openai_priority() -> str:
+    return _priority.get()
+
+
+@dataclass(frozen=True)
+class BucketLimits:
+    requests_per_minute: float
+    tokens_per_minute: float
+
+    @property
+    def enabled(self) -> bool:
+        return self.requests_per_minute > 0 or self.tokens_per_minute > 0
+
+
+def bucket_limits(name: str) -> BucketLimits:
+    default_requests, default_tokens = DEFAULT_BUCKET_LIMITS[name]
+    prefix = f"OPENAI_{name.upper()}"
+    return BucketLimits(
+        requests_per_minute=float(
+            os.environ.get(f"{prefix}_REQUESTS_PER_MINUTE", default_requests)
+        ),
+        tokens_per_minute=float(
+            os.environ.get(f"{prefix}_TOKENS_PER_MINUTE", default_tokens)
+        ),
+    )
+
+
+def priority_reserve(priority: str) -> float:
+    return float(
+        os.environ.get(
+            f"OPENAI_RATE_LIMIT_RESERVE_{priority.upper()}",
+            DEFAULT_PRIORITY_RESERVES[priority],
+        )
+    )
+
+
+def full_bucket(limits: BucketLimits, now: float) -> Dict[str, float]:
+    return {
+        "requests": limits.requests_per_minute,
+        "tokens": limits.tokens_per_minute,
+        "refilled_at": now,
+    }
+
+
+def take_from_bucket(
+    state: Dict[str, float],
+    limits: BucketLimits,
+    requests: float,
+    tokens: float,
+    reserve: float,
+    now: float,
+) -> float:
+    """
+    Refill `state` in place for the time elapsed, then take the cost and
+    return 0.0, or take nothing and return the seconds until it would fit.
+
+    A cost fits when the bucket keeps `reserve` of its capacity afterwards;
+    costs larger than the capacity wait for a full bucket.
+    """
+    elapsed = max(0.0, now - state["refilled_at"])
+    state["refilled_at"] = now
+    wait = 0.0
+    dimensions = (
+        ("requests", limits.requests_per_minute, requests),
+        ("tokens", limits.tokens_per_minute, tokens),
+    )
+    for key, capacity, cost in dimensions:
+        if capacity <= 0:
+            continue
+        rate = capacity / 60.0
+        level = min(capacity, state[key] + elapsed * rate)
+        state[key] = level
+        needed = min(cost + reserve * capacity, capacity)
+        if level < needed:
+            wait = max(wait, (needed - level) / rate)
+    if wait > 0:
+        return wait
+    for key, capacity, cost in dimensions:
+        if capacity > 0:
+            state[key] -= min(cost, capacity)
+    return 0.0
+
+
+def record_wait(stats: Dict[str, Any], priority: str, waited: float) -> None:
+    entry = stats.setdefault(
+        priority,
+        {"calls": 0, "waited_calls": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0},
+    )
+    entry["calls"] += 1
+    if waited > 0:
+        entry["waited_calls"] += 1
+        entry["wait_seconds"] += waited
+        entry["max_wait_seconds"] = max(entry["max_wait_seconds"], waited)
+
+
+class LocalRateLimitBackend:
+    """Buckets in this process only."""
+
+    blocking_io = False
+
+    def __init__(self):
+        self._states: Dict[str, Dict[str, float]] = {}
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def try_acquire(
+        self,
+        name: str,
+        limits: BucketLimits,
+        requests: float,
+        tokens: float,
+        priority: str,
+        waited: float,
+    ) -> float:
+        now = time.time()
+        with self._lock:
+            state = self._states.setdefault(name, full_bucket(limits, now))
+            wait = take_from_bucket(
+                state, limits, requests, tokens, priority_reserve(priority), now
+            )
+            if wait == 0:
+                record_wait(self._stats.setdefault(name, {}), priority, waited)
+            return wait
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                name: {**state, "stats": self._stats.get(name, {})}
+                for name, state in self._states.items()
+            }
+
+
+class DatabaseRateLimitBackend:
+    """
+    Buckets in RateLimitBucket rows, shared by every process on the database.
+
+    Each acquisition locks its row with select_for_update for one short
+    transaction. The queries run on a dedicated thread with its own
+    connection, so they never join a transaction of the caller and can be
+    awaited from the OpenAI event loop.
+    """
+
+    blocking_io = True
+
+    def __init__(self):
+        self._known_buckets = set()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="openai-rate-limit"
+                )
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def try_acquire(
+        self,
+        name: str,
+        limits: BucketLimits,
+        requests: float,
+        tokens: float,
+        priority: str,
+        waited: float,
+    ) -> float:
+        close_old_connections()
+        now = time.time()
+        if name not in self._known_buckets:
+            RateLimitBucket.objects.get_or_create(
+                name=name, defaults=full_bucket(limits, now)
+            )
+            self._known_buckets.add(name)
+        with transaction.atomic():
+            bucket = RateLimitBucket.objects.select_for_update().get(name=name)
+            state = {
+                "requests": bucket.requests,
+                "tokens": bucket.tokens,
+                "refilled_at": bucket.refilled_at,
+            }
+            wait = take_from_bucket(
+                state, limits, requests, tokens, priority_reserve(priority), now
+            )
+            bucket.requests = state["requests"]
+            bucket.tokens = state["tokens"]
+            bucket.refilled_at = state["refilled_at"]
+            update_fields = ["requests", "tokens", "refilled_at"]
+            if wait == 0:
+                stats = bucket.stats if isinstance(bucket.stats, dict) else {}
+                record_wait(stats, priority, waited)
+                bucket.stats = stats
+                update_fields.append("stats")
+            bucket.save(update_fields=update_fields)
+        return wait
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            bucket.name: {
+                "requests": bucket.requests,
+                "tokens": bucket.tokens,
+                "refilled_at": bucket.refilled_at,
+                "stats": bucket.stats,
+            }
+            for bucket in RateLimitBucket.objects.order_by("name")
+        }
+
+
+class OpenAIRateLimiter:
+    """
+    Waits until a bucket can pay for a call, polling the backend.
+
+    Callers are never queued: a class waits while paying would cut into its
+    reserve, which lower priority classes keep larger. acquire() returns the
+    seconds waited; waits are logged and counted per priority in the backend
+    (see the openai_rate_limits command). `max_wait` tightens the process
+    cap for one call; a wait predicted to pass it raises
+    OpenAIRateLimitTimeout straight away instead of sleeping first.
+    """
+
+    def __init__(self, backend, max_wait_seconds: Optional[float] = None):
+        if max_wait_seconds is None:
+            max_wait_seconds = float(
+                os.environ.get(
+                    "OPENAI_RATE_LIMIT_MAX_WAIT_SECONDS", DEFAULT_MAX_WAIT_SECONDS
+                )
+            )
+        self.backend = backend
+        self.max_wait_seconds = max_wait_seconds
+
+    def acquire(
+        self,
+        name: str,
+        requests: float = 1,
+        tokens: float = 0,
+        max_wait: Optional[float] = None,
+    ) -> float:
+        limits = bucket_limits(name)
+        if not limits.enabled:
+            return 0.0
+        priority = current_openai_priority()
+        started = time.monotonic()
+        waited = 0.0
+        while True:
+            call = functools.partial(
+                self.backend.try_acquire,
+                name,
+                limits,
+                requests,
+                tokens,
+                priority,
+                waited,
+            )
+            if self.backend.blocking_io:
+                wait = self.backend.executor.submit(call).result()
+            else:
+                wait = call()
+            if wait == 0:
+                return self._done(name, priority, waited)
+            time.sleep(self._next_sleep(name, priority, wait, waited, max_wait))
+            waited = time.monotonic() - started
+
+    async def acquire_async(
+        self,
+        name: str,
+        requests: float = 1,
+        tokens: float = 0,
+        max_wait: Optional[float] = None,
+    ) -> float:
+        limits = bucket_limits(name)
+        if not limits.enabled:
+            return 0.0
+        priority = current_openai_priority()
+        started = time.monotonic()
+        waited = 0.0
+        while True:
+            call = functools.partial(
+                self.backend.try_acquire,
+                name,
+                limits,
+                requests,
+                tokens,
+                priority,
+                waited,
+            )
+            if self.backend.blocking_io:
+                wait = await asyncio.wrap_future(self.backend.executor.submit(call))
+            else:
+                wait = call()
+            if wait == 0:
+                return self._done(name, priority, waited)
+            await asyncio.sleep(
+                self._next_sleep(name, priority, wait, waited, max_wait)
+            )
+            waited = time.monotonic() - started
+
+    def _next_sleep(
+        self,
+        name: str,
+        priority: str,
+        wait: float,
+        waited: float,
+        max_wait: Optional[float],
+    ) -> float:
+        limit = self.max_wait_seconds
+        if max_wait is not None:
+            limit = min(limit, max_wait)
+        if waited + wait > limit:
+            raise OpenAIRateLimitTimeout(
+                f"OpenAI rate limit '{name}' would make a {priority} call wait "
+                f"more than {limit:.1f}s."
+            )
+        return min(wait, MAX_POLL_SECONDS)
+
+    def _done(self, name: str, priority: str, waited: float) -> float:
+        if waited > 0:
+            logger.info(
+                "OpenAI rate limit wait bucket=%s priority=%s seconds=%.3f",
+                name,
+                priority,
+                waited,
+            )
+        return waited
+
+
+_limiters: Dict[str, Optional[OpenAIRateLimiter]] = {}
+_limiters_lock = threading.Lock()
+
+
+def build_rate_limit_backend(kind: str):
+    kind = (kind or BACKEND_DATABASE).strip().lower()
+    if kind == BACKEND_DATABASE:
+        return DatabaseRateLimitBackend()
+    if kind == BACKEND_LOCAL:
+        return LocalRateLimitBackend()
+    raise ValueError(f"Unknown OPENAI_RATE_LIMIT_BACKEND '{kind}'")
+
+
+def get_rate_limiter() -> Optional[OpenAIRateLimiter]:
+    """Process-wide limiter for OPENAI_RATE_LIMIT_BACKEND; None when "off"."""
+    kind = os.environ.get("OPENAI_RATE_LIMIT_BACKEND", BACKEND_DATABASE)
+    with _limiters_lock:
+        if kind not in _limiters:
+            _limiters[kind] = (
+                None
+                if kind.strip().lower() == BACKEND_OFF
+                else OpenAIRateLimiter(build_rate_limit_backend(kind))
+            )
+        return _limiters[kind]
+
+
+def estimate_chat_tokens(request_kwargs: Dict[str, Any]) -> int:
+    chars = 0
+    for message in request_kwargs.get("messages") or []:
+        content = message.get("content") if isinstance(message, dict) else None
+        if isinstance(content, str):
+            chars += len(content)
+        elif isinstance(content, list):
+            chars += sum(
+                len(part.get("text") or "")
+                for part in content
+                if isinstance(part, dict)
+            )
+    completion_tokens = (
+        request_kwargs.get("max_completion_tokens")
+        or request_kwargs.get("max_tokens")
+        or DEFAULT_COMPLETION_TOKENS_ESTIMATE
+    )
+    return chars // CHARS_PER_TOKEN + completion_tokens * (request_kwargs.get("n") or 1)
+
+
+def _estimate_image_tokens(request_kwargs: Dict[str, Any]) -> int:
+    return 0
+
+
+def _call_timeout(request_kwargs: Dict[str, Any]) -> Optional[float]:
+    """
+    The request's own timeout when the wait must fit inside it.
+
+    Live turns and simulations run inside a gunicorn request and size their
+    timeouts from the turn's LatencyBudget, so their wait plus the request
+    must fit in that timeout; batch jobs keep waiting up to the process cap.
+    """
+    timeout = request_kwargs.get("timeout")
+    if current_openai_priority() == PRIORITY_BATCH:
+        return None
+    if isinstance(timeout, bool) or not isinstance(timeout, (int, float)):
+        return None
+    return float(timeout)
+
+
+def _max_wait(timeout: Optional[float]) -> Optional[float]:
+    if timeout is None:
+        return None
+    return max(timeout - MIN_CALL_TIMEOUT_SECONDS, 0.0)
+
+
+def _rate_limited(
+    call: Callable, name: str, estimate: Callable[[Dict[str, Any]], int]
+) -> Callable:
+    @functools.wraps(call)
+    def wrapper(*args, **kwargs):
+        limiter = get_rate_limiter()
+        if limiter is not None:
+            timeout = _call_timeout(kwargs)
+            waited = limiter.acquire(
+                name, tokens=estimate(kwargs), max_wait=_max_wait(timeout)
+            )
+            if timeout is not None:
+                kwargs["timeout"] = timeout - waited
+        return call(*args, **kwargs)
+
+    return wrapper
+
+
+def _async_rate_limited(
+    call: Callable, name: str, estimate: Callable[[Dict[str, Any]], int]
+) -> Callable:
+    @functools.wraps(call)
+    async def wrapper(*args, **kwargs):
+        limiter = get_rate_limiter()
+        if limiter is not None:
+            timeout = _call_timeout(kwargs)
+            waited = await limiter.acquire_async(
+                name, tokens=estimate(kwargs), max_wait=_max_wait(timeout)
+            )
+            if timeout is not None:
+                kwargs["timeout"] = timeout - waited
+        return await call(*args, **kwargs)
+
+    return wrapper
+
+
+def install_rate_limits(client: Any) -> Any:
+    """Put the limiter in front of chat.completions.create and images.generate."""
+    client.chat.completions.create = _rate_limited(
+        client.chat.completions.create, BUCKET_CHAT, estimate_chat_tokens
+    )
+    client.images.generate = _rate_limited(
+        client.images.generate, BUCKET_IMAGES, _estimate_image_tokens
+    )
+    return client
+
+
+def install_async_rate_limits(client: Any) -> Any:
+    """install_rate_limits() for AsyncOpenAI clients."""
+    client.chat.completions.create = _async_rate_limited(
+        client.chat.completions.create, BUCKET_CHAT, estimate_chat_tokens
+    )
+    client.images.generate = _async_rate_limited(
+        client.images.generate, BUCKET_IMAGES, _estimate_image_tokens
+    )
+    return client
@@ -1,7 +1,9 @@
 import os
 from typing import Any, Dict, Literal, Optional, Union
 
-from openai import OpenAI
+from openai import AsyncOpenAI
+
+from services.openai_client import get_async_openai_client, get_openai_client
 
 GPT5_MODEL = "gpt-5-mini"
 OPENAI_TIMEOUT_SECONDS = 60
@@ -16,10 +18,16 @@ class OpenAIService:
         if not api_key:
             raise ValueError("OPENAI_API_KEY is required.")
 
-        self.client = OpenAI(api_key=api_key)
+        self._api_key = api_key
+        self.client = get_openai_client(api_key)
         self.default_model = GPT5_MODEL
         self._last_prompt_payload: Optional[Dict[str, Any]] = None
 
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        """Shared async client; only usable inside run_openai_coroutine()."""
+        return get_async_openai_client(self._api_key)
+
     def basic_call(
         self,
         prompt: Union[str, list],
@@ -29,12 +37,8 @@ class OpenAIService:
         system: Optional[str] = None,
     ) -> str:
         selected_model = self.default_model
-        messages = self._build_messages(prompt=prompt, system=system)
-        request_payload = self._build_request_payload(
-            model=selected_model,
-            messages=messages,
-            max_completion_tokens=max_tokens,
-            timeout=OPENAI_TIMEOUT_SECONDS,
+        request_payload = self.build_basic_request(
+            prompt=prompt, max_tokens=max_tokens, system=system
         )
 
         self._last_prompt_payload = {
@@ -52,6 +56,24 @@ class OpenAIService:
 
         self._log_request_debug(request_payload, attempt_label="initial")
         response = self.client.chat.completions.create(**request_payload)
+        return self.basic_response_text(response)
+
+    def build_basic_request(
+        self,
+        prompt: Union[str, list],
+        max_tokens: int = DEFAULT_MAX_COMPLETION_TOKENS,
+        system: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Request kwargs basic_call() sends, for callers using async_client."""
+        messages = self._build_messages(prompt=prompt, system=system)
+        return self._build_request_payload(
+            model=self.default_model,
+            messages=messages,
+            max_completion_tokens=max_tokens,
+            timeout=OPENAI_TIMEOUT_SECONDS,
+        )
+
+    def basic_response_text(self, response: Any) -> str:
         response_text = self._extract_text_response(response)
         self._log_response_debug(response, response_text, attempt_label="initial")
 
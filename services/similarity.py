@@ -0,0 +1,38 @@
+"""Vectorized cosine similarity over float32 embedding matrices."""
+
+from typing import Iterable, Sequence
+
+import numpy as np
+
+
+def as_vector(values: Iterable[float]) -> np.ndarray:
+    return np.asarray(values, dtype=np.float32).reshape(-1)
+
+
+def normalized_rows(vectors: Sequence) -> np.ndarray:
+    """
+    Stack vectors into a float32 matrix with L2-normalized rows.
+
+    Zero vectors stay zero, so their similarity with anything is 0.0.
+    """
+    if not len(vectors):
+        return np.zeros((0, 0), dtype=np.float32)
+    matrix = np.vstack([as_vector(vector) for vector in vectors])
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    matrix[(norms == 0).reshape(-1)] = 0.0
+    return matrix
+
+
+def cosine_matrix(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """Many-to-many similarities between two pre-normalized row matrices."""
+    if not left.size or not right.size:
+        return np.zeros((left.shape[0], right.shape[0]), dtype=np.float32)
+    return left @ right.T
+
+
+def cosine_one_to_many(vector: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+    """Similarities of one pre-normalized vector against every matrix row."""
+    if not vector.size or not matrix.size:
+        return np.zeros(matrix.shape[0], dtype=np.float32)
+    return matrix @ vector
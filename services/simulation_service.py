@@ -4,8 +4,10 @@ import hashlib
 from enum import Enum
 from typing import Iterable, List, Optional, Union
 
-from core.models import Message, Profile, Theme
+from core.message_payloads import store_message_payload
+from core.models import Message, Profile
 from services.openai_service import OpenAIService
+from services.theme_catalog import get_theme_catalog
 from services.theme_classifier import ThemeClassifier
 
 SIMULATION_MAX_COMPLETION_TOKENS = 1200
@@ -65,10 +67,7 @@ RELATED_TOPIC_ANGLES = [
 
 
 def _theme_options_from_db() -> dict:
-    options = {}
-    for theme in Theme.objects.all().order_by("name"):
-        options[theme.id] = theme.name
-    return options
+    return get_theme_catalog().names_by_id()
 
 
 def _parse_optional_theme_id(theme: Union[int, str, None]) -> Optional[int]:
@@ -482,11 +481,10 @@ class SimulationUseCase:
             predefined_scenario if predefined_scenario in PREDEFINED_SCENARIOS else ""
         )
         full_conversation = list(conversation)
-        available_theme_ids = set(Theme.objects.values_list("id", flat=True))
+        theme_options = _theme_options_from_db()
         selected_theme = _parse_optional_theme_id(theme)
-        if selected_theme is not None and selected_theme not in available_theme_ids:
+        if selected_theme is not None and selected_theme not in theme_options:
             raise ValueError(f"Theme '{selected_theme}' not found for simulation.")
-        theme_options = _theme_options_from_db()
         feeling_label = PREDEFINED_SCENARIOS.get(
             selected_scenario, "está emocionalmente abalada"
         )
@@ -619,7 +617,7 @@ class SimulationUseCase:
             profile_instance=profile,
         )
         theme_id = self._theme_classifier.classify(simulation["content"])
-        selected_theme = Theme.objects.filter(id=theme_id).first()
+        selected_theme = get_theme_catalog().get(theme_id)
         if not selected_theme:
             raise RuntimeError(f"Theme '{theme_id}' not found in database.")
 
@@ -629,9 +627,9 @@ class SimulationUseCase:
             content=simulation["content"],
             channel="simulation",
             generated_by_simulator=True,
-            ollama_prompt=simulation.get("payload"),
             theme=selected_theme,
         )
         message.block_root = message
         message.save(update_fields=["block_root"])
+        store_message_payload(message, simulation.get("payload"))
         return profile.id
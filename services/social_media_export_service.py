@@ -6,9 +6,10 @@ from typing import Any, Dict, Optional
 from uuid import uuid4
 
 from django.core.files.base import ContentFile
-from openai import OpenAI
 
 from core.models import Message, Profile, SocialMediaExport
+from services.openai_client import get_openai_client
+from services.openai_rate_limiter import PRIORITY_BATCH, openai_priority
 
 REQUEST_TIMEOUT_SECONDS = 120
 MAX_COMPLETION_TOKENS = 1400
@@ -60,9 +61,10 @@ def _get_openai_model() -> str:
 
 class SocialMediaExportService:
     def __init__(self):
-        self.client = OpenAI(api_key=_get_openai_api_key())
+        self.client = get_openai_client(_get_openai_api_key())
         self.model = _get_openai_model()
 
+    @openai_priority(PRIORITY_BATCH)
     def export_profile_messages(self, profile: Profile) -> int:
         created_count = 0
         candidates = self._candidate_assistant_messages(profile=profile)
@@ -100,6 +102,7 @@ class SocialMediaExportService:
 
         return created_count
 
+    @openai_priority(PRIORITY_BATCH)
     def generate_image_for_export(self, export_item: SocialMediaExport) -> None:
         image_prompt = self._build_image_prompt(export_item=export_item)
         response = self.client.images.generate(
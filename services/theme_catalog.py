@@ -0,0 +1,148 @@
+import hashlib
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from django.db.models import Count, Max
+
+from core.models import Theme
+
+DEFAULT_THEME_CATALOG_CHECK_SECONDS = 30.0
+
+_CLASSIFIER_INSTRUCTIONS = (
+    "Você é um classificador estrito.\n"
+    "Retorne APENAS um tema da lista permitida.\n\n"
+    "Classifique pelo núcleo emocional predominante, não por contexto incidental.\n"
+    "Quando houver ambiguidade, use esta prioridade de desempate:\n"
+    "1) Emoção/sofrimento nomeado explicitamente\n"
+    "2) Estado interno persistente\n"
+    "3) Contexto externo (trabalho, dinheiro, relacionamentos)\n"
+    "Se houver termos como 'ansioso/ansiosa/ansiedade/pânico', prefira tema de Ansiedade.\n"
+    "Se houver termos de gasto, dívida, boleto, conta, cartão ou compulsão financeira, prefira Dinheiro e dívidas.\n"
+    "Use Luto e perda apenas quando houver evidência explícita de luto/perda/morte/saudade de alguém.\n"
+    "Não explique sua escolha.\n\n"
+)
+
+
+def build_classifier_system_prompt(themes: Sequence[Theme]) -> str:
+    catalog_lines = [
+        f"{theme.id} | nome={theme.name or ''} | slug={theme.slug or ''}"
+        for theme in themes
+    ]
+    return (
+        _CLASSIFIER_INSTRUCTIONS
+        + "Temas permitidos (id | nome | slug):\n"
+        + "\n".join(catalog_lines)
+    )
+
+
+@dataclass(frozen=True)
+class ThemeCatalog:
+    """Every Theme (ordered by id) and the classifier prompt built from them."""
+
+    themes: Tuple[Theme, ...]
+    by_id: Dict[int, Theme]
+    classifier_system_prompt: str
+    # Changes whenever the classifier would see a different prompt.
+    version: str
+
+    @property
+    def theme_ids(self) -> List[int]:
+        return [theme.id for theme in self.themes]
+
+    def get(self, theme_id: Optional[int]) -> Optional[Theme]:
+        return self.by_id.get(theme_id)
+
+    def names_by_id(self) -> Dict[int, str]:
+        """Theme names keyed by id, in name order."""
+        return {
+            theme.id: theme.name
+            for theme in sorted(self.themes, key=lambda theme: theme.name)
+        }
+
+
+def load_theme_catalog() -> ThemeCatalog:
+    themes = tuple(Theme.objects.order_by("id"))
+    classifier_system_prompt = build_classifier_system_prompt(themes)
+    return ThemeCatalog(
+        themes=themes,
+        by_id={theme.id: theme for theme in themes},
+        classifier_system_prompt=classifier_system_prompt,
+        version=hashlib.sha256(classifier_system_prompt.encode("utf-8")).hexdigest(),
+    )
+
+
+class ThemeCatalogCache:
+    """
+    Process-wide ThemeCatalog.
+
+    Saves and deletes in this process clear it through core.signals. Other
+    processes are picked up by a version stamp, max(updated_at) and count of
+    the theme table, checked at most once every THEME_CATALOG_CHECK_SECONDS.
+    Between checks lookups run no queries.
+    """
+
+    def __init__(self, check_seconds: Optional[float] = None):
+        if check_seconds is None:
+            check_seconds = float(
+                os.environ.get(
+                    "THEME_CATALOG_CHECK_SECONDS", DEFAULT_THEME_CATALOG_CHECK_SECONDS
+                )
+            )
+        self._check_seconds = check_seconds
+        self._catalog: Optional[ThemeCatalog] = None
+        self._stamp: Optional[Tuple] = None
+        self._checked_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def catalog(self) -> ThemeCatalog:
+        self._ensure_fresh()
+        with self._lock:
+            catalog = self._catalog
+        if catalog is None:
+            catalog = load_theme_catalog()
+            with self._lock:
+                self._catalog = catalog
+        return catalog
+
+    def clear(self) -> None:
+        with self._lock:
+            self._catalog = None
+            self._stamp = None
+            self._checked_at = None
+
+    def _ensure_fresh(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if (
+                self._checked_at is not None
+                and now - self._checked_at < self._check_seconds
+            ):
+                return
+        stamp = _theme_version_stamp()
+        with self._lock:
+            if stamp != self._stamp:
+                self._catalog = None
+                self._stamp = stamp
+            self._checked_at = now
+
+
+def _theme_version_stamp() -> Tuple:
+    aggregate = Theme.objects.aggregate(
+        updated_at=Max("updated_at"), themes=Count("id")
+    )
+    return (aggregate["updated_at"], aggregate["themes"])
+
+
+_THEME_CATALOG_CACHE = ThemeCatalogCache()
+
+
+def get_theme_catalog() -> ThemeCatalog:
+    return _THEME_CATALOG_CACHE.catalog()
+
+
+def invalidate_theme_catalog() -> None:
+    """Drop this process's cached catalog."""
+    _THEME_CATALOG_CACHE.clear()
@@ -1,56 +1,103 @@
-from core.models import Theme
+import hashlib
+import re
+import unicodedata
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.models import ThemeClassification
+from services.local_theme_classifier import classify_locally
 from services.openai_service import OpenAIService
+from services.theme_catalog import get_theme_catalog
 
 THEME_CLASSIFIER_MODEL = "gpt-4o-mini"
 THEME_CLASSIFIER_TEMPERATURE = 0.1
 THEME_CLASSIFIER_MAX_COMPLETION_TOKENS = 10
 THEME_CLASSIFIER_TIMEOUT_SECONDS = 60
 
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def classification_text_hash(text: str) -> str:
+    """Hash of `text` after NFC, lowercasing and whitespace collapsing."""
+    normalized = _WHITESPACE_RE.sub(
+        " ", unicodedata.normalize("NFC", text or "").lower()
+    ).strip()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
 
 class ThemeClassifier:
     def __init__(self):
         self._llm_service = OpenAIService()
 
     def classify(self, text: str) -> int:
-        if not text or not text.strip():
-            raise ValueError("Text is required for theme classification.")
+        theme_id = self.resolve_without_llm(text)
+        if theme_id is not None:
+            return theme_id
 
         client = getattr(self._llm_service, "client", None)
         if client is None:
             raise RuntimeError("OpenAI client is not available for theme classifier.")
 
-        allowed_themes = list(
-            Theme.objects.all().order_by("id").values("id", "name", "slug")
+        request_kwargs, allowed_theme_ids = self.build_request(text)
+        response = client.chat.completions.create(**request_kwargs)
+        theme_id = self.parse_response(response, allowed_theme_ids)
+        self.remember(text, theme_id)
+        return theme_id
+
+    def resolve_without_llm(self, text: str) -> Optional[int]:
+        """
+        Theme from a stored classification, else from a confident local
+        prediction, else None (the caller asks the LLM). Local predictions
+        are not stored, so ThemeClassification keeps LLM labels only.
+        """
+        theme_id = self.cached_theme_id(text)
+        if theme_id is None and text and text.strip():
+            theme_id = classify_locally(get_theme_catalog(), text)
+        return theme_id
+
+    def cached_theme_id(self, text: str) -> Optional[int]:
+        """
+        Theme stored for the same normalized text under the current catalog
+        version, or None.
+        """
+        if not text or not text.strip():
+            return None
+        catalog = get_theme_catalog()
+        theme_id = (
+            ThemeClassification.objects.filter(
+                catalog_version=catalog.version,
+                text_hash=classification_text_hash(text),
+            )
+            .values_list("theme_id", flat=True)
+            .first()
         )
-        if not allowed_themes:
+        if theme_id is None or catalog.get(theme_id) is None:
+            return None
+        return theme_id
+
+    def remember(self, text: str, theme_id: int) -> None:
+        """Store a classification returned by parse_response()."""
+        ThemeClassification.objects.get_or_create(
+            catalog_version=get_theme_catalog().version,
+            text_hash=classification_text_hash(text),
+            defaults={"theme_id": theme_id},
+        )
+
+    def build_request(self, text: str) -> Tuple[Dict[str, Any], List[int]]:
+        """Chat completion kwargs for `text` and the theme ids it may return."""
+        if not text or not text.strip():
+            raise ValueError("Text is required for theme classification.")
+
+        catalog = get_theme_catalog()
+        if not catalog.themes:
             raise RuntimeError("No themes found in database for classification.")
-        allowed_theme_ids = [theme["id"] for theme in allowed_themes]
-        allowed_theme_catalog_lines = []
-        for theme in allowed_themes:
-            allowed_theme_catalog_lines.append(
-                f"{theme['id']} | nome={theme.get('name') or ''} | slug={theme.get('slug') or ''}"
-            )
-        allowed_theme_catalog = "\n".join(allowed_theme_catalog_lines)
+        allowed_theme_ids = catalog.theme_ids
 
-        response = client.chat.completions.create(
+        request_kwargs = dict(
             model=THEME_CLASSIFIER_MODEL,
             messages=[
                 {
                     "role": "system",
-                    "content": (
-                        "Você é um classificador estrito.\n"
-                        "Retorne APENAS um tema da lista permitida.\n\n"
-                        "Classifique pelo núcleo emocional predominante, não por contexto incidental.\n"
-                        "Quando houver ambiguidade, use esta prioridade de desempate:\n"
-                        "1) Emoção/sofrimento nomeado explicitamente\n"
-                        "2) Estado interno persistente\n"
-                        "3) Contexto externo (trabalho, dinheiro, relacionamentos)\n"
-                        "Se houver termos como 'ansioso/ansiosa/ansiedade/pânico', prefira tema de Ansiedade.\n"
-                        "Se houver termos de gasto, dívida, boleto, conta, cartão ou compulsão financeira, prefira Dinheiro e dívidas.\n"
-                        "Use Luto e perda apenas quando houver evidência explícita de luto/perda/morte/saudade de alguém.\n"
-                        "Não explique sua escolha.\n\n"
-                        f"Temas permitidos (id | nome | slug):\n{allowed_theme_catalog}"
-                    ),
+                    "content": catalog.classifier_system_prompt,
                 },
                 {
                     "role": "user",
@@ -66,7 +113,9 @@ class ThemeClassifier:
             max_completion_tokens=THEME_CLASSIFIER_MAX_COMPLETION_TOKENS,
             timeout=THEME_CLASSIFIER_TIMEOUT_SECONDS,
         )
+        return request_kwargs, allowed_theme_ids
 
+    def parse_response(self, response: Any, allowed_theme_ids: List[int]) -> int:
         choices = getattr(response, "choices", None) or []
         if not choices:
             raise RuntimeError("Theme classifier returned no choices.")
@@ -0,0 +1,124 @@
+"""The recent conversation window a chat turn reads, fetched once."""
+
+from typing import Any, Dict, List, Optional
+
+from core.models import Message, Profile
+
+# Latest context messages loaded per turn. Every view below needs at most 7
+# (the prompt history plus the last user message), so the window also covers
+# replies split into several assistant chunks.
+TURN_CONTEXT_MESSAGES = 20
+# Views derived from the window.
+RECENT_ROLE_MESSAGES = 3
+RECENT_CONTEXT_MESSAGES = 5
+PROMPT_CONTEXT_MESSAGES = 6
+
+# Reply metadata a turn carries to the next one (Profile.runtime_state).
+RUNTIME_STATE_KEYS = (
+    "progress_state",
+    "progress_metric",
+    "progress_stalled_turns",
+    "practical_mode_cooldown_remaining",
+    "prayer_cooldown_remaining",
+    "strategy_key",
+    "strategy_repetition_count",
+)
+
+
+def build_runtime_state(message_id: int, metadata: Any) -> Dict[str, Any]:
+    """Profile.runtime_state for the reply whose first message is `message_id`."""
+    state: Dict[str, Any] = {"message_id": message_id}
+    if isinstance(metadata, dict):
+        state.update(
+            (key, metadata[key]) for key in RUNTIME_STATE_KEYS if key in metadata
+        )
+    return state
+
+
+class TurnContext:
+    """
+    The last TURN_CONTEXT_MESSAGES context messages of a profile, oldest first.
+
+    Loaded with one query on (profile, created_at), with `ollama_prompt`
+    deferred so large stored payloads are not transferred. When the window is
+    full and a view needs rows of a role it does not hold, that view falls
+    back to a bounded query; on ordinary conversations no second query runs.
+    """
+
+    def __init__(self, profile: Profile, messages: List[Message], complete: bool):
+        self.profile = profile
+        self.messages = messages
+        # True when the window holds the whole context history.
+        self.complete = complete
+
+    @classmethod
+    def load(
+        cls, profile: Profile, window: int = TURN_CONTEXT_MESSAGES
+    ) -> "TurnContext":
+        messages = list(context_window_queryset(profile)[:window])[::-1]
+        return cls(profile, messages, complete=len(messages) < window)
+
+    def latest(self, role: Optional[str] = None, limit: int = 1) -> List[Message]:
+        """The last `limit` messages (of `role`, if given), oldest first."""
+        rows = [
+            message for message in self.messages if role is None or message.role == role
+        ][-limit:]
+        if len(rows) < limit and not self.complete:
+            queryset = context_window_queryset(self.profile)
+            if role is not None:
+                queryset = queryset.filter(role=role)
+            rows = list(queryset[:limit])[::-1]
+        return rows
+
+    @property
+    def last_user_message(self) -> Optional[Message]:
+        rows = self.latest("user")
+        return rows[-1] if rows else None
+
+    @property
+    def last_assistant_message(self) -> Optional[Message]:
+        rows = self.latest("assistant")
+        return rows[-1] if rows else None
+
+    @property
+    def has_assistant_messages(self) -> bool:
+        return self.last_assistant_message is not None
+
+    def runtime_state(self) -> Dict[str, Any]:
+        """
+        Runtime counters left by the latest assistant reply.
+
+        Read from Profile.runtime_state when it was saved with that reply.
+        Otherwise (replies saved before the column existed, or by other
+        writers) it falls back to the "metadata" of that message's payload.
+        """
+        last_assistant = self.last_assistant_message
+        if last_assistant is None:
+            return {}
+        state = self.profile.runtime_state
+        state_message_id = state.get("message_id") if isinstance(state, dict) else None
+        if state_message_id is not None and state_message_id in (
+            last_assistant.id,
+            last_assistant.block_root_id,
+        ):
+            return {key: state[key] for key in RUNTIME_STATE_KEYS if key in state}
+        payload = last_assistant.prompt_payload
+        metadata = payload.get("metadata") if isinstance(payload, dict) else None
+        if not isinstance(metadata, dict):
+            return {}
+        return metadata
+
+    def history_before(
+        self, message: Message, limit: int = PROMPT_CONTEXT_MESSAGES
+    ) -> List[Message]:
+        """The last `limit` messages other than `message`, oldest first."""
+        rows = [item for item in self.messages if item.id != message.id][-limit:]
+        if len(rows) < limit and not self.complete:
+            queryset = context_window_queryset(self.profile).exclude(id=message.id)
+            rows = list(queryset[:limit])[::-1]
+        return rows
+
+
+def context_window_queryset(profile: Profile):
+    """Context messages newest first; served by the msg_in_context_idx index."""
+    return profile.messages.for_context().defer("ollama_prompt").order_by("-created_at")